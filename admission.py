@@ -0,0 +1,393 @@
+"""
+Per-client admission control for the extraction routes.
+
+Every client (its IP, or a configured API key) has a token bucket: requests
+beyond its rate are rejected at once with a Retry-After, before any work
+is done. Synchronous extractions also need one of a fixed number of slots;
+when all are busy, waiting requests are served in weighted fair order, so a
+client with many queued requests does not delay the first request of
+another.
+"""
+import os
+import time
+import math
+import heapq
+import sqlite3
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Bucket entries idle this much longer than a full refill are forgotten
+PRUNE_INTERVAL = 60
+QUEUE_RETRY_AFTER = 5
+
+
+class Rejected(Exception):
+    """
+    Raised when a request is not admitted. `reason` is 'rate', 'queue' or
+    'timeout'; `retry_after` is in whole seconds
+    """
+    def __init__(self, reason, retry_after):
+        super().__init__(reason, retry_after)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def status(self):
+        return 429 if self.reason in ('rate', 'queue') else 503
+
+
+class MemoryBuckets:
+    """
+    Token buckets of this process only
+    """
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._pruned_at = time.monotonic()
+
+    def take(self, client, rate, burst, now=None):
+        """
+        Take a token from `client`'s bucket. Returns 0 when one was taken,
+        else the seconds until one will be available
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.get(client, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[client] = (tokens - 1, now)
+                wait = 0.0
+            else:
+                self._buckets[client] = (tokens, now)
+                wait = (1 - tokens) / rate
+            if now - self._pruned_at > PRUNE_INTERVAL:
+                self._prune(now, burst / rate)
+        return wait
+
+    def _prune(self, now, refill):
+        self._pruned_at = now
+        idle = [client for client, (_, updated) in self._buckets.items() if now - updated > refill]
+        for client in idle:
+            del self._buckets[client]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteBuckets:
+    """
+    Token buckets stored in a SQLite file, so every gunicorn worker on the
+    host enforces the same per-client limits
+    """
+    name = 'sqlite'
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(tempfile.gettempdir(), "video_extractor_admission.sqlite3")
+        self._local = threading.local()
+        self._pruned_at = time.time()
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS buckets (client TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def take(self, client, rate, burst, now=None):
+        # Wall clock: monotonic clocks are not comparable across processes
+        now = time.time() if now is None else now
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE client = ?", (client,)).fetchone()
+            tokens, updated = row if row is not None else (burst, now)
+            tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            if tokens >= 1:
+                tokens -= 1
+            conn.execute("INSERT OR REPLACE INTO buckets (client, tokens, updated) VALUES (?, ?, ?)",
+                         (client, tokens, now))
+            if now - self._pruned_at > PRUNE_INTERVAL:
+                self._pruned_at = now
+                conn.execute("DELETE FROM buckets WHERE updated < ?", (now - burst / rate,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM buckets").fetchone()[0]
+
+
+BUCKETS = {
+    MemoryBuckets.name: MemoryBuckets,
+    SQLiteBuckets.name: SQLiteBuckets
+}
+
+
+class _Waiter:
+    __slots__ = ('client', 'granted', 'cancelled')
+
+    def __init__(self, client):
+        self.client = client
+        self.granted = False
+        self.cancelled = False
+
+
+class FairQueue:
+    """
+    At most `max_in_flight` holders at once. Waiters are ordered by
+    weighted fair queuing: each request gets the finish tag
+    max(virtual time, client's previous tag) + 1/weight, and the smallest
+    tag is served first, so a client's n-th queued request waits behind
+    every other client's first. Only queued requests are tagged, and the
+    tags are forgotten whenever the queue drains, so requests served
+    without waiting leave no history. A client may have `client_queue`
+    requests waiting and all clients `max_queue`; beyond that requests are
+    rejected instead of queued.
+    """
+    def __init__(self, max_in_flight=16, max_queue=64, client_queue=4):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.client_queue = client_queue
+        self.in_flight = 0
+        self.queued = 0
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = 0
+        self._virtual = 0.0
+        self._tags = {}
+        self._client_queued = {}
+
+    def _tag(self, client, weight):
+        tag = max(self._virtual, self._tags.get(client, 0.0)) + 1.0 / weight
+        self._tags[client] = tag
+        if len(self._tags) > 4 * (self.max_queue + self.max_in_flight):
+            # Tags at or behind the virtual time mean nothing any more
+            self._tags = {c: t for c, t in self._tags.items() if t > self._virtual}
+        return tag
+
+    def acquire(self, client, weight=1.0, timeout=None):
+        """
+        Wait for a slot. Raises Rejected when the queue is full or
+        `timeout` seconds pass
+        """
+        with self._cond:
+            if self.in_flight < self.max_in_flight and not self.queued:
+                self.in_flight += 1
+                return
+            if self.queued >= self.max_queue or self._client_queued.get(client, 0) >= self.client_queue:
+                raise Rejected('queue', QUEUE_RETRY_AFTER)
+
+            tag = self._tag(client, weight)
+            waiter = _Waiter(client)
+            self._seq += 1
+            heapq.heappush(self._heap, (tag, self._seq, waiter))
+            self.queued += 1
+            self._client_queued[client] = self._client_queued.get(client, 0) + 1
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not waiter.granted:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    waiter.cancelled = True
+                    self._dequeued(client)
+                    raise Rejected('timeout', QUEUE_RETRY_AFTER)
+                self._cond.wait(remaining)
+
+    def _dequeued(self, client):
+        self.queued -= 1
+        if not self.queued:
+            # The next busy period starts from the virtual time; tags left
+            # by cancelled waiters must not carry over into it
+            self._tags.clear()
+        count = self._client_queued[client] - 1
+        if count:
+            self._client_queued[client] = count
+        else:
+            del self._client_queued[client]
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            while self.in_flight < self.max_in_flight and self._heap:
+                tag, _, waiter = heapq.heappop(self._heap)
+                if waiter.cancelled:
+                    continue
+                waiter.granted = True
+                self.in_flight += 1
+                self._virtual = tag
+                self._dequeued(waiter.client)
+            self._cond.notify_all()
+
+
+class AdmissionStats:
+    """
+    Thread-safe admission counters
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_rate = 0
+        self.rejected_queue = 0
+        self.rejected_timeout = 0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'admitted': self.admitted,
+                'queued': self.queued,
+                'rejected_rate': self.rejected_rate,
+                'rejected_queue': self.rejected_queue,
+                'rejected_timeout': self.rejected_timeout
+            }
+
+
+def parse_api_keys(value):
+    """
+    `key=weight,key2=weight2` (weight defaults to 1) into a dict
+    """
+    keys = {}
+    for item in (value or '').split(','):
+        key, _, weight = item.strip().partition('=')
+        if key:
+            keys[key] = float(weight) if weight else 1.0
+    return keys
+
+
+class AdmissionController:
+    """
+    Token bucket per client plus a fair queue for extraction slots. API
+    keys listed in `api_keys` identify a client with their weight, which
+    multiplies both its rate and its share of the queue; any other client
+    is its IP with weight 1. `trusted_proxies` is how many reverse proxies
+    append to X-Forwarded-For in front of the app.
+    """
+    def __init__(self, buckets, rate=1.0, burst=10, queue=None, queue_timeout=30, api_keys=None,
+                 trusted_proxies=0):
+        self.buckets = buckets
+        self.rate = rate
+        self.burst = burst
+        self.queue = queue or FairQueue()
+        self.queue_timeout = queue_timeout
+        self.api_keys = api_keys or {}
+        self.trusted_proxies = trusted_proxies
+        self.stats = AdmissionStats()
+
+    def identify(self, remote_addr, forwarded_for='', api_key=''):
+        """
+        The client of a request as `(id, weight)`. Unknown API keys count
+        for nothing, so rotating keys does not buy fresh buckets
+        """
+        if api_key and api_key in self.api_keys:
+            return f"key:{api_key}", self.api_keys[api_key]
+        address = remote_addr or ''
+        if self.trusted_proxies and forwarded_for:
+            hops = [hop.strip() for hop in forwarded_for.split(',') if hop.strip()]
+            if len(hops) >= self.trusted_proxies:
+                address = hops[-self.trusted_proxies]
+        return f"ip:{address}", 1.0
+
+    def limit(self, client):
+        """
+        Spend one of the client's tokens. Raises Rejected when it has none
+        """
+        client_id, weight = client
+        wait = self.buckets.take(client_id, self.rate * weight, self.burst * weight)
+        if wait:
+            self.stats.incr('rejected_rate')
+            raise Rejected('rate', max(1, math.ceil(wait)))
+
+    @contextmanager
+    def slot(self, client):
+        """
+        Hold one of the extraction slots, waiting in fair order
+        """
+        client_id, weight = client
+        queued = self.queue.in_flight >= self.queue.max_in_flight
+        if queued:
+            self.stats.incr('queued')
+        try:
+            self.queue.acquire(client_id, weight, self.queue_timeout)
+        except Rejected as e:
+            self.stats.incr(f"rejected_{e.reason}")
+            raise
+        self.stats.incr('admitted')
+        try:
+            yield
+        finally:
+            self.queue.release()
+
+    @contextmanager
+    def admit(self, client):
+        """
+        limit() then slot()
+        """
+        self.limit(client)
+        with self.slot(client):
+            yield
+
+    def info(self):
+        data = self.stats.snapshot()
+        data.update({
+            'backend': self.buckets.name,
+            'clients': len(self.buckets),
+            'in_flight': self.queue.in_flight,
+            'waiting': self.queue.queued,
+            'max_in_flight': self.queue.max_in_flight,
+            'rate': self.rate,
+            'burst': self.burst
+        })
+        return data
+
+
+_default_controller = None
+_default_controller_lock = threading.Lock()
+
+
+def get_admission_controller():
+    """
+    Build the process-wide admission controller from the environment on
+    first use. Returns None when disabled with ADMISSION=off
+    """
+    global _default_controller
+    if _default_controller is None:
+        with _default_controller_lock:
+            if _default_controller is None:
+                if os.environ.get('ADMISSION', 'on').lower() in ('off', 'none', '0'):
+                    _default_controller = False
+                else:
+                    backend_cls = BUCKETS.get(os.environ.get('ADMISSION_BACKEND', 'memory').lower(), MemoryBuckets)
+                    kwargs = {}
+                    if backend_cls is SQLiteBuckets and os.environ.get('ADMISSION_DB_PATH'):
+                        kwargs['path'] = os.environ['ADMISSION_DB_PATH']
+                    _default_controller = AdmissionController(
+                        backend_cls(**kwargs),
+                        rate=float(os.environ.get('ADMISSION_RATE', 1)),
+                        burst=float(os.environ.get('ADMISSION_BURST', 10)),
+                        queue=FairQueue(
+                            max_in_flight=int(os.environ.get('ADMISSION_MAX_IN_FLIGHT', 16)),
+                            max_queue=int(os.environ.get('ADMISSION_QUEUE_SIZE', 64)),
+                            client_queue=int(os.environ.get('ADMISSION_CLIENT_QUEUE', 4))
+                        ),
+                        queue_timeout=float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 30)),
+                        api_keys=parse_api_keys(os.environ.get('ADMISSION_API_KEYS')),
+                        trusted_proxies=int(os.environ.get('ADMISSION_TRUSTED_PROXIES', 0))
+                    )
+    return _default_controller or None
@@ -1,18 +1,50 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, redirect, send_file
 from flask_bootstrap import Bootstrap
-import yt_dlp
 from urllib.parse import urlparse
-import json
-from video_cdn_extractor import extract_cdn_info
+from extraction_cache import cached_extraction, get_default_cache, canonical_key, load_extractors
+from jobs import get_job_manager, get_download_manager, QueueFull, FINISHED, DONE, sse_message
+from batch import run_batch, expand_playlist, batch_settings, BatchError
+from ydl_pool import get_ydl_pool
+from stream_proxy import get_stream_relay, content_disposition, StreamError
+from metrics import REGISTRY, PHASE_SECONDS, ERRORS
+from extraction_backend import get_extraction_backend, BackendError
+from extractor_guard import get_extractor_guard, Throttled, is_throttle_error
+from format_pipeline import (process_formats, build_video_data, summarize_video_data, filter_formats, known_filesize,
+                             FORMAT_POLICIES)
+from size_probe import get_size_prober, enrich_sizes
+from googlevideo import is_direct_url, decode_direct_url
+from segmented_download import get_downloader, download_name, DownloadProgress, DownloadError, QuotaExceeded
+from thumbnail_cache import (get_thumbnail_cache, ThumbnailError, ThumbnailNotFound, SIZES as THUMB_SIZES,
+                             FORMATS as THUMB_FORMATS, ORIGINAL as THUMB_ORIGINAL)
+from admission import get_admission_controller, Rejected
+from result_model import columnar_formats, json_default, dumps
+from collections.abc import Mapping
+from contextlib import nullcontext
+from flask.json import JSONEncoder
 import os
 from dotenv import load_dotenv
+import gc
+import time
 
 # Load environment variables
 load_dotenv()
 
+class ResultJSONEncoder(JSONEncoder):
+    def default(self, o):
+        if isinstance(o, Mapping):
+            return json_default(o)
+        return super().default(o)
+
 app = Flask(__name__)
+app.json_encoder = ResultJSONEncoder
 Bootstrap(app)
 
+def json_response(data, status=200, headers=None):
+    """
+    jsonify with the fast encoder, for the routes that return results
+    """
+    return Response(dumps(data), status=status, headers=headers, mimetype='application/json')
+
 def is_valid_url(url):
     try:
         result = urlparse(url)
@@ -37,11 +69,26 @@ def handle_extraction_error(error):
     
     for key, value in error_mappings.items():
         if key in error_message:
+            ERRORS.inc(error=key)
             return {"error": value}
     
+    ERRORS.inc(error='other')
     return {"error": f"حدث خطأ: {error_message}"}
 
 def extract_video_info(url):
+    # A direct googlevideo URL describes itself: no cache, no extraction
+    if is_direct_url(url):
+        return decode_direct_url(url)
+    return _cached_video_info(url)
+
+@cached_extraction('app')
+def _cached_video_info(url):
+    try:
+        return get_extraction_backend().run(_extract_video_info, url)
+    except BackendError as e:
+        return handle_extraction_error(e)
+
+def _extract_video_info(url):
     if not is_valid_url(url):
         return {"error": "Invalid URL format"}
 
@@ -50,10 +97,10 @@ def extract_video_info(url):
             'quiet': True,
             'no_warnings': True,
             'extract_flat': False,
-            'format': 'bestvideo[ext=mp4][protocol!*=dash][protocol!*=m3u8]+bestaudio[ext=m4a]/best[ext=mp4][protocol!*=dash][protocol!*=m3u8]/best[protocol!*=dash][protocol!*=m3u8]',
             'cookiefile': 'cookies.txt',
             'no_check_certificates': True,
-            'ignoreerrors': True,
+            # Errors must surface so that throttling reaches the extractor guard
+            'ignoreerrors': False,
             'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'headers': {
                 'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
@@ -87,111 +134,510 @@ def extract_video_info(url):
 
         def try_extract_with_options(ydl_options):
             try:
-                with yt_dlp.YoutubeDL(ydl_options) as ydl:
-                    info = ydl.extract_info(url, download=False)
-                    if info:
-                        # Get direct video URLs
-                        if 'formats' in info:
-                            # Filter and sort formats
-                            formats = [f for f in info['formats'] if 
-                                     f.get('url') and 
-                                     f.get('protocol', '').lower() not in ['m3u8', 'm3u8_native', 'dash', 'dash_manifest'] and
-                                     not any(x in str(f.get('format_note', '')).lower() 
-                                         for x in ['audio only', 'images', 'thumbnail'])]
-                            
-                            # Sort by quality
-                            formats.sort(key=lambda x: (
-                                float(x.get('tbr', 0) or 0),
-                                x.get('height', 0) or 0,
-                                x.get('width', 0) or 0,
-                                x.get('fps', 0) or 0,
-                                x.get('ext', '') == 'mp4'  # Prefer MP4
-                            ), reverse=True)
-                            
-                            # Update format URLs to ensure they're direct
-                            for fmt in formats:
-                                if fmt.get('url'):
-                                    fmt['url'] = fmt['url'].split('?')[0] + '?' + '&'.join([
-                                        param for param in fmt['url'].split('?')[1].split('&')
-                                        if not param.startswith(('range=', 'rn=', 'rbuf=', 'mime='))
-                                    ]) if '?' in fmt['url'] else fmt['url']
-                            
-                            return info, formats
-                    return info, []
+                with get_ydl_pool().session(ydl_options) as ydl:
+                    with PHASE_SECONDS.time(phase='extract_info'):
+                        info = ydl.extract_info(url, download=False)
+                if info and 'formats' in info:
+                    # Direct (non-manifest) formats, best first
+                    with PHASE_SECONDS.time(phase='format_pipeline'):
+                        formats = process_formats(info['formats'], FORMAT_POLICIES, known_filesize)
+                    # Only the compact result outlives yt-dlp's info dict
+                    if formats:
+                        enrich_sizes(formats)
+                        return build_video_data(info, url, formats)
+                return None
             except Exception as e:
-                return None, []
-
-        # Try different format combinations
-        for format_option in [
-            'bestvideo[ext=mp4][protocol!*=dash][protocol!*=m3u8]+bestaudio[ext=m4a]/best[ext=mp4][protocol!*=dash][protocol!*=m3u8]',
-            'best[ext=mp4][protocol!*=dash][protocol!*=m3u8]',
-            'best[protocol!*=dash][protocol!*=m3u8]'
-        ]:
-            ydl_opts = base_opts.copy()
-            ydl_opts['format'] = format_option
-            info, formats = try_extract_with_options(ydl_opts)
-            
-            if info and formats:
-                video_data = {
-                    'title': info.get('title', 'Unknown'),
-                    'thumbnail': info.get('thumbnail', ''),
-                    'description': info.get('description', ''),
-                    'duration': info.get('duration', 0),
-                    'view_count': info.get('view_count', 0),
-                    'platform': info.get('extractor', 'Unknown'),
-                    'watch_url': info.get('webpage_url', url),
-                    'formats': [],
-                    'uploader': info.get('uploader', 'Unknown'),
-                    'upload_date': info.get('upload_date', ''),
-                    'like_count': info.get('like_count', 0),
-                    'channel_url': info.get('channel_url', ''),
-                    'channel_follower_count': info.get('channel_follower_count', 0)
-                }
+                if is_throttle_error(str(e)):
+                    raise Throttled(str(e), handle_extraction_error(e))
+                return None
 
-                # Add formats with direct URLs
-                for fmt in formats:
-                    if fmt.get('protocol', '').lower() not in ['m3u8', 'm3u8_native', 'dash', 'dash_manifest']:
-                        format_info = {
-                            'quality': f"{fmt.get('height', 0)}p" if fmt.get('height') else 'auto',
-                            'format': fmt.get('ext', 'mp4'),
-                            'resolution': f"{fmt.get('width', 'N/A')}x{fmt.get('height', 'N/A')}",
-                            'filesize': fmt.get('filesize', 0),
-                            'url': fmt['url'],
-                            'vcodec': fmt.get('vcodec', 'unknown'),
-                            'acodec': fmt.get('acodec', 'unknown'),
-                            'fps': fmt.get('fps', 'N/A'),
-                            'tbr': fmt.get('tbr', 0)
-                        }
-                        video_data['formats'].append(format_info)
-
-                if video_data['formats']:
-                    default_format = video_data['formats'][0]
-                    video_data.update({
-                        'quality': default_format['quality'],
-                        'resolution': default_format['resolution'],
-                        'format': default_format['format'],
-                        'download_url': default_format['url']
-                    })
-
-                return video_data
+        # A single extraction: the format selector no longer goes to yt-dlp,
+        # the selection policies are applied to the returned formats instead
+        video_data = try_extract_with_options(base_opts)
+        
+        if video_data:
+            return video_data
 
+        ERRORS.inc(error='no_result')
         return {"error": "لم نتمكن من استخراج معلومات الفيديو. قد يكون الفيديو خاص أو مقيد."}
 
+    except Throttled:
+        raise
     except Exception as e:
         return handle_extraction_error(e)
 
+def _cache_info():
+    cache = get_default_cache()
+    return cache.info() if cache is not None else {}
+
+def _refresh_info():
+    cache = get_default_cache()
+    return cache.refresher.info() if cache is not None and cache.refresher else {}
+
+def _guard_info():
+    guard = get_extractor_guard()
+    return guard.info() if guard is not None else {}
+
+def _probe_info():
+    prober = get_size_prober()
+    return prober.info() if prober is not None else {}
+
+def _thumb_info():
+    thumbs = get_thumbnail_cache()
+    return thumbs.info() if thumbs is not None else {}
+
+def _admission_info():
+    controller = get_admission_controller()
+    return controller.info() if controller is not None else {}
+
+def _guard_extractors():
+    guard = get_extractor_guard()
+    return guard.extractors() if guard is not None else {}
+
+REGISTRY.register_collector('extraction_cache', _cache_info)
+REGISTRY.register_collector('cache_refresh', _refresh_info)
+REGISTRY.register_collector('ydl_pool', lambda: get_ydl_pool().info())
+REGISTRY.register_collector('jobs', lambda: get_job_manager().info())
+REGISTRY.register_collector('extraction_backend', lambda: get_extraction_backend().info())
+REGISTRY.register_collector('extractor_guard', _guard_info)
+REGISTRY.register_collector('size_probe', _probe_info)
+REGISTRY.register_collector('thumbnail_cache', _thumb_info)
+REGISTRY.register_collector('downloads', lambda: get_downloader().info())
+REGISTRY.register_collector('download_jobs', lambda: get_download_manager().info())
+REGISTRY.register_collector('admission', _admission_info)
+REGISTRY.register_collector('extractor', _guard_extractors, label='extractor')
+
+# Browser cache lifetime of /thumb responses
+THUMB_MAX_AGE = int(os.environ.get('THUMB_MAX_AGE', 30 * 24 * 3600))
+
+DOWNLOAD_QUOTA_ERROR = "مساحة التحميل على الخادم ممتلئة حالياً. يرجى المحاولة لاحقاً"
+
+# Page size limits for /formats/<video_id>
+FORMATS_PAGE_SIZE = 20
+FORMATS_PAGE_MAX = 100
+
+def result_view(video_data, url, view=None, layout=None):
+    """
+    Shape a result for the response: the full result, or with
+    view='summary' the small fast-path version. layout='columnar' encodes
+    the formats as one array per field. Without the extraction cache the
+    rest of the formats cannot be paged from /formats, so the summary view
+    returns the full result.
+    """
+    if not isinstance(video_data, Mapping) or 'error' in video_data:
+        return video_data
+    if view == 'summary' and get_default_cache():
+        video_data = summarize_video_data(video_data, canonical_key(url))
+    if layout == 'columnar':
+        video_data = dict(video_data, formats=columnar_formats(video_data['formats']))
+    return video_data
+
+def job_view(job, view=None, layout=None):
+    data = job.to_dict()
+    if 'result' in data:
+        data['result'] = result_view(data['result'], job.url, view, layout)
+    return data
+
+def request_client():
+    """
+    The admission client of the current request: its X-API-Key when that
+    is a configured key, else its address
+    """
+    return get_admission_controller().identify(
+        request.remote_addr, request.headers.get('X-Forwarded-For', ''), request.headers.get('X-API-Key', ''))
+
+def rejection_message(error):
+    if error.reason == 'rate':
+        return "تم تجاوز حد الطلبات. يرجى المحاولة بعد قليل"
+    return "الخادم مشغول حالياً. يرجى المحاولة بعد قليل"
+
+def rejected_response(error):
+    return jsonify({"error": rejection_message(error)}), error.status, {'Retry-After': str(error.retry_after)}
+
+def admission_limit():
+    """
+    Spend a token of the request's client. Returns the rejection response
+    when it has none, else None
+    """
+    controller = get_admission_controller()
+    if controller is None:
+        return None
+    try:
+        controller.limit(request_client())
+    except Rejected as e:
+        return rejected_response(e)
+    return None
+
+def admission_slot():
+    """
+    Context manager holding an extraction slot for the request's client
+    """
+    controller = get_admission_controller()
+    return controller.slot(request_client()) if controller is not None else nullcontext()
+
+def admitted(func, client=None):
+    """
+    Wrap `func(url)`, run later by batch or job workers, so that every call
+    holds an extraction slot of `client` (default: the request's client).
+    A call the queue turns away returns an error result
+    """
+    controller = get_admission_controller()
+    if controller is None:
+        return func
+    if client is None:
+        client = request_client()
+
+    def call(url):
+        deadline = time.monotonic() + controller.queue_timeout
+        while True:
+            try:
+                with controller.slot(client):
+                    return func(url)
+            except Rejected as e:
+                # A batch runs more entries at once than one client may
+                # queue; the surplus waits for its turn instead of failing
+                if e.reason != 'queue' or time.monotonic() + e.retry_after > deadline:
+                    return {"error": rejection_message(e)}
+                time.sleep(e.retry_after)
+    return call
+
 @app.route('/')
 def home():
     return render_template('index.html')
 
 @app.route('/extract', methods=['POST'])
 def extract():
+    # Rejected before the body is even read
+    rejected = admission_limit()
+    if rejected is not None:
+        return rejected
     url = request.form.get('url')
     if not url:
         return jsonify({"error": "No URL provided"})
-    
-    video_info = extract_video_info(url)
-    return jsonify(video_info)
+
+    try:
+        with admission_slot():
+            video_info = extract_video_info(url)
+    except Rejected as e:
+        return rejected_response(e)
+    return json_response(result_view(video_info, url, request.form.get('view'), request.form.get('layout')))
+
+@app.route('/extract/batch', methods=['POST'])
+def extract_batch():
+    """
+    Extract many videos at once: either a list of URLs or a single playlist
+    URL whose entries are expanded first. Results are streamed as NDJSON in
+    completion order, one line per entry.
+    """
+    rejected = admission_limit()
+    if rejected is not None:
+        return rejected
+    payload = request.get_json(silent=True) or {}
+    urls = payload.get('urls') or request.form.getlist('urls')
+    playlist = payload.get('url') or request.form.get('url')
+    settings = batch_settings()
+
+    if not urls and playlist:
+        if not is_valid_url(playlist):
+            return jsonify({"error": "Invalid URL format"}), 400
+        try:
+            urls = expand_playlist(playlist, settings['max_entries'])
+        except BatchError as e:
+            return jsonify(handle_extraction_error(e)), 400
+
+    urls = [u.strip() for u in urls if isinstance(u, str) and u.strip()]
+    if not urls:
+        return jsonify({"error": "No URL provided"}), 400
+    if len(urls) > settings['max_entries']:
+        return jsonify({"error": f"Too many URLs (max {settings['max_entries']})"}), 413
+
+    extract_entry = admitted(extract_video_info)
+
+    def stream():
+        yield dumps({'total': len(urls)}) + b"\n"
+        for index, url, result in run_batch(urls, extract_entry, settings['workers'], settings['per_domain']):
+            yield dumps({'index': index, 'url': url, 'result': result}) + b"\n"
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream_with_context(stream()), mimetype='application/x-ndjson', headers=headers)
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    rejected = admission_limit()
+    if rejected is not None:
+        return rejected
+    url = request.form.get('url')
+    if not url:
+        return jsonify({"error": "No URL provided"}), 400
+
+    try:
+        job = get_job_manager().submit('extract', admitted(extract_video_info), url)
+    except QueueFull:
+        return jsonify({"error": "الخادم مشغول حالياً. يرجى المحاولة بعد قليل"}), 429, {'Retry-After': '5'}
+    return json_response(job.to_dict(), 202, {'Location': f"/jobs/{job.id}"})
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return json_response(job_view(job, request.args.get('view'), request.args.get('layout')))
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    view = request.args.get('view')
+    layout = request.args.get('layout')
+
+    def stream():
+        index = 0
+        while True:
+            events = job.wait_for_event(index, timeout=15)
+            if not events:
+                # Keep proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                continue
+            index += len(events)
+            for event in events:
+                yield sse_message(event['status'], event)
+            if events[-1]['status'] in FINISHED:
+                yield sse_message('result', job_view(job, view, layout))
+                return
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream_with_context(stream()), mimetype='text/event-stream', headers=headers)
+
+@app.route('/stream/<stream_id>')
+def stream(stream_id):
+    """
+    Relay a video through the server. `stream_id` is a job id (its default
+    format) or `<job id>-<format index>`. Only URLs from finished jobs can be
+    streamed, so this is not an open proxy.
+    """
+    job_id, _, index = stream_id.partition('-')
+    job = get_job_manager().get(job_id)
+    if job is None or not job.finished or 'error' in job.result:
+        return jsonify({"error": "Job not found"}), 404
+
+    video_data = job.result
+    formats = video_data.get('formats', [])
+    if index:
+        if not index.isdigit() or int(index) >= len(formats):
+            return jsonify({"error": "Format not found"}), 404
+        fmt = formats[int(index)]
+    else:
+        fmt = formats[0] if formats else {'url': video_data.get('download_url'), 'format': video_data.get('format')}
+    if not fmt.get('url'):
+        return jsonify({"error": "Format not found"}), 404
+
+    try:
+        status, headers, chunks = get_stream_relay().open(fmt['url'], request.headers.get('Range'))
+    except StreamError as e:
+        return jsonify(handle_extraction_error(e)), 502
+
+    filename = f"{video_data.get('title', 'video')}_{fmt.get('quality', '')}.{fmt.get('format') or 'mp4'}"
+    headers['Content-Disposition'] = content_disposition(filename)
+    return Response(chunks, status=status, headers=headers, direct_passthrough=True)
+
+def download_video(url, format_index, progress):
+    """
+    Extract `url` and download its format `format_index` to the server's
+    download directory
+    """
+    video_data = extract_video_info(url)
+    if not isinstance(video_data, Mapping) or 'error' in video_data:
+        return video_data
+    formats = video_data.get('formats', [])
+    if format_index >= len(formats):
+        return {"error": "Format not found"}
+    fmt = formats[format_index]
+
+    downloader = get_downloader()
+    path = os.path.join(downloader.directory, download_name(canonical_key(url), fmt))
+    try:
+        summary = downloader.download(fmt['url'], path, fmt.get('filesize') or None, progress)
+    except QuotaExceeded:
+        return {"error": DOWNLOAD_QUOTA_ERROR}
+    except DownloadError as e:
+        return handle_extraction_error(e)
+    title = video_data.get('title', 'video')
+    return dict(summary, title=title, quality=fmt.get('quality'), format=fmt.get('format'),
+                filename=f"{title}_{fmt.get('quality', '')}.{fmt.get('format') or 'mp4'}")
+
+def download_view(job):
+    data = job.to_dict()
+    result = data.get('result')
+    if isinstance(result, Mapping) and 'error' not in result:
+        # The server path stays private
+        data['result'] = {key: value for key, value in result.items() if key != 'path'}
+        data['result']['file'] = f"/downloads/{job.id}/file"
+    return data
+
+@app.route('/downloads', methods=['POST'])
+def create_download():
+    """
+    Download a format of a video to the server, in parallel byte ranges
+    that resume after an interruption. `format` is the format's index in
+    the result (default 0, the best one). Poll /downloads/<id> for
+    progress and fetch the file from /downloads/<id>/file.
+    """
+    rejected = admission_limit()
+    if rejected is not None:
+        return rejected
+    url = request.form.get('url')
+    if not url:
+        return jsonify({"error": "No URL provided"}), 400
+    format_index = request.form.get('format', '0')
+    if not format_index.isdigit():
+        return jsonify({"error": "Invalid format"}), 400
+
+    manager = get_download_manager()
+    try:
+        get_downloader().check_quota(pending=manager.info()['pending'])
+    except QuotaExceeded:
+        return jsonify({"error": DOWNLOAD_QUOTA_ERROR}), 507, {'Retry-After': '300'}
+
+    progress = DownloadProgress()
+    try:
+        job = manager.submit(
+            'download', lambda u: download_video(u, int(format_index), progress), url, progress)
+    except QueueFull:
+        return jsonify({"error": "الخادم مشغول حالياً. يرجى المحاولة بعد قليل"}), 429, {'Retry-After': '30'}
+    return json_response(download_view(job), 202, {'Location': f"/downloads/{job.id}"})
+
+@app.route('/downloads/<job_id>')
+def get_download(job_id):
+    job = get_download_manager().get(job_id)
+    if job is None:
+        return jsonify({"error": "Download not found"}), 404
+    return json_response(download_view(job))
+
+@app.route('/downloads/<job_id>/file')
+def download_file(job_id):
+    job = get_download_manager().get(job_id)
+    if job is None or job.status != DONE or not os.path.exists(job.result['path']):
+        return jsonify({"error": "Download not found"}), 404
+    response = send_file(job.result['path'], conditional=True)
+    response.headers['Content-Disposition'] = content_disposition(job.result['filename'])
+    return response
+
+@app.route('/formats/<path:video_id>')
+def video_formats(video_id):
+    """
+    Page through the formats of a recently extracted video, optionally
+    filtered by `height`, `codec` and `ext`. `video_id` is the one returned
+    in the summary view; each format carries its `index` in the full list
+    (as used by /stream).
+    """
+    cache = get_default_cache()
+    video_data = cache.get(f"app:{video_id}", count=False) if cache else None
+    if video_data is None:
+        return jsonify({"error": "Video not found. Extract it again"}), 404
+
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = min(FORMATS_PAGE_MAX, max(1, int(request.args.get('limit', FORMATS_PAGE_SIZE))))
+        height = request.args.get('height')
+        height = int(height.rstrip('p')) if height else None
+    except ValueError:
+        return jsonify({"error": "Invalid paging or filter parameter"}), 400
+
+    matches = list(filter_formats(video_data.get('formats', []), height,
+                                  request.args.get('codec'), request.args.get('ext')))
+    page = matches[offset:offset + limit]
+    if request.args.get('layout') == 'columnar':
+        formats = columnar_formats([fmt for _, fmt in page])
+        formats['index'] = [index for index, _ in page]
+    else:
+        formats = [dict(fmt, index=index) for index, fmt in page]
+    return json_response({
+        'video_id': video_id,
+        'total': len(matches),
+        'offset': offset,
+        'limit': limit,
+        'formats': formats
+    })
+
+@app.route('/thumb/<path:video_id>')
+def thumbnail(video_id):
+    """
+    The thumbnail of a recently extracted video, resized and cached on
+    the server. `size` is small, medium, large or original; `format` is
+    jpeg or webp, negotiated from the Accept header when not given.
+    """
+    size = request.args.get('size', 'medium')
+    fmt = request.args.get('format')
+    if (size not in THUMB_SIZES and size != THUMB_ORIGINAL) or fmt not in (None, *THUMB_FORMATS):
+        return jsonify({"error": "Invalid size or format"}), 400
+
+    def source():
+        cache = get_default_cache()
+        video_data = cache.get(f"app:{video_id}", count=False) if cache else None
+        return video_data.get('thumbnail') if video_data else None
+
+    thumbs = get_thumbnail_cache()
+    if thumbs is None:
+        url = source()
+        return redirect(url) if url else (jsonify({"error": "Thumbnail not found"}), 404)
+
+    try:
+        data, content_type, etag = thumbs.get(video_id, size, fmt or _thumb_format(), source)
+    except ThumbnailNotFound:
+        return jsonify({"error": "Thumbnail not found. Extract the video again"}), 404
+    except ThumbnailError as e:
+        return jsonify({"error": str(e)}), 502
+
+    response = Response(data, mimetype=content_type)
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = THUMB_MAX_AGE
+    if fmt is None:
+        response.vary.add('Accept')
+    return response.make_conditional(request)
+
+def _thumb_format():
+    return 'webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpeg'
+
+@app.route('/jobs/stats')
+def job_stats():
+    return jsonify(get_job_manager().info())
+
+@app.route('/pool/stats')
+def pool_stats():
+    return jsonify(get_ydl_pool().info())
+
+@app.route('/extractors/stats')
+def extractor_stats():
+    guard = get_extractor_guard()
+    if guard is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(enabled=True, extractors=guard.extractors(), **guard.info()))
+
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache/stats')
+def cache_stats():
+    cache = get_default_cache()
+    if cache is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(enabled=True, refresh=_refresh_info() or None, **cache.info()))
+
+def prewarm():
+    """
+    Load yt-dlp and its extractor classes and move everything loaded so far
+    out of the garbage collector's reach. Called in the gunicorn master with
+    preload_app, so forked workers share these pages copy-on-write instead
+    of each importing yt-dlp on their first request
+    """
+    import yt_dlp  # noqa: F401
+    count = load_extractors()
+    gc.collect()
+    gc.freeze()
+    return count
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,349 @@
+"""
+ASGI entry point serving the same routes and response bodies as app.py.
+
+The endpoints that mostly wait (/extract, /jobs and the job event stream)
+are handled natively: extract_info runs on a dedicated thread pool and the
+event loop only holds the idle connections, so thousands of keep-alive and
+SSE clients cost a socket each instead of a thread each. Every other route
+is the Flask app, run on its own thread pool.
+
+    uvicorn asgi:application --workers 2
+    gunicorn -c gunicorn_asgi.conf.py asgi:application
+"""
+import os
+import asyncio
+import logging
+import threading
+from io import BytesIO
+from contextlib import nullcontext
+from urllib.parse import parse_qs
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app as flask_app, extract_video_info, result_view, job_view, rejection_message, admitted
+from admission import get_admission_controller, Rejected
+from jobs import get_job_manager, QueueFull, FINISHED, sse_message
+from result_model import dumps
+
+logger = logging.getLogger(__name__)
+
+# Native routes only accept small form bodies; anything else goes to Flask
+MAX_FORM_BODY = 64 * 1024
+KEEPALIVE_INTERVAL = 15
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(name):
+    """
+    Build the named process-wide thread pool ('extract' or 'wsgi') from the
+    environment on first use
+    """
+    executor = _executors.get(name)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(name)
+            if executor is None:
+                variable = 'ASGI_EXTRACT_WORKERS' if name == 'extract' else 'ASGI_WSGI_THREADS'
+                executor = ThreadPoolExecutor(
+                    max_workers=int(os.environ.get(variable, 32)),
+                    thread_name_prefix=f"asgi-{name}"
+                )
+                _executors[name] = executor
+    return executor
+
+
+def _header(scope, name):
+    for key, value in scope.get('headers', ()):
+        if key == name:
+            return value.decode('latin1')
+    return ''
+
+
+def _query(scope):
+    return {k: v[0] for k, v in parse_qs(scope['query_string'].decode('latin1')).items()}
+
+
+async def _read_body(receive, limit=None):
+    """
+    Read the request body. Returns None when it is larger than `limit`
+    """
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise ConnectionResetError('client disconnected')
+        body = message.get('body', b'')
+        size += len(body)
+        if limit is not None and size > limit:
+            return None
+        chunks.append(body)
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def _wait_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+def _client(scope):
+    return get_admission_controller().identify(
+        (scope.get('client') or ('', 0))[0], _header(scope, b'x-forwarded-for'), _header(scope, b'x-api-key'))
+
+
+async def _send_rejected(send, error):
+    await _send_json(send, {"error": rejection_message(error)}, error.status,
+                     [('Retry-After', str(error.retry_after))])
+
+
+async def _send_json(send, data, status=200, headers=()):
+    # Same bytes as app.json_response
+    body = dumps(data)
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+        ] + [(k.lower().encode('latin1'), v.encode('latin1')) for k, v in headers]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def extract(scope, receive, send, form):
+    controller = get_admission_controller()
+    if controller is not None:
+        client = _client(scope)
+        try:
+            controller.limit(client)
+        except Rejected as e:
+            return await _send_rejected(send, e)
+    url = form.get('url')
+    if not url:
+        return await _send_json(send, {"error": "No URL provided"})
+
+    def run():
+        # The fair queue waits on the extract pool, not on the event loop
+        with controller.slot(client) if controller is not None else nullcontext():
+            video_info = extract_video_info(url)
+        return result_view(video_info, url, form.get('view'), form.get('layout'))
+
+    loop = asyncio.get_running_loop()
+    try:
+        video_info = await loop.run_in_executor(get_executor('extract'), run)
+    except Rejected as e:
+        return await _send_rejected(send, e)
+    await _send_json(send, video_info)
+
+
+async def create_job(scope, receive, send, form):
+    controller = get_admission_controller()
+    client = None
+    if controller is not None:
+        client = _client(scope)
+        try:
+            controller.limit(client)
+        except Rejected as e:
+            return await _send_rejected(send, e)
+    url = form.get('url')
+    if not url:
+        return await _send_json(send, {"error": "No URL provided"}, 400)
+    try:
+        job = get_job_manager().submit('extract', admitted(extract_video_info, client), url)
+    except QueueFull:
+        return await _send_json(send, {"error": "الخادم مشغول حالياً. يرجى المحاولة بعد قليل"}, 429,
+                                [('Retry-After', '5')])
+    await _send_json(send, job.to_dict(), 202, [('Location', f"/jobs/{job.id}")])
+
+
+async def get_job(scope, receive, send, job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return await _send_json(send, {"error": "Job not found"}, 404)
+    query = _query(scope)
+    await _send_json(send, job_view(job, query.get('view'), query.get('layout')))
+
+
+async def job_events(scope, receive, send, job_id):
+    """
+    The /jobs/<id>/events stream without a thread per subscriber: the job's
+    worker thread wakes this coroutine through the event loop
+    """
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return await _send_json(send, {"error": "Job not found"}, 404)
+
+    query = _query(scope)
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+
+    def notify():
+        try:
+            loop.call_soon_threadsafe(wake.set)
+        except RuntimeError:
+            pass  # loop already closed
+
+    job.add_listener(notify)
+    disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ]
+        })
+        index = 0
+        while True:
+            wake.clear()
+            events = job.events_since(index)
+            if not events:
+                woken = asyncio.ensure_future(wake.wait())
+                done, _ = await asyncio.wait({woken, disconnected}, timeout=KEEPALIVE_INTERVAL,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                woken.cancel()
+                if disconnected in done:
+                    return
+                if not done:
+                    # Keep proxies from closing an idle connection
+                    await send({'type': 'http.response.body', 'body': b": keep-alive\n\n", 'more_body': True})
+                continue
+            index += len(events)
+            body = ''.join(sse_message(event['status'], event) for event in events)
+            if events[-1]['status'] in FINISHED:
+                body += sse_message('result', job_view(job, query.get('view'), query.get('layout')))
+                return await send({'type': 'http.response.body', 'body': body.encode('utf-8')})
+            await send({'type': 'http.response.body', 'body': body.encode('utf-8'), 'more_body': True})
+    finally:
+        job.remove_listener(notify)
+        disconnected.cancel()
+
+
+def _environ(scope, body):
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'SERVER_NAME': (scope.get('server') or ('localhost', 80))[0],
+        'SERVER_PORT': str((scope.get('server') or ('localhost', 80))[1]),
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': BytesIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin1')
+        if name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        elif name == 'content-type':
+            key = 'CONTENT_TYPE'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        value = value.decode('latin1')
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def wsgi_fallback(scope, receive, send, body):
+    """
+    Run the Flask app for one request on the WSGI thread pool. The response
+    is iterated on a single thread (Flask's streamed responses keep their
+    request context there) and every chunk waits for the client, so large
+    downloads keep their backpressure.
+    """
+    loop = asyncio.get_running_loop()
+    gone = threading.Event()
+    disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+    disconnected.add_done_callback(lambda _: gone.set())
+
+    def emit(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    def run():
+        response_start = {}
+
+        def start_response(status, headers, exc_info=None):
+            response_start.update({
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(k.lower().encode('latin1'), v.encode('latin1')) for k, v in headers]
+            })
+
+        iterable = flask_app(_environ(scope, body), start_response)
+        try:
+            started = False
+            for chunk in iterable:
+                if gone.is_set():
+                    return
+                if not started:
+                    emit(response_start)
+                    started = True
+                if chunk:
+                    emit({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            if not started:
+                emit(response_start)
+            emit({'type': 'http.response.body'})
+        finally:
+            close = getattr(iterable, 'close', None)
+            if close is not None:
+                close()
+
+    try:
+        await loop.run_in_executor(get_executor('wsgi'), run)
+    finally:
+        disconnected.cancel()
+
+
+async def lifespan(scope, receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            with _executors_lock:
+                for executor in _executors.values():
+                    executor.shutdown(wait=False)
+                _executors.clear()
+            return await send({'type': 'lifespan.shutdown.complete'})
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(scope, receive, send)
+    if scope['type'] != 'http':
+        return
+
+    method = scope['method']
+    path = scope['path']
+    try:
+        if method == 'GET' and path.startswith('/jobs/') and path != '/jobs/stats':
+            job_id, _, tail = path[len('/jobs/'):].partition('/')
+            if job_id and not tail:
+                return await get_job(scope, receive, send, job_id)
+            if job_id and tail == 'events':
+                return await job_events(scope, receive, send, job_id)
+
+        native_form = (method == 'POST' and path in ('/extract', '/jobs') and
+                       _header(scope, b'content-type').startswith('application/x-www-form-urlencoded'))
+        body = await _read_body(receive, MAX_FORM_BODY if native_form else None)
+        if native_form and body is not None:
+            form = {k: v[0] for k, v in parse_qs(body.decode('utf-8', 'replace')).items()}
+            handler = extract if path == '/extract' else create_job
+            return await handler(scope, receive, send, form)
+        if body is None:
+            return await _send_json(send, {"error": "Request body too large"}, 413)
+        await wsgi_fallback(scope, receive, send, body)
+    except ConnectionResetError:
+        pass
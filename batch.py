@@ -0,0 +1,141 @@
+import os
+import sys
+import logging
+from collections import deque, defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+
+class BatchError(Exception):
+    """
+    Raised when a batch request cannot be turned into a list of entries
+    """
+
+
+def batch_settings():
+    return {
+        'workers': int(os.environ.get('BATCH_WORKERS', 8)),
+        'per_domain': int(os.environ.get('BATCH_PER_DOMAIN', 3)),
+        'max_entries': int(os.environ.get('BATCH_MAX_ENTRIES', 500))
+    }
+
+
+def domain_of(url):
+    netloc = urlparse(url).netloc.lower()
+    # m.youtube.com, www.youtube.com and youtube.com hit the same servers
+    parts = netloc.split(':')[0].split('.')
+    return '.'.join(parts[-2:]) if len(parts) > 2 else '.'.join(parts)
+
+
+def expand_playlist(url, max_entries=500):
+    """
+    Resolve a playlist, channel or profile URL into the watch URLs of its
+    entries without extracting each entry. A plain video URL comes back as
+    a one-element list.
+    """
+    import yt_dlp
+
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'extract_flat': 'in_playlist',
+        'playlistend': max_entries,
+        'socket_timeout': 30
+    }
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(url, download=False)
+    except Exception as e:
+        raise BatchError(str(e))
+
+    if not info:
+        raise BatchError("No information extracted")
+    if info.get('_type') not in ('playlist', 'multi_video'):
+        return [url]
+
+    urls = []
+    for entry in info.get('entries') or []:
+        if not entry:
+            continue
+        entry_url = entry.get('url') or entry.get('webpage_url')
+        if entry_url and entry_url.startswith(('http://', 'https://')):
+            urls.append(entry_url)
+    return urls[:max_entries]
+
+
+def run_batch(urls, func, workers=8, per_domain=3, backlog=None):
+    """
+    Run `func(url)` for every URL and yield `(index, url, result)` in
+    completion order. At most `workers` calls run at once and at most
+    `per_domain` of those target the same site; entries over the domain
+    limit wait for a slot instead of occupying a worker thread.
+
+    `urls` may be any iterable. It is read at most `backlog` entries
+    (default 4 × workers) ahead of the running calls, so a long input is
+    streamed rather than loaded up front. Closing the generator, or an
+    interrupt, returns without waiting for the calls still running.
+    """
+    backlog = backlog or workers * 4
+    source = enumerate(urls)
+    queues = defaultdict(deque)
+    waiting = 0
+    active = defaultdict(int)
+    running = {}
+
+    def call(url):
+        try:
+            return func(url)
+        except Exception as e:
+            logger.error(f"Batch entry {url} failed: {str(e)}")
+            return {"error": f"حدث خطأ: {str(e)}"}
+
+    def read_ahead():
+        nonlocal source, waiting
+        while source is not None and waiting < backlog:
+            entry = next(source, None)
+            if entry is None:
+                source = None
+                break
+            queues[domain_of(entry[1])].append(entry)
+            waiting += 1
+
+    executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='batch')
+
+    def dispatch():
+        nonlocal waiting
+        while True:
+            read_ahead()
+            submitted = False
+            for domain, queue in list(queues.items()):
+                while queue and active[domain] < per_domain and len(running) < workers:
+                    index, url = queue.popleft()
+                    waiting -= 1
+                    active[domain] += 1
+                    running[executor.submit(call, url)] = (index, url, domain)
+                    submitted = True
+                if not queue:
+                    del queues[domain]
+            # Entries just dispatched made room to read further ahead
+            if not submitted or source is None:
+                return
+
+    try:
+        dispatch()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, url, domain = running.pop(future)
+                active[domain] -= 1
+                yield index, url, future.result()
+            dispatch()
+    except BaseException:
+        # Ctrl-C, or the consumer closed the generator: drop the queued
+        # calls and return without waiting for the running ones
+        if sys.version_info >= (3, 9):
+            executor.shutdown(wait=False, cancel_futures=True)
+        else:
+            executor.shutdown(wait=False)
+        raise
+    executor.shutdown()
@@ -0,0 +1,208 @@
+"""
+Latency of well-behaved clients on /extract while others flood it.
+
+The fake extractor has a fixed capacity (--capacity extractions at a time,
+--latency seconds each), like an upstream that throttles. A few light
+clients send one request every --interval seconds while flooders send as
+fast as they get answers: one address, several addresses, or one API key
+with a weight. Runs the single-address flood without admission control,
+then every flood with it, and once more with light clients that used the
+same controller for --warmup seconds before the flood starts. Reports the
+light clients' p50/p99 and how the flooders' requests were answered. Finally checks that two processes
+sharing the SQLite buckets enforce one limit between them. Exits non-zero
+when admission does not at least halve the light clients' p99, when a light
+client is rejected, when a late flood treats the light clients worse than a
+flood that starts with them, or when the shared limit leaks.
+
+    python benchmarks/bench_admission.py --duration 6 --capacity 2 --latency 0.1
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('EXTRACTION_CACHE', 'off')
+
+import logging
+import yt_dlp
+import app
+import admission
+from admission import AdmissionController, FairQueue, MemoryBuckets, SQLiteBuckets
+from fixtures import load_info, FakeYoutubeDL
+
+logging.disable(logging.WARNING)
+
+URL = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+FLOOD_KEY = 'bench-flood-key'
+
+
+class LimitedYoutubeDL(FakeYoutubeDL):
+    """
+    FakeYoutubeDL that runs at most `capacity` extractions at once
+    """
+    slots = None
+
+    def extract_info(self, url, download=False, **kwargs):
+        with self.slots:
+            return super().extract_info(url, download, **kwargs)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def light_client(address, interval, offset, stop, latencies, rejected):
+    client = app.app.test_client()
+    stop.wait(offset)
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = client.post('/extract', data={'url': URL}, environ_base={'REMOTE_ADDR': address})
+        if response.status_code == 200:
+            latencies.append(time.perf_counter() - start)
+        else:
+            rejected.append(response.status_code)
+        stop.wait(max(0.0, interval - (time.perf_counter() - start)))
+
+
+def flooder(address, headers, stop, counts, lock):
+    client = app.app.test_client()
+    while not stop.is_set():
+        response = client.post('/extract', data={'url': URL}, headers=headers,
+                               environ_base={'REMOTE_ADDR': address})
+        status = response.status_code
+        if status != 200 and not response.headers.get('Retry-After'):
+            status = 'no Retry-After'
+        with lock:
+            counts[status] = counts.get(status, 0) + 1
+
+
+def run(name, flood, args, warmup=0):
+    """
+    One scenario: the light clients plus `flood`, a list of
+    (address, headers) per flooding thread. With `warmup` the light clients
+    run alone that many seconds first; only their latencies under the
+    flood are reported
+    """
+    stop = threading.Event()
+    latencies, rejected, counts, lock = [], [], {}, threading.Lock()
+    # Spread over the interval, so that the light clients alone never queue
+    lights = [threading.Thread(target=light_client,
+                               args=(f"10.0.0.{i + 1}", args.interval, i * args.interval / args.light,
+                                     stop, latencies, rejected))
+              for i in range(args.light)]
+    floods = [threading.Thread(target=flooder, args=(address, headers, stop, counts, lock))
+              for address, headers in flood]
+    for thread in lights:
+        thread.start()
+    if warmup:
+        time.sleep(warmup)
+        del latencies[:]
+    for thread in floods:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in lights + floods:
+        thread.join()
+
+    p50, p99 = percentile(latencies, 0.5), percentile(latencies, 0.99)
+    answered = ', '.join(f"{status}: {count}" for status, count in sorted(counts.items(), key=str))
+    print(f"{name:<24} {len(latencies):>6} {p50 * 1000:>8.0f} {p99 * 1000:>8.0f}  {answered}")
+    return p99, rejected, counts
+
+
+def take_shared(path, rate, burst, count, results):
+    buckets = SQLiteBuckets(path)
+    results.put(sum(1 for _ in range(count) if not buckets.take('ip:203.0.113.9', rate, burst)))
+
+
+def check_shared(failures):
+    """
+    Two processes spend the same client's SQLite bucket: together they get
+    the burst, not twice it
+    """
+    directory = tempfile.mkdtemp(prefix='bench_admission_')
+    path = os.path.join(directory, 'buckets.sqlite3')
+    SQLiteBuckets(path)
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=take_shared, args=(path, 0.001, 20, 50, results))
+                 for _ in range(2)]
+    for process in processes:
+        process.start()
+    admitted = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    print(f"\nshared sqlite buckets: 2 processes x 50 requests, burst 20 -> {admitted} admitted")
+    if admitted != 20:
+        failures.append(f"the SQLite buckets admitted {admitted} requests, expected 20")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--duration', type=float, default=6)
+    parser.add_argument('--capacity', type=int, default=2)
+    parser.add_argument('--latency', type=float, default=0.1)
+    parser.add_argument('--light', type=int, default=4, help="well-behaved clients")
+    parser.add_argument('--interval', type=float, default=1.0, help="seconds between a light client's requests")
+    parser.add_argument('--flood', type=int, default=16, help="flooding threads")
+    parser.add_argument('--warmup', type=float, default=10,
+                        help="seconds the light clients run alone before the late flood")
+    args = parser.parse_args()
+
+    LimitedYoutubeDL.configure(load_info('youtube'), latency=args.latency)
+    LimitedYoutubeDL.slots = threading.BoundedSemaphore(args.capacity)
+    yt_dlp.YoutubeDL = LimitedYoutubeDL
+
+    def controller(api_keys=None):
+        return AdmissionController(
+            MemoryBuckets(), rate=1, burst=10,
+            queue=FairQueue(max_in_flight=args.capacity, max_queue=64, client_queue=4),
+            api_keys=api_keys)
+
+    failures = []
+    print(f"{'scenario':<24} {'light':>6} {'p50 ms':>8} {'p99 ms':>8}  flood answers")
+    admission._default_controller = False
+    run('light only', [], args)
+    single = [('10.1.0.1', {})] * args.flood
+    baseline, _, _ = run('flood, no admission', single, args)
+
+    spread = [(f"10.2.0.{i % 12 + 1}", {}) for i in range(args.flood)]
+    scenarios = [
+        ('flood from one address', single, None, 0),
+        ('flood from 12 addresses', spread, None, 0),
+        ('flood with an API key', [('10.3.0.1', {'X-API-Key': FLOOD_KEY})] * args.flood, {FLOOD_KEY: 4.0}, 0),
+        ('late flood, 12 addresses', [(f"10.4.0.{i % 12 + 1}", {}) for i in range(args.flood)], None,
+         args.warmup),
+    ]
+    fresh = None
+    for name, flood, api_keys, warmup in scenarios:
+        admission._default_controller = controller(api_keys)
+        p99, rejected, counts = run(name, flood, args, warmup)
+        if flood is spread:
+            fresh = p99
+        if warmup and p99 > 1.5 * fresh:
+            failures.append(f"{name}: light p99 {p99 * 1000:.0f} ms against {fresh * 1000:.0f} ms "
+                            f"for clients without history")
+        if rejected:
+            failures.append(f"{name}: light clients were rejected ({len(rejected)} times)")
+        if counts.get('no Retry-After'):
+            failures.append(f"{name}: rejections without Retry-After")
+        if p99 > baseline / 2:
+            failures.append(f"{name}: light p99 {p99 * 1000:.0f} ms is not half of {baseline * 1000:.0f} ms")
+
+    check_shared(failures)
+
+    if failures:
+        for line in failures:
+            print(f"FAIL: {line}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
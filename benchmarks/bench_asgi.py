@@ -0,0 +1,196 @@
+"""
+Load-test comparison of the sync (gunicorn gthread, as in the Procfile) and
+ASGI (gunicorn + uvicorn workers) serving modes.
+
+Each mode is started as a real server on a local port with yt-dlp replaced
+by the recorded-fixture fake, then hit with concurrent keep-alive POST
+/extract requests while `--idle` extra clients hold open SSE streams on a
+job that never finishes. Reports latency percentiles, throughput and
+errors per mode.
+
+    python benchmarks/bench_asgi.py --concurrency 32 --requests 2000 --latency 0.05
+    python benchmarks/bench_asgi.py --idle 1000 --concurrency 16 --requests 500
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import subprocess
+import http.client
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from bench_suite import percentile
+
+URL = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+# Extractions of this URL never finish: SSE clients subscribed to its job stay idle
+IDLE_URL = 'https://www.youtube.com/watch?v=idle'
+
+MODES = ['sync', 'asgi']
+
+
+def serve(mode, port, workers, latency):
+    """
+    Run one server in the foreground (the --serve entry point)
+    """
+    os.environ['EXTRACTION_CACHE'] = 'off'
+    os.environ['ADMISSION'] = 'off'
+    import yt_dlp
+    from fixtures import load_info, FakeYoutubeDL
+    from gunicorn.app.base import BaseApplication
+
+    class IdleAwareYoutubeDL(FakeYoutubeDL):
+        def extract_info(self, url, download=False, **kwargs):
+            if url == IDLE_URL:
+                time.sleep(3600)
+            return super().extract_info(url, download, **kwargs)
+
+    IdleAwareYoutubeDL.configure(load_info('youtube'), latency=latency)
+    yt_dlp.YoutubeDL = IdleAwareYoutubeDL
+
+    options = {'bind': f"127.0.0.1:{port}", 'workers': workers, 'loglevel': 'warning', 'backlog': 4096}
+    if mode == 'sync':
+        import app
+        application = app.app
+        options.update({'worker_class': 'gthread', 'threads': 8})
+    else:
+        import asgi
+        application = asgi.application
+        options.update({'worker_class': 'uvicorn.workers.UvicornWorker'})
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return application
+
+    Server().run()
+
+
+def _wait_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            connection.request('GET', '/jobs/stats')
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def _open_idle_streams(port, count):
+    """
+    Subscribe `count` raw sockets to the event stream of a job that never
+    finishes and leave them unread
+    """
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    connection.request('POST', '/jobs', urlencode({'url': IDLE_URL}),
+                       {'Content-Type': 'application/x-www-form-urlencoded'})
+    response = connection.getresponse()
+    location = response.getheader('Location')
+    response.read()
+    sockets = []
+    for _ in range(count):
+        sock = socket.create_connection(('127.0.0.1', port))
+        sock.sendall(f"GET {location}/events HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        sockets.append(sock)
+    return sockets
+
+
+def load(port, requests, concurrency, timeout, max_time=None):
+    body = urlencode({'url': URL})
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+    per_client = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+
+    deadline = time.perf_counter() + max_time if max_time else None
+
+    def client(count):
+        latencies, errors = [], 0
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+        for _ in range(count):
+            if deadline and time.perf_counter() > deadline:
+                break
+            start = time.perf_counter()
+            try:
+                connection.request('POST', '/extract', body, headers)
+                response = connection.getresponse()
+                payload = response.read()
+                if response.status != 200 or b'"error"' in payload:
+                    errors += 1
+                    continue
+            except OSError:
+                errors += 1
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+                continue
+            latencies.append(time.perf_counter() - start)
+        connection.close()
+        return latencies, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(client, per_client))
+    wall = time.perf_counter() - start
+
+    latencies = [value for result in results for value in result[0]]
+    return {
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+        'throughput': len(latencies) / wall,
+        'completed': len(latencies),
+        'errors': sum(result[1] for result in results),
+    }
+
+
+def run_mode(mode, args, port):
+    command = [sys.executable, os.path.abspath(__file__), '--serve', mode, '--port', str(port),
+               '--workers', str(args.workers), '--latency', str(args.latency)]
+    server = subprocess.Popen(command, cwd=ROOT)
+    sockets = []
+    try:
+        _wait_ready(port)
+        sockets = _open_idle_streams(port, args.idle) if args.idle else []
+        load(port, args.concurrency, args.concurrency, args.timeout, args.max_time)  # warm up
+        return load(port, args.requests, args.concurrency, args.timeout, args.max_time)
+    finally:
+        for sock in sockets:
+            sock.close()
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--modes', nargs='+', default=MODES, choices=MODES)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--idle', type=int, default=0, help="idle SSE connections held during the run")
+    parser.add_argument('--workers', type=int, default=1, help="server worker processes")
+    parser.add_argument('--latency', type=float, default=0.05, help="simulated extraction round trip (s)")
+    parser.add_argument('--timeout', type=float, default=30.0, help="client timeout per request (s)")
+    parser.add_argument('--max-time', type=float, default=60.0, help="stop each mode's run after this long (s)")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--serve', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.serve, args.port, args.workers, args.latency)
+
+    print(f"{'mode':<6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>9} {'done':>6} {'errors':>7}")
+    for offset, mode in enumerate(args.modes):
+        metrics = run_mode(mode, args, args.port + offset)
+        print(f"{mode:<6} {metrics['p50'] * 1e3:>8.2f} {metrics['p95'] * 1e3:>8.2f} {metrics['p99'] * 1e3:>8.2f} "
+              f"{metrics['throughput']:>9.1f} {metrics['completed']:>6} {metrics['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
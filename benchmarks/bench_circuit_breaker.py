@@ -0,0 +1,188 @@
+"""
+Extractor guard against a local server that starts answering 429.
+
+A local HTTP server serves small direct video files that yt-dlp's generic
+extractor turns into results. It is healthy, then answers every request
+with 429 for a while, then recovers. Clients extract distinct URLs through
+app.extract_video_info the whole time, once without the guard and once with
+it. Reports per phase how many requests reached the server, how many got a
+result, and latency; and how long the circuit took to close after the
+server recovered. Exits non-zero if the guard did not cut the traffic sent
+during the 429 phase or did not recover.
+
+    python benchmarks/bench_circuit_breaker.py --clients 8 --throttled 6
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('EXTRACTION_CACHE', 'off')
+
+import app
+import extractor_guard
+from bench_suite import percentile
+from extractor_guard import ExtractorGuard
+
+BODY = b'\0' * 4096
+
+
+class ThrottlingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.latency = latency
+        self.throttling = False
+        self.hits = {200: 0, 429: 0}
+        self._lock = threading.Lock()
+
+    def count(self, status):
+        with self._lock:
+            self.hits[status] += 1
+
+    def take_hits(self):
+        with self._lock:
+            hits, self.hits = self.hits, {200: 0, 429: 0}
+        return hits
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        time.sleep(server.latency)
+        if server.throttling:
+            server.count(429)
+            self.send_response(429)
+            self.send_header('Retry-After', '5')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        server.count(200)
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        if self.command == 'GET':
+            self.wfile.write(BODY)
+
+    do_HEAD = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+def run_phase(base, clients, duration, counter):
+    """
+    Extract distinct URLs from `clients` threads for `duration` seconds
+    """
+    latencies = []
+    ok = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client():
+        while time.monotonic() < deadline:
+            with lock:
+                counter[0] += 1
+                url = f"{base}/video/{counter[0]}.mp4"
+            start = time.perf_counter()
+            result = app.extract_video_info(url)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if 'error' not in result:
+                    ok[0] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(latencies), ok[0], latencies
+
+
+def run(guard, server, args):
+    extractor_guard._default_guard = guard
+    base = f"http://127.0.0.1:{server.server_port}"
+    counter = [0]
+    server.take_hits()
+    rows = []
+    closed_after = []
+    for phase, throttling, duration in (('healthy', False, args.healthy), ('throttled', True, args.throttled),
+                                        ('recovered', False, args.recovered)):
+        server.throttling = throttling
+        if phase == 'recovered' and guard:
+            threading.Thread(target=watch_circuit, args=(guard, duration, closed_after), daemon=True).start()
+        requests, ok, latencies = run_phase(base, args.clients, duration, counter)
+        hits = server.take_hits()
+        rows.append((phase, requests, ok, hits[200] + hits[429], latencies))
+    return rows, closed_after[0] if closed_after else None
+
+
+def watch_circuit(guard, timeout, closed_after):
+    """
+    Record how long after the server recovered every circuit was closed
+    """
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        if all(state['circuit'] == 'closed' for state in guard.extractors().values()):
+            closed_after.append(time.monotonic() - started)
+            return
+        time.sleep(0.02)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--healthy', type=float, default=2.0, help="seconds before the server throttles")
+    parser.add_argument('--throttled', type=float, default=6.0, help="seconds of 429 responses")
+    parser.add_argument('--recovered', type=float, default=6.0, help="seconds after the server recovers")
+    parser.add_argument('--latency', type=float, default=0.02, help="server response delay (s)")
+    parser.add_argument('--cooldown', type=float, default=1.0, help="circuit cooldown (s)")
+    args = parser.parse_args()
+
+    server = ThrottlingServer(args.latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # Import yt-dlp and build its extractors outside the measured phases
+    extractor_guard._default_guard = False
+    app.extract_video_info(f"http://127.0.0.1:{server.server_port}/warmup.mp4")
+
+    results = {}
+    print(f"{'guard':<6} {'phase':<10} {'requests':>9} {'results':>8} {'upstream':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, guard in (('off', False), ('on', ExtractorGuard(cooldown=args.cooldown, max_cooldown=args.cooldown * 8,
+                                                             queue_timeout=1))):
+        rows, closed_after = run(guard, server, args)
+        results[name] = {phase: (requests, ok, upstream) for phase, requests, ok, upstream, _ in rows}
+        for phase, requests, ok, upstream, latencies in rows:
+            print(f"{name:<6} {phase:<10} {requests:>9} {ok:>8} {upstream:>9} "
+                  f"{percentile(latencies, 0.5) * 1e3:>8.1f} {percentile(latencies, 0.95) * 1e3:>8.1f}")
+        if guard:
+            info = guard.info()
+            print(f"guard: {info['trips']} trip(s), {info['rejected_open']} rejected while open, "
+                  f"{info['throttled']} throttled extractions, circuit closed "
+                  + (f"{closed_after:.2f}s after recovery" if closed_after is not None else "never"))
+            results['recovered'] = closed_after is not None
+
+    failures = []
+    off_upstream = results['off']['throttled'][2] / max(results['off']['throttled'][0], 1)
+    on_upstream = results['on']['throttled'][2] / max(results['on']['throttled'][0], 1)
+    if on_upstream >= off_upstream / 2:
+        failures.append(f"guard sent {on_upstream:.0%} of throttled-phase requests upstream (without: {off_upstream:.0%})")
+    if not results['recovered']:
+        failures.append("circuit did not close after the server recovered")
+    elif results['on']['recovered'][1] == 0:
+        failures.append("no results after the server recovered")
+    if failures:
+        for line in failures:
+            print(f"FAIL: {line}")
+        sys.exit(1)
+    print(f"\nDuring the 429 phase {on_upstream:.0%} of requests reached the server with the guard, "
+          f"{off_upstream:.0%} without")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Thread vs process extraction backends under CPU-bound extractions.
+
+The fake YoutubeDL burns CPU the way yt-dlp does (JSON decoding of a large
+player response and regex scanning of a watch page) before returning the
+recorded fixture, so threads in one process contend on the GIL. Both
+backends run the same app._extract_video_info; the process backend's
+workers preload this module, which installs the fake.
+
+    python benchmarks/bench_extraction_backend.py --concurrency 8 --requests 200 --processes 4
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('EXTRACTION_CACHE', 'off')
+
+import yt_dlp
+from fixtures import load_info, FakeYoutubeDL
+
+URL = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+_PAGE = ('<script>var ytInitialPlayerResponse = ' + json.dumps(load_info('youtube', format_count=400)) + ';</script>') * 4
+_CONFIG = re.compile(r'ytInitialPlayerResponse\s*=\s*({.+?});', re.DOTALL)
+
+
+class CPUBoundYoutubeDL(FakeYoutubeDL):
+    rounds = int(os.environ.get('BENCH_CPU_ROUNDS', 3))
+
+    def extract_info(self, url, download=False, **kwargs):
+        for _ in range(self.rounds):
+            for match in _CONFIG.finditer(_PAGE):
+                json.loads(match.group(1))
+        return super().extract_info(url, download, **kwargs)
+
+
+CPUBoundYoutubeDL.configure(load_info('youtube'))
+yt_dlp.YoutubeDL = CPUBoundYoutubeDL
+
+import app
+from bench_suite import percentile
+from extraction_backend import ThreadBackend, ProcessBackend, PRELOAD_MODULES
+
+
+def measure(backend, requests, concurrency):
+    def timed(_):
+        start = time.perf_counter()
+        result = backend.run(app._extract_video_info, URL)
+        assert 'error' not in result, result
+        return time.perf_counter() - start
+
+    for _ in range(concurrency):
+        backend.run(app._extract_video_info, URL)  # warm up every worker
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed, range(requests)))
+    wall = time.perf_counter() - start
+    return {
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'throughput': requests / wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    backends = [
+        ('thread', ThreadBackend()),
+        ('process', ProcessBackend(workers=args.processes, preload=['bench_extraction_backend'] + PRELOAD_MODULES)),
+    ]
+    print(f"{os.cpu_count()} CPU(s), {CPUBoundYoutubeDL.rounds} parse rounds per extraction")
+    print(f"{'backend':<8} {'p50 ms':>8} {'p95 ms':>8} {'req/s':>8}")
+    for name, backend in backends:
+        metrics = measure(backend, args.requests, args.concurrency)
+        print(f"{name:<8} {metrics['p50'] * 1e3:>8.1f} {metrics['p95'] * 1e3:>8.1f} {metrics['throughput']:>8.1f}")
+        if hasattr(backend, 'shutdown'):
+            backend.shutdown()
+
+
+if __name__ == '__main__':
+    main()
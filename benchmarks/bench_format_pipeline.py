@@ -0,0 +1,186 @@
+"""
+Micro-benchmark of the shared format pipeline.
+
+Runs format_pipeline.process_formats + build_video_data over recorded-shape
+info dicts with hundreds of formats and compares it with the two copies of
+the processing code that app.py and video_cdn_extractor.py used to carry.
+Outputs are checked for equality before timing.
+
+    python benchmarks/bench_format_pipeline.py --formats 600 --repeat 200
+"""
+import os
+import sys
+import copy
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fixtures import load_info
+from format_pipeline import process_formats, build_video_data, FORMAT_POLICIES
+
+URL = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+
+
+def _video_data(info, url):
+    return {
+        'title': info.get('title', 'Unknown'),
+        'thumbnail': info.get('thumbnail', ''),
+        'description': info.get('description', ''),
+        'duration': info.get('duration', 0),
+        'view_count': info.get('view_count', 0),
+        'platform': info.get('extractor', 'Unknown'),
+        'watch_url': info.get('webpage_url', url),
+        'formats': [],
+        'uploader': info.get('uploader', 'Unknown'),
+        'upload_date': info.get('upload_date', ''),
+        'like_count': info.get('like_count', 0),
+        'channel_url': info.get('channel_url', ''),
+        'channel_follower_count': info.get('channel_follower_count', 0)
+    }
+
+
+def legacy_app(info, url):
+    """
+    Format processing as it was in app.extract_video_info
+    """
+    formats = [f for f in info['formats'] if
+               f.get('url') and
+               f.get('protocol', '').lower() not in ['m3u8', 'm3u8_native', 'dash', 'dash_manifest'] and
+               not any(x in str(f.get('format_note', '')).lower()
+                       for x in ['audio only', 'images', 'thumbnail'])]
+    formats.sort(key=lambda x: (
+        float(x.get('tbr', 0) or 0),
+        x.get('height', 0) or 0,
+        x.get('width', 0) or 0,
+        x.get('fps', 0) or 0,
+        x.get('ext', '') == 'mp4'
+    ), reverse=True)
+    for fmt in formats:
+        if fmt.get('url'):
+            fmt['url'] = fmt['url'].split('?')[0] + '?' + '&'.join([
+                param for param in fmt['url'].split('?')[1].split('&')
+                if not param.startswith(('range=', 'rn=', 'rbuf=', 'mime='))
+            ]) if '?' in fmt['url'] else fmt['url']
+    for policy in FORMAT_POLICIES:
+        matched = next((i for i, fmt in enumerate(formats) if policy(fmt)), None)
+        if matched is not None:
+            formats = [formats[matched]] + formats[:matched] + formats[matched + 1:]
+            break
+
+    video_data = _video_data(info, url)
+    for fmt in formats:
+        if fmt.get('protocol', '').lower() not in ['m3u8', 'm3u8_native', 'dash', 'dash_manifest']:
+            video_data['formats'].append({
+                'quality': f"{fmt.get('height', 0)}p" if fmt.get('height') else 'auto',
+                'format': fmt.get('ext', 'mp4'),
+                'resolution': f"{fmt.get('width', 'N/A')}x{fmt.get('height', 'N/A')}",
+                'filesize': fmt.get('filesize', 0),
+                'url': fmt['url'],
+                'vcodec': fmt.get('vcodec', 'unknown'),
+                'acodec': fmt.get('acodec', 'unknown'),
+                'fps': fmt.get('fps', 'N/A'),
+                'tbr': fmt.get('tbr', 0)
+            })
+    return _with_default(video_data)
+
+
+def legacy_cdn(info, url):
+    """
+    Format processing as it was in video_cdn_extractor.extract_cdn_info
+    """
+    formats = []
+    for f in info['formats']:
+        if not f.get('url'):
+            continue
+        if f.get('protocol', '').lower() in ['m3u8', 'm3u8_native', 'dash', 'dash_manifest']:
+            continue
+        if any(x in str(f.get('format_note', '')).lower() for x in ['audio only', 'images', 'thumbnail']):
+            continue
+        formats.append(f)
+    formats.sort(key=lambda x: (
+        float(x.get('tbr', 0) or 0),
+        x.get('height', 0) or 0,
+        x.get('width', 0) or 0,
+        x.get('fps', 0) or 0,
+        x.get('ext', '') == 'mp4'
+    ), reverse=True)
+
+    video_data = _video_data(info, url)
+    for fmt in formats:
+        video_url = fmt['url']
+        if '?' in video_url:
+            base_url = video_url.split('?')[0]
+            params = [
+                param for param in video_url.split('?')[1].split('&')
+                if not param.startswith(('range=', 'rn=', 'rbuf=', 'mime='))
+            ]
+            video_url = f"{base_url}?{'&'.join(params)}" if params else base_url
+        video_data['formats'].append({
+            'quality': f"{fmt.get('height', 0)}p" if fmt.get('height') else 'auto',
+            'format': fmt.get('ext', 'mp4'),
+            'resolution': f"{fmt.get('width', 'N/A')}x{fmt.get('height', 'N/A')}",
+            'filesize': fmt.get('filesize', 0),
+            'url': video_url,
+            'vcodec': fmt.get('vcodec', 'unknown'),
+            'acodec': fmt.get('acodec', 'unknown'),
+            'fps': fmt.get('fps', 'N/A'),
+            'tbr': fmt.get('tbr', 0)
+        })
+    return _with_default(video_data)
+
+
+def _with_default(video_data):
+    if video_data['formats']:
+        default_format = video_data['formats'][0]
+        video_data.update({
+            'quality': default_format['quality'],
+            'resolution': default_format['resolution'],
+            'format': default_format['format'],
+            'download_url': default_format['url']
+        })
+    return video_data
+
+
+def pipeline_app(info, url):
+    return build_video_data(info, url, process_formats(info['formats'], FORMAT_POLICIES))
+
+
+def pipeline_cdn(info, url):
+    return build_video_data(info, url, process_formats(info['formats']))
+
+
+def _comparable(video_data):
+    # The old app code left a bare '?' on URLs whose whole query was stripped
+    data = dict(video_data, formats=[dict(f, url=f['url'].rstrip('?')) for f in video_data['formats']])
+    data['download_url'] = data.get('download_url', '').rstrip('?')
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--formats', type=int, default=600, help="formats per recorded info dict")
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    fixtures = {
+        'youtube': load_info('youtube', format_count=args.formats),
+        'vimeo': load_info('vimeo', format_count=args.formats),
+    }
+    pairs = [('app', legacy_app, pipeline_app), ('cdn', legacy_cdn, pipeline_cdn)]
+
+    print(f"{'fixture':<8} {'path':<4} {'legacy us':>10} {'pipeline us':>12} {'speedup':>8}")
+    for name, info in fixtures.items():
+        for path, legacy, pipeline in pairs:
+            legacy_info = copy.deepcopy(info)
+            pipeline_info = copy.deepcopy(info)
+            expected = _comparable(legacy(copy.deepcopy(info), URL))
+            assert _comparable(pipeline(pipeline_info, URL)) == expected, f"{name}/{path} output differs"
+
+            legacy_time = min(timeit.repeat(lambda: legacy(legacy_info, URL), number=args.repeat, repeat=3)) / args.repeat
+            pipeline_time = min(timeit.repeat(lambda: pipeline(pipeline_info, URL), number=args.repeat, repeat=3)) / args.repeat
+            print(f"{name:<8} {path:<4} {legacy_time * 1e6:>10.1f} {pipeline_time * 1e6:>12.1f} {legacy_time / pipeline_time:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
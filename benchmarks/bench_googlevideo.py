@@ -0,0 +1,142 @@
+"""
+Throughput and accuracy of the direct googlevideo URL decoder.
+
+Builds a corpus of videoplayback URLs from the recorded YouTube fixtures,
+plus one URL for every itag in the table, and checks every decoded format
+against the fixture's own fields (and the itag table against yt-dlp's).
+Then decodes the corpus with decode_direct_url and through
+extract_cdn_info, reporting URLs/s and microseconds per URL. Exits non-zero
+on any mismatch.
+
+    python benchmarks/bench_googlevideo.py --videos 200 --rounds 5
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fixtures import youtube_info
+from googlevideo import ITAGS, is_direct_url, decode_direct_url, decode_format
+from result_model import NA
+
+# yt-dlp's itag table names codecs by family
+CODEC_FAMILIES = {'h264': 'avc1', 'aac': 'mp4a'}
+
+NOT_DIRECT = [
+    'https://manifest.googlevideo.com/api/manifest/dash/expire/1792282246/id/o-abc',
+    'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+    'https://example.com/videoplayback?itag=22',
+    'https://player.vimeo.com/video/76979871',
+]
+
+
+def itag_url(itag, ext, clen=10 ** 7, dur='120.5'):
+    kind = 'audio' if ITAGS[itag][1] is NA else 'video'
+    subtype = 'mp4' if ext == 'm4a' else ext
+    return (f"https://rr1---sn-a.googlevideo.com/videoplayback?expire=1792282246&itag={itag}"
+            f"&mime={kind}%2F{subtype}&clen={clen}&dur={dur}&sig=AJfQdSswRQIh")
+
+
+def check_fixtures(videos):
+    """
+    Decode every fixture format URL and compare with the fixture's fields.
+    Returns (urls, mismatches)
+    """
+    urls = []
+    mismatches = []
+    for seed in range(videos):
+        for fmt in youtube_info(seed=seed)['formats']:
+            url = fmt['url']
+            if not is_direct_url(url):
+                continue
+            urls.append(url)
+            decoded, duration = decode_format(url)
+            clen = int(url.split('&clen=', 1)[1].split('&', 1)[0])
+            expected = {
+                'ext': fmt['ext'], 'width': fmt['width'] or NA, 'height': fmt['height'] or NA,
+                'fps': fmt['fps'] or NA, 'vcodec': fmt['vcodec'], 'acodec': fmt['acodec'], 'filesize': clen
+            }
+            for field, value in expected.items():
+                if getattr(decoded, field) != value:
+                    mismatches.append(f"itag {fmt['format_id']} {field}: {getattr(decoded, field)!r} != {value!r}")
+            if duration != 212.091 or not decoded.tbr:
+                mismatches.append(f"itag {fmt['format_id']}: duration {duration}, tbr {decoded.tbr}")
+    return urls, mismatches
+
+
+def check_table():
+    """
+    Decode one URL per itag and compare the table with yt-dlp's, where
+    yt-dlp knows the itag
+    """
+    mismatches = []
+    try:
+        from yt_dlp.extractor.youtube import YoutubeIE
+        reference = YoutubeIE._formats
+    except ImportError:
+        reference = {}
+    urls = []
+    for itag, (ext, width, height, fps, vcodec, acodec) in ITAGS.items():
+        url = itag_url(itag, ext)
+        urls.append(url)
+        result = decode_direct_url(url)
+        decoded = result['formats'][0]
+        if decoded['format'] != ext or decoded['filesize'] != 10 ** 7 or result['duration'] != 120:
+            mismatches.append(f"itag {itag}: {dict(decoded)}")
+        known = reference.get(str(itag), {})
+        for field, value in (('ext', ext), ('width', width), ('height', height), ('fps', fps)):
+            if known.get(field) and known[field] != value:
+                mismatches.append(f"itag {itag} {field}: {value!r}, yt-dlp says {known[field]!r}")
+        for field, value in (('vcodec', vcodec), ('acodec', acodec)):
+            family = CODEC_FAMILIES.get(known.get(field), known.get(field))
+            if family and not value.startswith(family[:4]):
+                mismatches.append(f"itag {itag} {field}: {value!r}, yt-dlp says {known[field]!r}")
+
+    unknown, _ = decode_format("https://rr1---sn-a.googlevideo.com/videoplayback?itag=9999&mime=audio%2Fwebm")
+    if (unknown.ext, unknown.vcodec, unknown.height, unknown.filesize) != ('webm', 'none', NA, 0):
+        mismatches.append(f"unknown itag: {dict(unknown)}")
+    for url in NOT_DIRECT:
+        if is_direct_url(url):
+            mismatches.append(f"not a direct URL: {url}")
+    return urls, mismatches
+
+
+def throughput(func, urls, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for url in urls:
+            func(url)
+    elapsed = time.perf_counter() - start
+    count = len(urls) * rounds
+    return count / elapsed, elapsed / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--videos', type=int, default=200, help="fixture videos in the corpus")
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    fixture_urls, mismatches = check_fixtures(args.videos)
+    table_urls, table_mismatches = check_table()
+    mismatches += table_mismatches
+    urls = fixture_urls + table_urls
+    print(f"corpus: {len(urls)} URLs, {len(ITAGS)} itags, {len(mismatches)} mismatches")
+
+    import video_cdn_extractor
+    print(f"{'path':<20} {'URLs/s':>10} {'us/URL':>8}")
+    for name, func in (('decode_direct_url', decode_direct_url),
+                       ('extract_cdn_info', video_cdn_extractor.extract_cdn_info)):
+        rate, micros = throughput(func, urls, args.rounds)
+        print(f"{name:<20} {rate:>10.0f} {micros:>8.1f}")
+
+    if mismatches:
+        for line in mismatches[:20]:
+            print(f"FAIL: {line}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Import-time benchmark and regression check.
+
+Imports each entry point in a fresh interpreter under `python -X importtime`
+and reports the median total import time plus the heaviest modules. Fails
+when a module that should load on first use (yt-dlp, browser_cookie3, the
+CDN extractor) is imported at startup, or when a run is slower than a
+stored baseline by more than the threshold.
+
+    python benchmarks/bench_import.py --runs 7
+    python benchmarks/bench_import.py --save-baseline benchmarks/import_baseline.json
+    python benchmarks/bench_import.py --baseline benchmarks/import_baseline.json --threshold 0.25
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_suite import compare
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+TARGETS = ['app', 'asgi']
+# Loaded on first use only; importing any of these at startup is a regression
+LAZY_MODULES = ['yt_dlp', 'browser_cookie3', 'video_cdn_extractor', 'multiprocessing']
+
+
+def import_once(target):
+    """
+    Import `target` in a fresh interpreter. Returns {module: cumulative us}
+    and the lazy modules that got imported anyway
+    """
+    check = f"import sys, {target}; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', check],
+        cwd=ROOT, capture_output=True, text=True,
+        env=dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {target} failed:\n{proc.stderr}")
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, _, cumulative_us, name = (part.strip() for part in line.replace('import time:', '|').split('|'))
+        modules[name] = int(cumulative_us)
+    loaded = [name for name in proc.stdout.strip().split(',') if name]
+    return modules, loaded
+
+
+def measure(target, runs, top):
+    totals = []
+    heaviest = {}
+    for _ in range(runs):
+        modules, loaded = import_once(target)
+        totals.append(modules[target] / 1e6)
+        for name, cumulative in modules.items():
+            heaviest.setdefault(name, []).append(cumulative)
+    top_modules = sorted(
+        ((name, statistics.median(values) / 1e3) for name, values in heaviest.items()
+         if name not in (target, 'site') and '.' not in name),
+        key=lambda item: item[1], reverse=True
+    )[:top]
+    return {'import_s': statistics.median(totals)}, top_modules, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--targets', nargs='+', default=TARGETS)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=8, help="heaviest top-level modules to list")
+    parser.add_argument('--baseline', help="fail if slower than this baseline JSON")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed regression (fraction)")
+    parser.add_argument('--save-baseline', help="write the results to this path")
+    args = parser.parse_args()
+
+    results = {}
+    eager = []
+    for target in args.targets:
+        metrics, top_modules, loaded = measure(target, args.runs, args.top)
+        results[target] = metrics
+        print(f"import {target}: {metrics['import_s'] * 1e3:.1f} ms (median of {args.runs})")
+        for name, ms in top_modules:
+            print(f"  {name:<28} {ms:>8.1f} ms")
+        eager.extend(f"{target} imports {name}" for name in loaded)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.save_baseline}")
+
+    failures = list(eager)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failures.extend(compare(results, baseline, args.threshold))
+    if failures:
+        print("\nImport regressions:")
+        for line in failures:
+            print(f"  {line}")
+        sys.exit(1)
+    if args.baseline:
+        print(f"\nNo regression beyond {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Memory per cached result and serialization time: the result dicts the
+pipeline used to build vs result_model.VideoResult.
+
+Each result is built from its own copy of a recorded-shape info dict, which
+is dropped right after, so the retained size is what a cache entry costs.
+
+    python benchmarks/bench_result_model.py --formats 200 --entries 200
+"""
+import os
+import gc
+import sys
+import copy
+import json
+import timeit
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import result_model
+from fixtures import load_info
+from bench_format_pipeline import legacy_app, pipeline_app, URL
+from result_model import columnar_formats
+
+
+def retained_per_entry(build, info, entries):
+    gc.collect()
+    tracemalloc.start()
+    results = []
+    for _ in range(entries):
+        copied = copy.deepcopy(info)
+        results.append(build(copied, URL))
+        del copied
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current / entries, results[0]
+
+
+def per_call(func, repeat):
+    return min(timeit.repeat(func, number=repeat, repeat=3)) / repeat
+
+
+def stdlib_dumps(obj):
+    return json.dumps(obj, default=result_model.json_default, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--formats', type=int, default=200, help="formats per recorded info dict")
+    parser.add_argument('--entries', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    info = load_info('youtube', format_count=args.formats)
+    legacy_size, legacy = retained_per_entry(legacy_app, info, args.entries)
+    model_size, model = retained_per_entry(pipeline_app, info, args.entries)
+    assert json.loads(stdlib_dumps(model)) == json.loads(json.dumps(legacy)), "serialized results differ"
+
+    print(f"{len(model['formats'])} formats per result, orjson {'available' if result_model.orjson else 'not installed'}")
+    print(f"{'representation':<28} {'KB/entry':>9} {'JSON KB':>8} {'dumps us':>9}")
+    rows = [
+        ('dict + json.dumps', legacy_size, lambda: json.dumps(legacy, ensure_ascii=False).encode()),
+        ('VideoResult + stdlib json', model_size, lambda: stdlib_dumps(model)),
+        ('VideoResult + dumps', model_size, lambda: result_model.dumps(model)),
+        ('columnar formats + dumps', model_size,
+         lambda: result_model.dumps(dict(model, formats=columnar_formats(model['formats'])))),
+    ]
+    for name, size, encode in rows:
+        print(f"{name:<28} {size / 1024:>9.1f} {len(encode()) / 1024:>8.1f} {per_call(encode, args.repeat) * 1e6:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+"""
+Segmented downloads against a local Range-capable HTTP server.
+
+The server holds a random file and limits every connection to --rate MB/s,
+like a CDN that throttles each connection. Downloads it over one plain
+streaming connection, then with SegmentedDownloader at several connection
+counts, and reports throughput. Then interrupts a download halfway (the
+server starts failing) and resumes it, reporting how many bytes the
+resume fetched again. Then runs a download through POST /downloads and
+polls its progress, and checks that the directory quota refuses
+downloads and that files past their retention are deleted. Every file is
+checked against the source's SHA-256; exits non-zero on any mismatch.
+
+    python benchmarks/bench_segmented_download.py --size-mb 64 --rate 8
+"""
+import os
+import sys
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('EXTRACTION_CACHE', 'off')
+
+import requests
+import segmented_download
+from segmented_download import SegmentedDownloader, DownloadProgress, DownloadError, QuotaExceeded
+
+WRITE_SIZE = 64 * 1024
+
+
+class RangeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, body, rate):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.body = body
+        self.rate = rate
+        self.served = 0
+        # Fail requests once this many bytes were served in total
+        self.fail_after = None
+        self._lock = threading.Lock()
+
+    def take_served(self):
+        with self._lock:
+            served, self.served = self.served, 0
+        return served
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        size = len(server.body)
+        start, end = 0, size - 1
+        header = self.headers.get('Range')
+        if server.fail_after is not None and server.served >= server.fail_after:
+            self.send_error(503)
+            return
+        if header and header.startswith('bytes='):
+            first, _, last = header[6:].partition('-')
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        if self.command == 'HEAD':
+            return
+        offset = start
+        try:
+            while offset <= end:
+                if server.fail_after is not None and server.served >= server.fail_after:
+                    # Drop the connection mid-body
+                    self.close_connection = True
+                    return
+                chunk = server.body[offset:min(end + 1, offset + WRITE_SIZE)]
+                self.wfile.write(chunk)
+                offset += len(chunk)
+                with server._lock:
+                    server.served += len(chunk)
+                time.sleep(len(chunk) / server.rate)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    do_HEAD = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+def single_connection(url, path):
+    with requests.get(url, stream=True) as response, open(path, 'wb') as f:
+        for chunk in response.iter_content(256 * 1024):
+            f.write(chunk)
+
+
+def sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def check_api(base, size, expected, directory, failures):
+    """
+    POST /downloads for the file and poll its progress until done
+    """
+    import app
+
+    segmented_download._default_downloader = SegmentedDownloader(directory, connections=8,
+                                                                 segment_size=2 * 1024 * 1024)
+    client = app.app.test_client()
+    job = client.post('/downloads', data={'url': f"{base}/video/api.mp4"}).get_json()
+    polls = []
+    while True:
+        data = client.get(f"/downloads/{job['id']}").get_json()
+        if data.get('progress'):
+            polls.append(data['progress'])
+        if data['status'] in ('done', 'failed'):
+            break
+        time.sleep(0.2)
+    if data['status'] != 'done':
+        failures.append(f"API download failed: {data.get('result')}")
+        return
+    body = client.get(data['result']['file']).data
+    last = polls[-1] if polls else {}
+    print(f"api      {data['result']['size'] / 1e6:>6.1f} MB in {data['result']['elapsed']:.2f}s, "
+          f"{len(polls)} progress polls, last: {last.get('percent')}% at {last.get('speed', 0) / 1e6:.1f} MB/s")
+    if hashlib.sha256(body).hexdigest() != expected or len(body) != size:
+        failures.append("file served by /downloads/<id>/file differs from the source")
+
+
+def check_quota(base, size, directory, failures):
+    """
+    A directory allowed two files refuses a third, through the downloader
+    and through POST /downloads, until one of them passes its retention
+    """
+    import app
+
+    downloader = SegmentedDownloader(directory, connections=8, segment_size=2 * 1024 * 1024,
+                                     retention=600, max_files=2)
+    paths = [os.path.join(directory, f"quota_{i}.mp4") for i in range(3)]
+    for path in paths[:2]:
+        downloader.download(f"{base}/video/{os.path.basename(path)}", path, size)
+    refused = []
+    try:
+        downloader.download(f"{base}/video/quota_2.mp4", paths[2], size)
+    except QuotaExceeded as e:
+        refused.append(str(e))
+    segmented_download._default_downloader = downloader
+    status = app.app.test_client().post('/downloads', data={'url': f"{base}/video/api2.mp4"}).status_code
+
+    # Unused for longer than the retention: deleted on the next check
+    old = time.time() - 601
+    os.utime(paths[0], (old, old))
+    downloader.check_quota()
+    downloader.download(f"{base}/video/quota_2.mp4", paths[2], size)
+    print(f"quota    third download refused: {bool(refused)}, POST /downloads when full: {status}, "
+          f"expired file deleted: {not os.path.exists(paths[0])}")
+    if not refused or status != 507:
+        failures.append("the file quota did not refuse a download")
+    if os.path.exists(paths[0]) or not os.path.exists(paths[2]):
+        failures.append("a file past its retention was not deleted")
+
+    small = SegmentedDownloader(os.path.join(directory, 'small'), max_bytes=size // 2)
+    try:
+        small.download(f"{base}/video/big.mp4", os.path.join(small.directory, 'big.mp4'), size)
+        failures.append("the size quota did not refuse a file larger than it")
+    except QuotaExceeded:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size-mb', type=float, default=64)
+    parser.add_argument('--rate', type=float, default=8, help="per-connection limit (MB/s)")
+    parser.add_argument('--connections', default='1,4,8')
+    parser.add_argument('--segment-mb', type=float, default=4)
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+    body = os.urandom(size)
+    expected = hashlib.sha256(body).hexdigest()
+    server = RangeServer(body, args.rate * 1024 * 1024)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    url = f"{base}/video/file.mp4"
+    segment_size = int(args.segment_mb * 1024 * 1024)
+    directory = tempfile.mkdtemp(prefix='bench_download_')
+    failures = []
+    try:
+        print(f"{'method':<16} {'seconds':>8} {'MB/s':>8}")
+        path = os.path.join(directory, 'single.mp4')
+        start = time.perf_counter()
+        single_connection(url, path)
+        elapsed = time.perf_counter() - start
+        print(f"{'single':<16} {elapsed:>8.2f} {size / elapsed / 1e6:>8.1f}")
+        if sha256(path) != expected:
+            failures.append("single-connection download differs from the source")
+
+        for connections in (int(n) for n in args.connections.split(',')):
+            downloader = SegmentedDownloader(directory, connections=connections, segment_size=segment_size)
+            path = os.path.join(directory, f"segmented_{connections}.mp4")
+            start = time.perf_counter()
+            downloader.download(url, path, size)
+            elapsed = time.perf_counter() - start
+            print(f"{f'segmented x{connections}':<16} {elapsed:>8.2f} {size / elapsed / 1e6:>8.1f}")
+            if sha256(path) != expected or os.path.getsize(path) != size:
+                failures.append(f"segmented download with {connections} connections differs from the source")
+
+        # Interrupt halfway, then resume
+        downloader = SegmentedDownloader(directory, connections=8, segment_size=segment_size, retries=0)
+        path = os.path.join(directory, 'resumed.mp4')
+        server.take_served()
+        server.fail_after = size // 2
+        first = 0
+        try:
+            downloader.download(url, path, size)
+            failures.append("the interrupted download did not fail")
+        except DownloadError as e:
+            first = server.take_served()
+            print(f"\ninterrupted after {first / 1e6:.1f} MB: {e}")
+        server.fail_after = None
+        progress = DownloadProgress()
+        summary = downloader.download(url, path, size, progress)
+        second = server.take_served()
+        print(f"resumed: {summary['resumed'] / 1e6:.1f} MB kept, {second / 1e6:.1f} MB fetched "
+              f"({(first + second) / size:.2f}x the file in total)")
+        if sha256(path) != expected:
+            failures.append("resumed download differs from the source")
+        if not summary['resumed'] or first + second > size * 1.5:
+            failures.append("the resumed download started over")
+        if os.path.exists(f"{path}.part") or os.path.exists(f"{path}.part.json"):
+            failures.append("partial files left behind")
+
+        check_api(base, size, expected, os.path.join(directory, 'api'), failures)
+        check_quota(base, size, os.path.join(directory, 'quota'), failures)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if failures:
+        for line in failures:
+            print(f"FAIL: {line}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Latency saved by the single-pass extract_video_info.
+
+The old code passed three format selectors to yt-dlp one after the other,
+paying a full extraction round trip for each selector that failed. The
+new code extracts once and applies the same policies locally. This replays
+a recorded info dict through a fake YoutubeDL with a simulated round trip
+and times both: the old selector loop (the same steps per selector as
+before the single pass) and the current extract_video_info. The common case, where the first
+selector succeeds, is reported apart from the cases where one or two
+selectors fail first. Exits non-zero when the new code makes more than
+one extraction per request or returns an error.
+
+    python benchmarks/bench_single_pass.py --latency 0.5 --requests 20
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('EXTRACTION_CACHE', 'off')
+
+import yt_dlp
+import app
+from fixtures import load_info, FakeYoutubeDL
+
+URL = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+
+LEGACY_SELECTORS = [
+    'bestvideo[ext=mp4][protocol!*=dash][protocol!*=m3u8]+bestaudio[ext=m4a]/best[ext=mp4][protocol!*=dash][protocol!*=m3u8]',
+    'best[ext=mp4][protocol!*=dash][protocol!*=m3u8]',
+    'best[protocol!*=dash][protocol!*=m3u8]'
+]
+
+CASES = [
+    (0, 'common: first selector works'),
+    (1, 'one selector fails'),
+    (2, 'worst: two selectors fail'),
+]
+
+STREAMING_PROTOCOLS = ['m3u8', 'm3u8_native', 'dash', 'dash_manifest']
+
+
+def legacy_extract(url):
+    """
+    The old selector loop: a fresh YoutubeDL and a full extraction per
+    selector until one returns formats
+    """
+    base_opts = {'quiet': True, 'no_warnings': True, 'ignoreerrors': True, 'cookiefile': 'cookies.txt'}
+    for selector in LEGACY_SELECTORS:
+        try:
+            with yt_dlp.YoutubeDL(dict(base_opts, format=selector)) as ydl:
+                info = ydl.extract_info(url, download=False)
+        except Exception:
+            info = None
+        if not info or 'formats' not in info:
+            continue
+        formats = [f for f in info['formats']
+                   if f.get('url') and f.get('protocol', '').lower() not in STREAMING_PROTOCOLS
+                   and not any(x in str(f.get('format_note', '')).lower()
+                               for x in ['audio only', 'images', 'thumbnail'])]
+        formats.sort(key=lambda x: (float(x.get('tbr', 0) or 0), x.get('height', 0) or 0,
+                                    x.get('width', 0) or 0, x.get('fps', 0) or 0,
+                                    x.get('ext', '') == 'mp4'), reverse=True)
+        for fmt in formats:
+            if '?' in fmt['url']:
+                base, query = fmt['url'].split('?', 1)
+                fmt['url'] = base + '?' + '&'.join(
+                    param for param in query.split('&') if not param.startswith(('range=', 'rn=', 'rbuf=', 'mime=')))
+        if not formats:
+            continue
+        video_data = {
+            'title': info.get('title', 'Unknown'),
+            'thumbnail': info.get('thumbnail', ''),
+            'duration': info.get('duration', 0),
+            'platform': info.get('extractor', 'Unknown'),
+            'formats': [{
+                'quality': f"{fmt.get('height', 0)}p" if fmt.get('height') else 'auto',
+                'format': fmt.get('ext', 'mp4'),
+                'resolution': f"{fmt.get('width', 'N/A')}x{fmt.get('height', 'N/A')}",
+                'filesize': fmt.get('filesize', 0),
+                'url': fmt['url'],
+            } for fmt in formats]
+        }
+        video_data['download_url'] = video_data['formats'][0]['url']
+        return video_data
+    return {"error": "no selector matched"}
+
+
+def measure(func, requests, latency, failing):
+    """
+    Mean seconds and extract_info calls per request of `func(URL)`, after
+    an untimed call that warms up pools and imports
+    """
+    FakeYoutubeDL.configure(load_info('youtube'), failing_formats=failing)
+    func(URL)
+    FakeYoutubeDL.configure(load_info('youtube'), latency=latency, failing_formats=failing)
+    start = time.perf_counter()
+    for _ in range(requests):
+        result = func(URL)
+        if 'error' in result:
+            return None, FakeYoutubeDL.calls / requests
+    return (time.perf_counter() - start) / requests, FakeYoutubeDL.calls / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.5, help="simulated extraction round trip (s)")
+    args = parser.parse_args()
+    yt_dlp.YoutubeDL = FakeYoutubeDL
+
+    failures = []
+    print(f"{'case':<30} {'old calls':>9} {'new calls':>9} {'old ms':>8} {'new ms':>8} {'saved ms':>9}")
+    for failing, name in CASES:
+        selectors = LEGACY_SELECTORS[:failing]
+        old, old_calls = measure(legacy_extract, args.requests, args.latency, selectors)
+        new, new_calls = measure(app.extract_video_info, args.requests, args.latency, selectors)
+        if new is None or new_calls != 1:
+            failures.append(f"{name}: new code made {new_calls} calls/request, error: {new is None}")
+            continue
+        print(f"{name:<30} {old_calls:>9.1f} {new_calls:>9.1f} {old * 1000:>8.1f} {new * 1000:>8.1f} "
+              f"{(old - new) * 1000:>9.1f}")
+
+    if failures:
+        for line in failures:
+            print(f"FAIL: {line}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Coalescing of concurrent identical extractions.
+
+Starts --callers threads at once, all asking for the same not-yet-cached
+video through extract_video_info and extract_cdn_info. The fake YoutubeDL
+counts its extract_info calls, and exactly one call per video is expected.
+Then runs --processes worker processes, each with --callers threads,
+sharing one SQLite cache. One extraction in total is expected across
+them. Exits non-zero when any count is not 1 or a caller got a different
+result.
+
+    python benchmarks/bench_singleflight.py --callers 32 --latency 0.3
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections.abc import Mapping
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('EXTRACTION_CACHE', 'memory')
+os.environ.setdefault('EXTRACTION_REFRESH', 'off')
+
+import yt_dlp
+from fixtures import load_info, FakeYoutubeDL
+
+URL = 'https://www.youtube.com/watch?v={}'
+
+
+def concurrent_calls(func, url, callers, start_at=None):
+    """
+    Call `func(url)` from `callers` threads released together. Returns the
+    results, or the exceptions raised instead
+    """
+    barrier = threading.Barrier(callers)
+    results = [None] * callers
+
+    def call(index):
+        barrier.wait()
+        if start_at is not None:
+            time.sleep(max(0.0, start_at - time.time()))
+        try:
+            results[index] = func(url)
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def check(name, func, url, callers, failures):
+    FakeYoutubeDL.calls = 0
+    start = time.perf_counter()
+    results = concurrent_calls(func, url, callers)
+    elapsed = time.perf_counter() - start
+    distinct = {repr(dict(result)) if isinstance(result, Mapping) else repr(result) for result in results}
+    print(f"{name:<22} {callers:>7} {FakeYoutubeDL.calls:>7} {elapsed:>9.2f}")
+    if FakeYoutubeDL.calls != 1:
+        failures.append(f"{name}: {callers} concurrent calls ran {FakeYoutubeDL.calls} extractions, expected 1")
+    if len(distinct) != 1 or not isinstance(results[0], Mapping) or 'error' in results[0]:
+        failures.append(f"{name}: callers did not all get the same successful result")
+
+
+def worker(url, callers, start_at):
+    """
+    One process of the shared-cache check (the --worker entry point):
+    prints how many extractions it ran
+    """
+    import app
+    concurrent_calls(app.extract_video_info, url, callers, start_at)
+    print(FakeYoutubeDL.calls)
+
+
+def check_processes(processes, callers, latency, failures):
+    directory = tempfile.mkdtemp(prefix='bench_singleflight_')
+    env = dict(os.environ, EXTRACTION_CACHE='sqlite',
+               EXTRACTION_CACHE_PATH=os.path.join(directory, 'cache.sqlite3'))
+    # Start together once every process has imported the app
+    start_at = time.time() + 3
+    url = URL.format('shared0000a')
+    commands = [[sys.executable, os.path.abspath(__file__), '--worker', url, '--callers', str(callers),
+                 '--latency', str(latency), '--start-at', str(start_at)] for _ in range(processes)]
+    workers = [subprocess.Popen(command, env=env, stdout=subprocess.PIPE, text=True) for command in commands]
+    counts = []
+    for process in workers:
+        output, _ = process.communicate()
+        if process.returncode:
+            failures.append(f"worker process exited with {process.returncode}")
+        counts.append(int(output.split()[-1]) if output.split() else 0)
+    print(f"\n{processes} processes x {callers} callers on one SQLite cache: {sum(counts)} extraction(s) {counts}")
+    if sum(counts) != 1:
+        failures.append(f"{processes} processes sharing a cache ran {sum(counts)} extractions, expected 1")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--callers', type=int, default=32)
+    parser.add_argument('--processes', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.3, help="simulated extraction round trip (s)")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--start-at', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    FakeYoutubeDL.configure(load_info('youtube'), latency=args.latency)
+    yt_dlp.YoutubeDL = FakeYoutubeDL
+    if args.worker:
+        return worker(args.worker, args.callers, args.start_at)
+
+    import app
+    import video_cdn_extractor
+
+    failures = []
+    print(f"{'function':<22} {'callers':>7} {'calls':>7} {'seconds':>9}")
+    check('extract_video_info', app.extract_video_info, URL.format('coalesce001'), args.callers, failures)
+    check('extract_cdn_info', video_cdn_extractor.extract_cdn_info, URL.format('coalesce002'), args.callers,
+          failures)
+    check_processes(args.processes, args.callers, args.latency, failures)
+
+    if failures:
+        for line in failures:
+            print(f"FAIL: {line}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
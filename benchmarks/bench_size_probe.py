@@ -0,0 +1,89 @@
+"""
+Latency added to an extraction by size probing.
+
+A local server answers HEAD requests after a delay. Probes the missing
+sizes of a result one by one over fresh connections (what a naive loop of
+requests.head calls costs), then with SizeProber's concurrent pooled
+probes, and reports time per result and sizes filled. Slow responses
+beyond the budget show the budget cap.
+
+    python benchmarks/bench_size_probe.py --formats 8 --latency 0.1 --budget 1.5
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import requests
+from result_model import Format
+from size_probe import SizeProber
+
+
+class DelayedServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency, slow_latency):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.latency = latency
+        self.slow_latency = slow_latency
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_HEAD(self):
+        time.sleep(self.server.slow_latency if '/slow/' in self.path else self.server.latency)
+        self.send_response(200)
+        self.send_header('Content-Length', str(10 ** 8))
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def formats_for(base, count, slow):
+    return [Format(f"{base}/{'slow' if i < slow else 'fmt'}/{i}.mp4") for i in range(count)]
+
+
+def sequential(formats):
+    for fmt in formats:
+        response = requests.head(fmt.url, timeout=10)
+        fmt.filesize = int(response.headers['Content-Length'])
+    return sum(1 for fmt in formats if fmt.filesize)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--formats', type=int, default=8, help="formats without a size per result")
+    parser.add_argument('--results', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.1, help="HEAD response delay (s)")
+    parser.add_argument('--slow', type=int, default=0, help="formats answered after --slow-latency instead")
+    parser.add_argument('--slow-latency', type=float, default=5.0)
+    parser.add_argument('--budget', type=float, default=1.5)
+    args = parser.parse_args()
+
+    server = DelayedServer(args.latency, args.slow_latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    prober = SizeProber(top=args.formats, budget=args.budget, workers=args.formats)
+
+    print(f"{'method':<12} {'ms/result':>10} {'filled':>7}")
+    runs = [('pooled', prober.fill)]
+    if not args.slow:
+        runs.insert(0, ('sequential', sequential))
+    for name, fill in runs:
+        filled = 0
+        start = time.perf_counter()
+        for _ in range(args.results):
+            filled += fill(formats_for(base, args.formats, args.slow))
+        elapsed = (time.perf_counter() - start) / args.results
+        print(f"{name:<12} {elapsed * 1e3:>10.1f} {filled / args.results:>7.1f}")
+    print(f"budget {args.budget * 1e3:.0f} ms, {prober.info()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Memory and correctness check for the /stream relay.
+
+Serves a large synthetic file from a local HTTP server with Range support,
+points a finished job at it and downloads it through the app, in full and
+by byte range. Peak RSS of the process should not grow with the file size.
+
+    python benchmarks/bench_stream.py --size-mb 512
+"""
+import os
+import re
+import sys
+import time
+import logging
+import argparse
+import resource
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('EXTRACTION_CACHE', 'off')
+
+import requests
+from werkzeug.serving import make_server
+import app
+from jobs import get_job_manager
+
+logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+PATTERN = bytes(range(256)) * 4096
+
+
+def content(start, end):
+    """
+    Bytes `start..end` (inclusive) of the synthetic file
+    """
+    out = bytearray()
+    position = start
+    while position <= end:
+        offset = position % len(PATTERN)
+        take = min(len(PATTERN) - offset, end - position + 1)
+        out += PATTERN[offset:offset + take]
+        position += take
+    return bytes(out)
+
+
+def make_handler(size):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            start, end = 0, size - 1
+            match = re.match(r'bytes=(\d*)-(\d*)', self.headers.get('Range', ''))
+            if match:
+                if match.group(1):
+                    start = int(match.group(1))
+                    end = int(match.group(2)) if match.group(2) else size - 1
+                else:
+                    start = size - int(match.group(2))
+                self.send_response(206)
+                self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+            else:
+                self.send_response(200)
+            self.send_header('Content-Type', 'video/mp4')
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('Content-Length', str(end - start + 1))
+            self.end_headers()
+            position = start
+            while position <= end:
+                chunk_end = min(position + len(PATTERN) - 1, end)
+                self.wfile.write(content(position, chunk_end))
+                position = chunk_end + 1
+    return Handler
+
+
+def serve(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size-mb', type=int, default=256)
+    args = parser.parse_args()
+    size = args.size_mb * 1024 * 1024
+
+    origin = serve(ThreadingHTTPServer(('127.0.0.1', 0), make_handler(size)))
+    video_url = f"http://127.0.0.1:{origin.server_address[1]}/video.mp4"
+    front = serve(make_server('127.0.0.1', 0, app.app, threaded=True))
+    base = f"http://127.0.0.1:{front.server_port}"
+
+    video_data = {
+        'title': 'فيديو تجريبي', 'formats': [{'url': video_url, 'quality': '720p', 'format': 'mp4'}],
+        'download_url': video_url, 'format': 'mp4'
+    }
+    job = get_job_manager().submit('extract', lambda url: video_data, video_url)
+    while not job.finished:
+        time.sleep(0.01)
+
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    received = 0
+    with requests.get(f"{base}/stream/{job.id}-0", stream=True) as response:
+        assert response.status_code == 200, response.status_code
+        assert int(response.headers['Content-Length']) == size
+        disposition = response.headers['Content-Disposition']
+        for chunk in response.iter_content(1024 * 1024):
+            received += len(chunk)
+    elapsed = time.perf_counter() - start
+    assert received == size, received
+
+    ranges = [(0, 1023), (size // 2, size // 2 + 99999), (size - 4096, size - 1)]
+    for first, last in ranges:
+        response = requests.get(f"{base}/stream/{job.id}", headers={'Range': f"bytes={first}-{last}"})
+        assert response.status_code == 206, response.status_code
+        assert response.headers['Content-Range'] == f"bytes {first}-{last}/{size}"
+        assert response.content == content(first, last), (first, last)
+
+    print(f"file size             {args.size_mb} MB")
+    print(f"full download         {elapsed:.2f} s ({args.size_mb / elapsed:.0f} MB/s)")
+    print(f"peak RSS before/after {rss_before:.0f} / {peak_rss_mb():.0f} MB")
+    print(f"range requests        {len(ranges)} ok")
+    print(f"content-disposition   {disposition}")
+
+    front.shutdown()
+    origin.shutdown()
+
+
+if __name__ == '__main__':
+    main()
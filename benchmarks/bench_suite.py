@@ -0,0 +1,163 @@
+"""
+Offline benchmark and regression harness.
+
+Replays recorded-shape info dicts through a fake YoutubeDL and drives
+extract_video_info, extract_cdn_info and the Flask /extract route at a
+configurable concurrency. Reports p50/p95/p99 latency, throughput, traced
+allocations and peak RSS per scenario, and exits non-zero when a run is
+worse than a stored baseline by more than the threshold.
+
+    python benchmarks/bench_suite.py --concurrency 8 --requests 400
+    python benchmarks/bench_suite.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_suite.py --baseline benchmarks/baseline.json --threshold 0.25
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import resource
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('EXTRACTION_CACHE', 'off')
+# Every request comes from one client; measure the route, not its rate limit
+os.environ.setdefault('ADMISSION', 'off')
+
+import yt_dlp
+import app
+import video_cdn_extractor
+from fixtures import load_info, FakeYoutubeDL
+
+logging.disable(logging.WARNING)
+
+URL = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+
+# Metrics where a larger number is better; everything else is a cost
+HIGHER_IS_BETTER = {'throughput'}
+
+
+def _route_client():
+    client = app.app.test_client()
+
+    def call(url):
+        response = client.post('/extract', data={'url': url})
+        return response.get_json()
+    return call
+
+
+SCENARIOS = {
+    'extract_video_info': lambda: app.extract_video_info,
+    'extract_cdn_info': lambda: video_cdn_extractor.extract_cdn_info,
+    'route_extract': _route_client,
+}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def run_scenario(name, requests, concurrency, alloc_requests):
+    call = SCENARIOS[name]()
+
+    def timed(_):
+        start = time.perf_counter()
+        result = call(URL)
+        elapsed = time.perf_counter() - start
+        assert result and 'error' not in result, result
+        return elapsed
+
+    call(URL)  # warm the YoutubeDL pool, caches and imports
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed, range(requests)))
+    wall = time.perf_counter() - start
+
+    # Allocations are traced on a separate sequential pass: tracemalloc
+    # would otherwise distort the latencies above
+    tracemalloc.start()
+    for _ in range(alloc_requests):
+        call(URL)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+        'throughput': requests / wall,
+        'alloc_peak_kb': peak / 1024,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Return a list of regressions beyond `threshold` (a fraction)
+    """
+    regressions = []
+    for scenario, metrics in results.items():
+        for metric, value in metrics.items():
+            base = baseline.get(scenario, {}).get(metric)
+            if not base:
+                continue
+            if metric in HIGHER_IS_BETTER:
+                change = (base - value) / base
+            else:
+                change = (value - base) / base
+            if change > threshold:
+                regressions.append(f"{scenario}.{metric}: {base:.6g} -> {value:.6g} ({change:+.0%} worse)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scenarios', nargs='+', default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.0, help="simulated extraction round trip (s)")
+    parser.add_argument('--fixture', default='youtube', choices=['youtube', 'vimeo'])
+    parser.add_argument('--formats', type=int, default=120, help="formats per recorded info dict")
+    parser.add_argument('--alloc-requests', type=int, default=20)
+    parser.add_argument('--baseline', help="fail if worse than this baseline JSON")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed regression (fraction)")
+    parser.add_argument('--save-baseline', help="write the results to this path")
+    args = parser.parse_args()
+
+    FakeYoutubeDL.configure(load_info(args.fixture, format_count=args.formats), latency=args.latency)
+    yt_dlp.YoutubeDL = FakeYoutubeDL
+
+    results = {}
+    print(f"{'scenario':<20} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>9} {'alloc KB':>9} {'RSS MB':>7}")
+    for name in args.scenarios:
+        metrics = run_scenario(name, args.requests, args.concurrency, args.alloc_requests)
+        results[name] = metrics
+        print(f"{name:<20} {metrics['p50'] * 1e3:>8.2f} {metrics['p95'] * 1e3:>8.2f} {metrics['p99'] * 1e3:>8.2f} "
+              f"{metrics['throughput']:>9.1f} {metrics['alloc_peak_kb']:>9.0f} {metrics['peak_rss_mb']:>7.0f}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nRegressions beyond {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regression beyond {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
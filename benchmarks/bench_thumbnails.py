@@ -0,0 +1,213 @@
+"""
+The /thumb endpoint against a local image server.
+
+Cached extraction results point at full-size JPEG thumbnails served by a
+local HTTP server after a delay. Clients request the same videos' /thumb
+URLs concurrently through the Flask app. Reports how many fetches reached
+the server (one per video when concurrent misses are coalesced), cold and
+warm latency next to fetching the original from the server, and bytes
+sent per variant. Also checks ETag revalidation (304) and that a small
+cache stays within its bound. Exits non-zero if any check fails.
+
+    python benchmarks/bench_thumbnails.py --videos 20 --clients 8 --latency 0.1
+"""
+import io
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('EXTRACTION_CACHE', 'memory')
+
+import requests
+import app
+import thumbnail_cache
+from bench_suite import percentile
+from result_model import VideoResult, Format
+from extraction_cache import get_default_cache
+from thumbnail_cache import ThumbnailCache, SIZES, FORMATS
+
+
+def make_image(width=1280, height=720):
+    from PIL import Image
+
+    image = Image.new('RGB', (width, height))
+    # A gradient, so the encoders have something to compress
+    image.putdata([(x * 255 // width, y * 255 // height, 128) for y in range(height) for x in range(width)])
+    out = io.BytesIO()
+    image.save(out, 'JPEG', quality=90)
+    return out.getvalue()
+
+
+class ImageServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, image, latency):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.image = image
+        self.latency = latency
+        self.hits = 0
+        self._lock = threading.Lock()
+
+    def take_hits(self):
+        with self._lock:
+            hits, self.hits = self.hits, 0
+        return hits
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server._lock:
+            server.hits += 1
+        time.sleep(server.latency)
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(server.image)))
+        self.end_headers()
+        self.wfile.write(server.image)
+
+    def log_message(self, *args):
+        pass
+
+
+def store_results(base, videos):
+    cache = get_default_cache()
+    ids = []
+    for n in range(videos):
+        video_id = f"Bench:{n}"
+        result = VideoResult(f"Video {n}", f"{base}/vi/{n}/maxresdefault.jpg", '', 60, 0, 'bench',
+                             f"{base}/watch/{n}", [Format(f"{base}/video/{n}.mp4")], 'Unknown', '', 0, '', 0)
+        cache.set(f"app:{video_id}", result)
+        ids.append(video_id)
+    return ids
+
+
+def fetch_all(paths, clients, headers=None):
+    """
+    Request every path from `clients` threads at once. Returns latencies
+    and the responses of the first client
+    """
+    latencies = []
+    responses = {}
+    lock = threading.Lock()
+    barrier = threading.Barrier(clients)
+
+    def client(index):
+        http = app.app.test_client()
+        barrier.wait()
+        for path in paths:
+            start = time.perf_counter()
+            response = http.get(path, headers=headers or {})
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if index == 0:
+                    responses[path] = response
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, responses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--videos', type=int, default=20)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.1, help="image server response delay (s)")
+    args = parser.parse_args()
+
+    try:
+        image = make_image()
+    except ImportError:
+        sys.exit("Pillow is required to generate the test image")
+    server = ImageServer(image, args.latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    directory = tempfile.mkdtemp(prefix='bench_thumbs_')
+    failures = []
+    try:
+        thumbs = thumbnail_cache._default_cache = ThumbnailCache(directory)
+        ids = store_results(base, args.videos)
+        paths = [f"/thumb/{video_id}?size=medium&format=webp" for video_id in ids]
+
+        start = time.perf_counter()
+        for n in range(args.videos):
+            requests.get(f"{base}/vi/{n}/maxresdefault.jpg")
+        direct = (time.perf_counter() - start) / args.videos
+        server.take_hits()
+
+        cold, responses = fetch_all(paths, args.clients)
+        cold_hits = server.take_hits()
+        warm, _ = fetch_all(paths, args.clients)
+        warm_hits = server.take_hits()
+
+        print(f"{'phase':<8} {'requests':>9} {'upstream':>9} {'p50 ms':>8} {'p95 ms':>8}")
+        print(f"{'direct':<8} {args.videos:>9} {args.videos:>9} {direct * 1e3:>8.1f} {direct * 1e3:>8.1f}")
+        for name, latencies, hits in (('cold', cold, cold_hits), ('warm', warm, warm_hits)):
+            print(f"{name:<8} {len(latencies):>9} {hits:>9} "
+                  f"{percentile(latencies, 0.5) * 1e3:>8.1f} {percentile(latencies, 0.95) * 1e3:>8.1f}")
+        if cold_hits != args.videos:
+            failures.append(f"{cold_hits} upstream fetches for {args.videos} videos")
+        if warm_hits:
+            failures.append(f"{warm_hits} upstream fetches for cached thumbnails")
+        if any(response.status_code != 200 for response in responses.values()):
+            failures.append("a /thumb request failed")
+
+        http = app.app.test_client()
+        print(f"\noriginal {len(image)} bytes")
+        for size in SIZES:
+            row = []
+            for fmt in FORMATS:
+                response = http.get(f"/thumb/{ids[0]}?size={size}&format={fmt}")
+                row.append(f"{fmt} {len(response.data):>6} bytes")
+                if response.mimetype != f"image/{fmt}":
+                    failures.append(f"{size}.{fmt} served as {response.mimetype}")
+            print(f"{size:<8} " + ", ".join(row))
+
+        response = http.get(paths[0])
+        revalidated = http.get(paths[0], headers={'If-None-Match': response.headers['ETag']})
+        negotiated = http.get(f"/thumb/{ids[0]}", headers={'Accept': 'image/webp,*/*'})
+        print(f"\nETag {response.headers['ETag']}, Cache-Control '{response.headers['Cache-Control']}', "
+              f"revalidation -> {revalidated.status_code}, Accept: image/webp -> {negotiated.mimetype}")
+        if revalidated.status_code != 304:
+            failures.append(f"If-None-Match answered {revalidated.status_code}")
+        if negotiated.mimetype != 'image/webp' or 'Accept' not in negotiated.headers.get('Vary', ''):
+            failures.append("WebP was not negotiated from Accept")
+        if http.get('/thumb/Bench:missing').status_code != 404:
+            failures.append("unknown video did not answer 404")
+
+        # A cache with room for about a quarter of the videos
+        per_video = thumbs.info()['bytes'] // args.videos
+        small = thumbnail_cache._default_cache = ThumbnailCache(tempfile.mkdtemp(dir=directory),
+                                                                max_bytes=per_video * args.videos // 4)
+        fetch_all(paths, 1)
+        info = small.info()
+        print(f"bounded cache: {info['videos']} videos, {info['bytes']} of {info['max_bytes']} bytes, "
+              f"{info['evictions']} evictions")
+        if info['bytes'] > info['max_bytes'] or not info['evictions']:
+            failures.append("bounded cache exceeded its size or never evicted")
+        server.take_hits()
+        if http.get(paths[0]).status_code != 200 or server.take_hits() != 1:
+            failures.append("an evicted thumbnail was not fetched again")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if failures:
+        for line in failures:
+            print(f"FAIL: {line}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""
+Recorded-shape extractor fixtures for the offline benchmarks.
+
+The info dicts mirror what yt-dlp returns for YouTube and Vimeo watch pages
+(same keys, protocols, codecs and signed googlevideo/vimeocdn URLs) but are
+generated deterministically so that no network access is needed.
+"""
+import copy
+import http.cookiejar
+import random
+import time
+import threading
+
+# itag, ext, width, height, fps, vcodec, acodec, tbr
+YOUTUBE_ITAGS = [
+    (18, 'mp4', 640, 360, 30, 'avc1.42001E', 'mp4a.40.2', 512.3),
+    (22, 'mp4', 1280, 720, 30, 'avc1.64001F', 'mp4a.40.2', 1143.9),
+    (133, 'mp4', 426, 240, 30, 'avc1.4d4015', 'none', 154.1),
+    (134, 'mp4', 640, 360, 30, 'avc1.4d401e', 'none', 298.6),
+    (135, 'mp4', 854, 480, 30, 'avc1.4d401f', 'none', 527.4),
+    (136, 'mp4', 1280, 720, 30, 'avc1.4d401f', 'none', 1036.7),
+    (137, 'mp4', 1920, 1080, 30, 'avc1.640028', 'none', 2462.2),
+    (298, 'mp4', 1280, 720, 60, 'avc1.4d4020', 'none', 1620.4),
+    (299, 'mp4', 1920, 1080, 60, 'avc1.64002a', 'none', 3688.1),
+    (242, 'webm', 426, 240, 30, 'vp9', 'none', 128.9),
+    (243, 'webm', 640, 360, 30, 'vp9', 'none', 241.2),
+    (244, 'webm', 854, 480, 30, 'vp9', 'none', 410.5),
+    (247, 'webm', 1280, 720, 30, 'vp9', 'none', 803.3),
+    (248, 'webm', 1920, 1080, 30, 'vp9', 'none', 1496.0),
+    (271, 'webm', 2560, 1440, 30, 'vp9', 'none', 4512.7),
+    (313, 'webm', 3840, 2160, 30, 'vp9', 'none', 9840.1),
+    (140, 'm4a', None, None, None, 'none', 'mp4a.40.2', 129.5),
+    (251, 'webm', None, None, None, 'none', 'opus', 135.8),
+]
+
+
+def _googlevideo_url(itag, ext, rng, expire):
+    return (
+        f"https://rr{rng.randint(1, 8)}---sn-{rng.getrandbits(24):06x}.googlevideo.com/videoplayback"
+        f"?expire={expire}&ei={rng.getrandbits(64):x}&ip=203.0.113.7&id=o-{rng.getrandbits(96):x}"
+        f"&itag={itag}&source=youtube&requiressl=yes&mh=sx&mm=31%2C26&mn=sn-a&ms=au%2Conr"
+        f"&mv=m&mvi=1&pl=24&initcwndbps=1512500&vprv=1&mime=video%2F{ext}&gir=yes"
+        f"&clen={rng.randint(10 ** 6, 10 ** 9)}&dur=212.091&lmt=1700000000000000&mt=1700000000"
+        f"&fvip=4&keepalive=yes&c=ANDROID&txp=4532434&sparams=expire%2Cei%2Cip%2Cid%2Citag"
+        f"&sig=AJfQdSswRQIh{rng.getrandbits(128):x}&rn=1&rbuf=0&range=0-"
+    )
+
+
+def youtube_info(format_count=24, seed=1, expire_in=21600):
+    """
+    A YouTube watch-page info dict with `format_count` formats: progressive
+    and adaptive https formats plus the HLS/DASH/storyboard entries the
+    pipeline has to filter out
+    """
+    rng = random.Random(seed)
+    expire = int(time.time()) + expire_in
+    formats = []
+    for i in range(format_count):
+        kind = i % 6
+        if kind == 4:
+            formats.append({
+                'format_id': f"hls-{i}", 'url': f"https://manifest.googlevideo.com/api/manifest/hls_playlist/expire/{expire}/id/{i}/index.m3u8",
+                'protocol': 'm3u8_native', 'ext': 'mp4', 'height': 720, 'width': 1280, 'tbr': 1500.0,
+                'vcodec': 'avc1.4d401f', 'acodec': 'mp4a.40.2', 'format_note': '720p',
+            })
+            continue
+        if kind == 5:
+            formats.append({
+                'format_id': f"sb{i}", 'url': f"https://i.ytimg.com/sb/abc/storyboard3_L{i}/M0.jpg",
+                'protocol': 'mhtml', 'ext': 'mhtml', 'width': 160, 'height': 90, 'fps': 0.5,
+                'vcodec': 'none', 'acodec': 'none', 'format_note': 'storyboard images',
+            })
+            continue
+        itag, ext, width, height, fps, vcodec, acodec, tbr = YOUTUBE_ITAGS[i % len(YOUTUBE_ITAGS)]
+        fmt = {
+            'format_id': str(itag), 'format_note': f"{height}p" if height else 'audio only',
+            'url': _googlevideo_url(itag, ext, rng, expire), 'protocol': 'https', 'ext': ext,
+            'width': width, 'height': height, 'fps': fps, 'vcodec': vcodec, 'acodec': acodec,
+            'tbr': round(tbr * (1 + rng.random() / 10), 3), 'asr': 44100 if acodec != 'none' else None,
+            'filesize': rng.randint(10 ** 6, 10 ** 9) if rng.random() < 0.3 else None,
+            'filesize_approx': rng.randint(10 ** 6, 10 ** 9) if rng.random() < 0.5 else None,
+            'quality': i, 'has_drm': False, 'source_preference': -1, 'language': 'en',
+            'http_headers': {'User-Agent': 'Mozilla/5.0', 'Accept': '*/*'},
+            'container': f"{ext}_dash", 'dynamic_range': 'SDR',
+            'downloader_options': {'http_chunk_size': 10485760},
+        }
+        formats.append(fmt)
+
+    return {
+        'id': 'dQw4w9WgXcQ', 'title': 'Recorded fixture video', 'extractor': 'youtube',
+        'extractor_key': 'Youtube', 'webpage_url': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+        'thumbnail': 'https://i.ytimg.com/vi/dQw4w9WgXcQ/maxresdefault.jpg',
+        'thumbnails': [{'url': f"https://i.ytimg.com/vi/dQw4w9WgXcQ/{n}.jpg", 'id': str(n)} for n in range(40)],
+        'description': 'Lorem ipsum dolor sit amet. ' * 200, 'duration': 212, 'view_count': 1500000000,
+        'like_count': 17000000, 'uploader': 'Fixture Channel', 'upload_date': '20091025',
+        'channel_url': 'https://www.youtube.com/channel/UCuAXFkgsw1L7xaCfnd5JJOw',
+        'channel_follower_count': 3900000,
+        'subtitles': {}, 'automatic_captions': {
+            lang: [{'ext': 'json3', 'url': f"https://www.youtube.com/api/timedtext?lang={lang}&fmt=json3"}]
+            for lang in ('en', 'ar', 'de', 'fr', 'es', 'ja', 'ko', 'pt', 'ru', 'tr')
+        },
+        'formats': formats,
+    }
+
+
+def vimeo_info(format_count=200, seed=2, expire_in=3600):
+    """
+    A Vimeo info dict with many progressive renditions (vimeocdn signed URLs)
+    """
+    rng = random.Random(seed)
+    expire = int(time.time()) + expire_in
+    heights = [240, 360, 540, 720, 1080, 1440, 2160]
+    formats = []
+    for i in range(format_count):
+        height = heights[i % len(heights)]
+        protocol = 'https' if i % 4 else ('m3u8' if i % 8 else 'dash')
+        formats.append({
+            'format_id': f"{protocol}-{height}p-{i}",
+            'url': f"https://vod-progressive.akamaized.net/exp={expire}~acl=%2F{i}%2A~hmac={rng.getrandbits(128):x}/vimeo-prod/{i}.mp4?rn={i}&range=0-",
+            'protocol': protocol, 'ext': 'mp4', 'height': height, 'width': height * 16 // 9,
+            'fps': 30 if i % 3 else 60, 'vcodec': 'avc1', 'acodec': 'mp4a', 'tbr': height * 3.1 + i,
+            'filesize': None, 'format_note': f"{height}p",
+        })
+    return {
+        'id': '76979871', 'title': 'Recorded Vimeo fixture', 'extractor': 'vimeo', 'extractor_key': 'Vimeo',
+        'webpage_url': 'https://vimeo.com/76979871', 'thumbnail': 'https://i.vimeocdn.com/video/452001751-1280.jpg',
+        'description': 'Vimeo fixture. ' * 50, 'duration': 62, 'view_count': 500000,
+        'uploader': 'Vimeo Staff', 'upload_date': '20131015', 'formats': formats,
+    }
+
+
+FIXTURES = {
+    'youtube': youtube_info,
+    'vimeo': vimeo_info,
+}
+
+
+def load_info(name, **kwargs):
+    return FIXTURES[name](**kwargs)
+
+
+class FakeYoutubeDL:
+    """
+    Stand-in for yt_dlp.YoutubeDL that replays a fixture after a simulated
+    network round trip. Selectors listed in `failing_formats` behave as if
+    yt-dlp could not satisfy them (returns None, like `ignoreerrors`).
+    """
+    info = None
+    latency = 0.0
+    failing_formats = ()
+    calls = 0
+    _lock = threading.Lock()
+
+    def __init__(self, params=None):
+        self.params = params or {}
+        self.cookiejar = http.cookiejar.CookieJar()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def close(self):
+        pass
+
+    def extract_info(self, url, download=False, **kwargs):
+        with FakeYoutubeDL._lock:
+            FakeYoutubeDL.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.params.get('format') in self.failing_formats:
+            return None
+        return copy.deepcopy(self.info)
+
+    @classmethod
+    def configure(cls, info, latency=0.0, failing_formats=()):
+        cls.info = info
+        cls.latency = latency
+        cls.failing_formats = tuple(failing_formats)
+        cls.calls = 0
+        return cls
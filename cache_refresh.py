@@ -0,0 +1,216 @@
+import time
+import heapq
+import logging
+import threading
+from collections import deque
+from collections.abc import Mapping
+from singleflight import interprocess_lock
+
+logger = logging.getLogger(__name__)
+
+
+class IndexEntry:
+    def __init__(self, key, url, expires_at):
+        self.key = key
+        self.url = url
+        self.expires_at = expires_at
+        self.hits = 0
+
+
+class ExpiryIndex:
+    """
+    Cached results ordered by expiry: a heap of (expires_at, key) with lazy
+    deletion, plus the source URL and hit count of each live entry. Storing
+    a key again replaces its entry and resets its hits.
+    """
+    def __init__(self):
+        self._heap = []
+        self._entries = {}
+        self._cond = threading.Condition()
+
+    def add(self, key, url, expires_at):
+        with self._cond:
+            self._entries[key] = IndexEntry(key, url, expires_at)
+            heapq.heappush(self._heap, (expires_at, key))
+            # The new entry may be due before the one the scheduler waits for
+            self._cond.notify_all()
+
+    def touch(self, key):
+        with self._cond:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.hits += 1
+
+    def discard(self, key):
+        with self._cond:
+            self._entries.pop(key, None)
+
+    def _drop_stale_locked(self):
+        while self._heap:
+            expires_at, key = self._heap[0]
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at == expires_at:
+                return
+            heapq.heappop(self._heap)
+
+    def pop_due(self, lead, timeout):
+        """
+        Wait up to `timeout` seconds for the entry expiring first to get
+        within `lead` seconds of its expiry, then remove and return it.
+        Returns None on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._drop_stale_locked()
+                wait = deadline - time.monotonic()
+                if self._heap:
+                    due_in = self._heap[0][0] - lead - time.time()
+                    if due_in <= 0:
+                        _, key = heapq.heappop(self._heap)
+                        return self._entries.pop(key)
+                    wait = min(wait, due_in)
+                if wait <= 0:
+                    return None
+                self._cond.wait(wait)
+
+    def __len__(self):
+        with self._cond:
+            return len(self._entries)
+
+
+class RefreshStats:
+    """
+    Thread-safe counters of the refresh scheduler's decisions
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.refreshed = 0
+        self.failed = 0
+        self.cold = 0
+        self.throttled = 0
+        self.late = 0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'refreshed': self.refreshed,
+                'failed': self.failed,
+                'cold': self.cold,
+                'throttled': self.throttled,
+                'late': self.late
+            }
+
+
+class CacheRefresher:
+    """
+    Background scheduler that re-extracts popular cached results `lead`
+    seconds before they expire, so hot videos keep hitting the cache.
+
+    An entry is popular when it was served at least `min_hits` times since
+    it was stored. Refreshes run one at a time on a single thread, at most
+    `rate` per minute and `budget` per hour; entries that cannot be
+    refreshed before they expire are left to expire.
+
+    `resolve(namespace)` returns the uncached extraction function for a
+    cache namespace, or None.
+    """
+    def __init__(self, cache, resolve, lead=120, min_hits=3, rate=6, budget=120):
+        self.cache = cache
+        self.resolve = resolve
+        self.lead = lead
+        self.min_hits = min_hits
+        self.interval = 60.0 / rate if rate > 0 else None
+        self.budget = budget
+        self.stats = RefreshStats()
+        self._recent = deque()  # monotonic start times of refreshes in the last hour
+        self._next_allowed = 0.0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='cache-refresh', daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            entry = self.cache.index.pop_due(self.lead, timeout=60)
+            if entry is None:
+                continue
+            try:
+                self._consider(entry)
+            except Exception as e:
+                self.stats.incr('failed')
+                logger.warning(f"Refreshing {entry.key} failed: {str(e)}")
+
+    def _acquire(self, expires_at):
+        """
+        Wait for a refresh slot under the rate limit and budget. Returns
+        False, without waiting, when no slot is free before `expires_at`
+        """
+        if self.interval is None:
+            return False
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] >= 3600:
+            self._recent.popleft()
+        if len(self._recent) >= self.budget:
+            return False
+        start = max(now, self._next_allowed)
+        if time.time() + (start - now) >= expires_at:
+            return False
+        time.sleep(start - now)
+        self._next_allowed = start + self.interval
+        self._recent.append(start)
+        return True
+
+    def _consider(self, entry):
+        if entry.hits < self.min_hits:
+            self.stats.incr('cold')
+            return
+        if entry.expires_at <= time.time():
+            self.stats.incr('late')
+            return
+        namespace = entry.key.split(':', 1)[0]
+        func = self.resolve(namespace)
+        if func is None:
+            return
+        if not self._acquire(entry.expires_at):
+            self.stats.incr('throttled')
+            return
+
+        if not self.cache.backend.shared:
+            self._refresh(entry, func)
+            return
+        # Every worker process indexes the entries it serves: the first one
+        # to get here refreshes, the others pick up its result
+        with interprocess_lock(entry.key):
+            current = self.cache.backend.get(entry.key)
+            if current is not None and current[1] > entry.expires_at:
+                self.cache.index.add(entry.key, entry.url, current[1])
+                return
+            self._refresh(entry, func)
+
+    def _refresh(self, entry, func):
+        result = func(entry.url)
+        if isinstance(result, Mapping) and 'error' not in result and self.cache.set(entry.key, result, entry.url):
+            self.stats.incr('refreshed')
+            logger.info(f"Refreshed {entry.key} ahead of expiry ({entry.hits} hits)")
+        else:
+            self.stats.incr('failed')
+
+    def info(self):
+        data = self.stats.snapshot()
+        data.update({
+            'indexed': len(self.cache.index),
+            'lead': self.lead,
+            'min_hits': self.min_hits,
+            'budget': self.budget,
+            'budget_used': len(self._recent)
+        })
+        return data
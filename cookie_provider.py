@@ -0,0 +1,148 @@
+import os
+import time
+import logging
+import threading
+import http.cookiejar
+
+logger = logging.getLogger(__name__)
+
+COOKIE_DOMAINS = [".youtube.com", ".googlevideo.com", ".google.com"]
+
+# browser_cookie3 loader names, imported on first load: reading browser
+# stores is only needed once cookies are actually requested
+BROWSERS = ["Chrome", "Firefox", "Edge"]
+
+
+def _browser_loaders(names):
+    import browser_cookie3
+    return [(getattr(browser_cookie3, name), name) for name in names]
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except (OSError, TypeError):
+        return None
+
+
+class CookieProvider:
+    """
+    Loads YouTube/Google cookies from the installed browsers once and keeps
+    them in memory. They are reloaded when a browser cookie store (or the
+    fallback cookie file) changes on disk, or after `ttl` seconds.
+
+    Every reload bumps `version`; `install` copies the current cookies into
+    a YoutubeDL's own cookie jar only when that instance holds an older
+    version, so pooled instances pick up fresh cookies without any file I/O.
+    """
+    def __init__(self, ttl=900, fallback_file='cookies.txt', browsers=None):
+        self.ttl = ttl
+        self.fallback_file = fallback_file
+        # (loader class, name) pairs; resolved from BROWSERS on first load
+        self.browsers = browsers
+        self.version = 0
+        self._cookies = []
+        self._sources = {}  # cookie store path -> mtime at load time
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def _load_browser(self, browser_cls, browser_name):
+        cookies = []
+        # Locating the store and deriving its key happens once per browser;
+        # only the domain filter changes between queries
+        loader = browser_cls(domain_name=COOKIE_DOMAINS[0])
+        for domain in COOKIE_DOMAINS:
+            loader.domain_name = domain
+            jar = loader.load()
+            found = [cookie for cookie in jar if cookie.domain in COOKIE_DOMAINS]
+            if found:
+                logger.info(f"Found {len(found)} {domain} cookies in {browser_name}")
+            cookies.extend(found)
+        return cookies, loader.cookie_file
+
+    def _load(self):
+        cookies = []
+        sources = {}
+        if self.browsers is None:
+            self.browsers = _browser_loaders(BROWSERS)
+        for browser_cls, browser_name in self.browsers:
+            try:
+                found, cookie_file = self._load_browser(browser_cls, browser_name)
+            except Exception as e:
+                logger.warning(f"Could not get cookies from {browser_name}: {str(e)}")
+                continue
+            cookies.extend(found)
+            if isinstance(cookie_file, str):
+                sources[cookie_file] = _mtime(cookie_file)
+
+        if not cookies and self.fallback_file:
+            logger.warning("No browser cookies found, using default cookies")
+            sources[self.fallback_file] = _mtime(self.fallback_file)
+            if sources[self.fallback_file] is not None:
+                jar = http.cookiejar.MozillaCookieJar(self.fallback_file)
+                try:
+                    jar.load(ignore_discard=True, ignore_expires=True)
+                    cookies = list(jar)
+                except Exception as e:
+                    logger.error(f"Error reading cookie file: {str(e)}")
+        return cookies, sources
+
+    def _stale(self):
+        if time.time() - self._loaded_at >= self.ttl:
+            return True
+        return any(_mtime(path) != mtime for path, mtime in self._sources.items())
+
+    def refresh(self, force=False):
+        """
+        Reload cookies if a source changed or the TTL passed. Returns the
+        current version.
+        """
+        with self._lock:
+            if force or not self.version or self._stale():
+                self._cookies, self._sources = self._load()
+                self._loaded_at = time.time()
+                self.version += 1
+                logger.info(f"Loaded {len(self._cookies)} cookies (version {self.version})")
+            return self.version
+
+    def cookies(self):
+        self.refresh()
+        with self._lock:
+            return list(self._cookies)
+
+    def cookiejar(self):
+        jar = http.cookiejar.CookieJar()
+        for cookie in self.cookies():
+            jar.set_cookie(cookie)
+        return jar
+
+    def install(self, ydl):
+        """
+        Make `ydl` use the current cookies. Cheap when it already has them.
+        """
+        self.refresh()
+        with self._lock:
+            version = self.version
+            if getattr(ydl, '_cookie_provider_version', None) == version:
+                return
+            cookies = list(self._cookies)
+        ydl.cookiejar.clear()
+        for cookie in cookies:
+            ydl.cookiejar.set_cookie(cookie)
+        ydl._cookie_provider_version = version
+
+
+_default_provider = None
+_default_provider_lock = threading.Lock()
+
+
+def get_cookie_provider():
+    """
+    Build the process-wide cookie provider from the environment on first use
+    """
+    global _default_provider
+    if _default_provider is None:
+        with _default_provider_lock:
+            if _default_provider is None:
+                _default_provider = CookieProvider(ttl=int(os.environ.get('COOKIE_TTL', 900)))
+    return _default_provider
@@ -0,0 +1,233 @@
+import os
+import sys
+import time
+import logging
+import threading
+from concurrent.futures import TimeoutError as FutureTimeout
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Imported once by the fork server, so every worker starts with yt-dlp and
+# its extractor classes already loaded
+PRELOAD_MODULES = ['yt_dlp', 'yt_dlp.extractor', 'app', 'video_cdn_extractor']
+
+
+class BackendError(Exception):
+    """
+    Raised when the backend itself (not the extraction) failed: a timeout
+    or a crashed worker process
+    """
+
+
+class BackendStats:
+    """
+    Thread-safe task and worker recycling counters
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tasks = 0
+        self.timeouts = 0
+        self.crashes = 0
+        self.recycled = 0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'tasks': self.tasks,
+                'timeouts': self.timeouts,
+                'crashes': self.crashes,
+                'recycled': self.recycled
+            }
+
+
+class ThreadBackend:
+    """
+    Run extractions in the calling thread
+    """
+    name = 'thread'
+
+    def run(self, func, url):
+        return func(url)
+
+    def info(self):
+        return {'backend': self.name}
+
+
+def _init_worker():
+    from yt_dlp.extractor import gen_extractor_classes
+    gen_extractor_classes()
+
+
+def _run_task(func, url, max_rss_kb):
+    """
+    Runs in a worker process. Only the small result dict crosses the pipe;
+    yt-dlp's info dict stays here. The flag asks the parent to recycle the
+    workers once this process has grown past the memory limit (not
+    checked on Windows).
+    """
+    result = func(url)
+    if not max_rss_kb or resource is None:
+        return result, False
+    return result, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss > max_rss_kb
+
+
+class ProcessBackend:
+    """
+    Run extractions in a warm pool of worker processes so that yt-dlp's CPU
+    work (JSON, page regexes, signatures) does not contend on this
+    process's GIL.
+
+    Each worker serves at most `max_tasks` extractions. Before Python 3.11,
+    and with the fork start method, the executor cannot recycle single
+    workers, so the whole pool is retired after `workers * max_tasks`
+    extractions instead. A task that takes
+    longer than `timeout` seconds fails with BackendError and its pool is
+    retired: new tasks go to a fresh pool and the old workers are killed
+    once their other tasks had the same time to finish. A worker whose
+    peak RSS exceeds `max_rss_mb` gets its pool retired the same way.
+    """
+    name = 'process'
+
+    def __init__(self, workers=2, timeout=120, max_tasks=100, max_rss_mb=1024,
+                 start_method='forkserver', preload=PRELOAD_MODULES):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_tasks = max_tasks
+        self.max_rss_kb = max_rss_mb * 1024 if max_rss_mb else 0
+        # Only imported when the process backend is configured
+        import multiprocessing
+        if start_method not in multiprocessing.get_all_start_methods():
+            # forkserver and fork do not exist on Windows
+            start_method = multiprocessing.get_start_method()
+        self._context = multiprocessing.get_context(start_method)
+        if start_method == 'forkserver':
+            self._context.set_forkserver_preload(list(preload))
+        # max_tasks_per_child needs Python 3.11 and a non-fork start method
+        self._child_recycling = sys.version_info >= (3, 11) and start_method != 'fork'
+        self._executor = None
+        self._submitted = 0
+        self._lock = threading.Lock()
+        self.stats = BackendStats()
+
+    def _current(self):
+        """
+        The executor for the next task, and whether that task is the last
+        one before the pool must be replaced
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        with self._lock:
+            if self._executor is None:
+                kwargs = {}
+                if self._child_recycling and self.max_tasks:
+                    kwargs['max_tasks_per_child'] = self.max_tasks
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=self._context,
+                    initializer=_init_worker,
+                    **kwargs
+                )
+                self._submitted = 0
+            self._submitted += 1
+            exhausted = (not self._child_recycling and self.max_tasks and
+                         self._submitted >= self.workers * self.max_tasks)
+            return self._executor, exhausted
+
+    def _retire(self, executor, grace):
+        """
+        Stop sending tasks to `executor` and kill its workers after `grace`
+        seconds
+        """
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        self.stats.incr('recycled')
+        processes = list((getattr(executor, '_processes', None) or {}).values())
+        executor.shutdown(wait=False)
+
+        def reap():
+            deadline = time.monotonic() + grace
+            for process in processes:
+                process.join(max(0, deadline - time.monotonic()))
+                if process.is_alive():
+                    process.kill()
+        threading.Thread(target=reap, name='extraction-reaper', daemon=True).start()
+
+    def run(self, func, url):
+        from concurrent.futures.process import BrokenProcessPool
+
+        executor, exhausted = self._current()
+        self.stats.incr('tasks')
+        try:
+            future = executor.submit(_run_task, func, url, self.max_rss_kb)
+            result, oversized = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            self.stats.incr('timeouts')
+            self._retire(executor, self.timeout)
+            raise BackendError(f"Extraction timed out after {self.timeout}s")
+        except BrokenProcessPool as e:
+            self.stats.incr('crashes')
+            self._retire(executor, 0)
+            raise BackendError(f"Extraction worker crashed: {str(e)}")
+        if oversized:
+            logger.info(f"Recycling extraction workers: peak RSS above {self.max_rss_kb // 1024} MB")
+            self._retire(executor, self.timeout)
+        elif exhausted:
+            self._retire(executor, self.timeout)
+        return result
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            if sys.version_info >= (3, 9):
+                executor.shutdown(wait=True, cancel_futures=True)
+            else:
+                executor.shutdown(wait=True)
+
+    def info(self):
+        data = self.stats.snapshot()
+        data.update({
+            'backend': self.name,
+            'workers': self.workers,
+            'timeout': self.timeout,
+            'max_tasks': self.max_tasks
+        })
+        return data
+
+
+_default_backend = None
+_default_backend_lock = threading.Lock()
+
+
+def get_extraction_backend():
+    """
+    Build the process-wide extraction backend from the environment on first
+    use: EXTRACTION_BACKEND=thread (default) or process
+    """
+    global _default_backend
+    if _default_backend is None:
+        with _default_backend_lock:
+            if _default_backend is None:
+                if os.environ.get('EXTRACTION_BACKEND', 'thread').lower() == 'process':
+                    _default_backend = ProcessBackend(
+                        workers=int(os.environ.get('EXTRACTION_PROCESSES', os.cpu_count() or 2)),
+                        timeout=float(os.environ.get('EXTRACTION_TIMEOUT', 120)),
+                        max_tasks=int(os.environ.get('EXTRACTION_PROCESS_MAX_TASKS', 100)),
+                        max_rss_mb=int(os.environ.get('EXTRACTION_PROCESS_MAX_RSS_MB', 1024)),
+                        start_method=os.environ.get('EXTRACTION_PROCESS_START', 'forkserver')
+                    )
+                    logger.info(f"Extraction backend: {_default_backend.workers} worker processes")
+                else:
+                    _default_backend = ThreadBackend()
+    return _default_backend
@@ -0,0 +1,434 @@
+import os
+import time
+import json
+import sqlite3
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import lru_cache, wraps
+from collections.abc import Mapping
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+from singleflight import SingleFlight, interprocess_lock
+from cache_refresh import ExpiryIndex, CacheRefresher
+from result_model import dumps
+from metrics import EXTRACTION_SECONDS
+from extractor_guard import get_extractor_guard, Throttled
+
+logger = logging.getLogger(__name__)
+
+# Signed CDN URLs must never be served after they expire, so every entry is
+# dropped this many seconds before the earliest `expire=` we find in it
+EXPIRY_MARGIN = 300
+MIN_TTL = 30
+# An expired entry's signed URLs are still valid for EXPIRY_MARGIN seconds,
+# so it is kept this long to be served while its extractor is throttled
+STALE_WINDOW = EXPIRY_MARGIN - 60
+
+
+class CacheStats:
+    """
+    Thread-safe hit/miss/eviction counters
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+        self.stale = 0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def snapshot(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'coalesced': self.coalesced,
+                'stale': self.stale,
+                'hit_ratio': round(self.hits / total, 4) if total else 0.0
+            }
+
+
+class MemoryBackend:
+    """
+    In-process LRU backend bounded by number of entries
+    """
+    name = 'memory'
+    shared = False
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, expires_at):
+        """
+        Store an entry and return the number of entries evicted to make room
+        """
+        evicted = 0
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        return evicted
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """
+    Shared backend stored in a SQLite file so every gunicorn worker on the
+    host sees the same entries
+    """
+    name = 'sqlite'
+    shared = True
+
+    def __init__(self, path=None, max_entries=1024):
+        self.path = path or os.path.join(tempfile.gettempdir(), "video_extractor_cache.sqlite3")
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value, expires_at):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, dumps(value).decode('utf-8'), expires_at, time.time())
+        )
+        cursor = conn.execute(
+            "DELETE FROM entries WHERE key IN ("
+            "SELECT key FROM entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        return max(cursor.rowcount, 0)
+
+    def delete(self, key):
+        self._connect().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+BACKENDS = {
+    MemoryBackend.name: MemoryBackend,
+    SQLiteBackend.name: SQLiteBackend
+}
+
+
+@lru_cache(maxsize=1)
+def _extractor_classes():
+    import yt_dlp
+    return [ie for ie in yt_dlp.extractor.gen_extractor_classes() if ie.ie_key() != 'Generic']
+
+
+def load_extractors():
+    """
+    Import yt-dlp and build its extractor list now instead of on the first
+    cache key
+    """
+    return len(_extractor_classes())
+
+
+def normalize_url(url):
+    """
+    Normalize a URL that no extractor recognises: lowercase scheme/host,
+    drop the fragment and sort the query string
+    """
+    parsed = urlparse(url.strip())
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return urlunparse((parsed.scheme.lower(), parsed.netloc.lower(), parsed.path or '/', '', query, ''))
+
+
+@lru_cache(maxsize=4096)
+def canonical_key(url):
+    """
+    Map a URL to `<extractor>:<video id>` so that different spellings of the
+    same watch page (youtu.be, m.youtube.com, extra query params) share a key
+    """
+    try:
+        for ie in _extractor_classes():
+            if ie.suitable(url):
+                video_id = ie.get_temp_id(url)
+                if video_id:
+                    return f"{ie.ie_key()}:{video_id}"
+                break
+    except Exception as e:
+        logger.warning(f"Could not match extractor for {url}: {str(e)}")
+    return f"url:{normalize_url(url)}"
+
+
+def extractor_name(url):
+    """
+    The extractor a URL goes to, as the guard keys it: the yt-dlp extractor
+    key, or the host for URLs no extractor recognises
+    """
+    name = canonical_key(url).split(':', 1)[0]
+    if name == 'url':
+        return urlparse(url).netloc.lower() or name
+    return name
+
+
+def _url_expiry(url):
+    if not url or 'expire' not in url:
+        return None
+    parsed = urlparse(url)
+    for name, value in parse_qsl(parsed.query):
+        if name == 'expire' and value.isdigit():
+            return int(value)
+    # googlevideo manifest URLs carry their parameters as path segments
+    parts = parsed.path.split('/')
+    for name, value in zip(parts, parts[1:]):
+        if name == 'expire' and value.isdigit():
+            return int(value)
+    return None
+
+
+def result_expiry(video_data):
+    """
+    Return the earliest signed-URL expiry timestamp found in a result, or None
+    """
+    urls = [fmt.get('url') for fmt in video_data.get('formats', [])]
+    urls.append(video_data.get('download_url'))
+    expiries = [e for e in map(_url_expiry, urls) if e]
+    return min(expiries) if expiries else None
+
+
+class ExtractionCache:
+    """
+    TTL-aware cache of extraction results in front of a pluggable backend
+    """
+    def __init__(self, backend, default_ttl=3600):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self.stats = CacheStats()
+        self.index = ExpiryIndex()
+        self.refresher = None
+
+    def ttl_for(self, value, now=None):
+        now = now or time.time()
+        ttl = self.default_ttl
+        expiry = result_expiry(value)
+        if expiry:
+            ttl = min(ttl, expiry - EXPIRY_MARGIN - now)
+        return ttl
+
+    def get(self, key, count=True):
+        entry = self.backend.get(key)
+        if entry is None:
+            if count:
+                self.stats.incr('misses')
+            return None
+        value, expires_at = entry
+        now = time.time()
+        if expires_at <= now:
+            if expires_at + STALE_WINDOW <= now:
+                self.backend.delete(key)
+                self.stats.incr('expirations')
+            if count:
+                self.stats.incr('misses')
+            return None
+        if count:
+            self.stats.incr('hits')
+            self.index.touch(key)
+        return value
+
+    def get_stale(self, key):
+        """
+        Return the entry for `key` even if it expired less than STALE_WINDOW
+        seconds ago, for when it cannot be extracted again right now
+        """
+        entry = self.backend.get(key)
+        if entry is None or entry[1] + STALE_WINDOW <= time.time():
+            return None
+        self.stats.incr('stale')
+        return entry[0]
+
+    def set(self, key, value, url=None):
+        """
+        Store a result. With its source `url` the entry is also indexed by
+        expiry so the refresher can extract it again before it expires
+        """
+        now = time.time()
+        ttl = self.ttl_for(value, now)
+        if ttl < MIN_TTL:
+            logger.info(f"Not caching {key}: signed URLs expire too soon")
+            return False
+        evicted = self.backend.set(key, value, now + ttl)
+        if evicted:
+            self.stats.incr('evictions', evicted)
+        if url is not None:
+            self.index.add(key, url, now + ttl)
+        return True
+
+    def info(self):
+        data = self.stats.snapshot()
+        data.update({
+            'backend': self.backend.name,
+            'entries': len(self.backend),
+            'default_ttl': self.default_ttl
+        })
+        return data
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+_inflight = SingleFlight()
+# namespace -> uncached extraction function, for the refresher
+_extractors = {}
+
+
+def get_default_cache():
+    """
+    Build the process-wide cache from the environment on first use.
+    Returns None when caching is disabled with EXTRACTION_CACHE=off
+    """
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                backend_name = os.environ.get('EXTRACTION_CACHE', 'memory').lower()
+                if backend_name in ('off', 'none', '0'):
+                    _default_cache = False
+                else:
+                    backend_cls = BACKENDS.get(backend_name, MemoryBackend)
+                    kwargs = {'max_entries': int(os.environ.get('EXTRACTION_CACHE_SIZE', 256))}
+                    if backend_cls is SQLiteBackend and os.environ.get('EXTRACTION_CACHE_PATH'):
+                        kwargs['path'] = os.environ['EXTRACTION_CACHE_PATH']
+                    _default_cache = ExtractionCache(
+                        backend_cls(**kwargs),
+                        default_ttl=int(os.environ.get('EXTRACTION_CACHE_TTL', 3600))
+                    )
+                    logger.info(f"Extraction cache enabled ({backend_cls.name})")
+                    if os.environ.get('EXTRACTION_REFRESH', 'on').lower() not in ('off', 'none', '0'):
+                        _default_cache.refresher = CacheRefresher(
+                            _default_cache,
+                            _extractors.get,
+                            lead=int(os.environ.get('REFRESH_LEAD', 120)),
+                            min_hits=int(os.environ.get('REFRESH_MIN_HITS', 3)),
+                            rate=float(os.environ.get('REFRESH_RATE', 6)),
+                            budget=int(os.environ.get('REFRESH_BUDGET', 120))
+                        )
+                        _default_cache.refresher.start()
+    return _default_cache or None
+
+
+def cached_extraction(namespace):
+    """
+    Decorator caching successful results of `func(url)` under
+    `<namespace>:<canonical key>`. Error results are never cached.
+
+    Extractions run under the extractor guard; when it turns one away, a
+    stale cached result is returned if there is one.
+
+    Concurrent misses for the same key are coalesced: one caller extracts
+    and the others wait for its result. With a shared backend the leader
+    also takes a host-wide file lock and re-checks the cache, so workers
+    in other processes reuse the result instead of extracting again.
+    """
+    def decorator(func):
+        def timed(url):
+            with EXTRACTION_SECONDS.time(extractor=namespace):
+                return func(url)
+
+        def guarded(url, fallback=None):
+            guard = get_extractor_guard()
+            if guard is None:
+                try:
+                    return timed(url)
+                except Throttled as e:
+                    return e.result
+            return guard.call(extractor_name(url), timed, url, fallback)
+
+        def fill(cache, key, url):
+            stale = []
+
+            def fallback():
+                value = cache.get_stale(key)
+                if value is not None:
+                    stale.append(value)
+                return value
+
+            def extract():
+                result = guarded(url, fallback)
+                # A stale result is served as is, never stored again
+                if not stale and isinstance(result, Mapping) and 'error' not in result:
+                    cache.set(key, result, url)
+                return result
+
+            if not cache.backend.shared:
+                return extract()
+            # Stored before the lock is released, so the next holder finds it
+            with interprocess_lock(key):
+                result = cache.get(key, count=False)
+                if result is not None:
+                    cache.stats.incr('coalesced')
+                    return result
+                return extract()
+
+        # The refresher gets no stale fallback: it would store it again
+        _extractors[namespace] = guarded
+
+        @wraps(func)
+        def wrapper(url):
+            cache = get_default_cache()
+            if cache is None:
+                return guarded(url)
+
+            key = f"{namespace}:{canonical_key(url)}"
+            result = cache.get(key)
+            if result is not None:
+                return result
+
+            result, shared = _inflight.do(key, fill, cache, key, url)
+            if shared:
+                cache.stats.incr('coalesced')
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,376 @@
+"""
+Per-extractor concurrency limiting and circuit breaking.
+
+Every cache miss goes through the guard of its extractor (the yt-dlp
+extractor key, or the host for URLs no extractor recognises), so a
+platform that starts answering 429/403 only slows down its own requests:
+its concurrency limit shrinks, and after repeated throttling its circuit
+opens and requests fail fast with a stale cached result or the last error
+instead of reaching the platform at all.
+"""
+import os
+import time
+import logging
+import threading
+from collections.abc import Mapping
+from metrics import CIRCUIT_TRIPS, GUARD_REJECTIONS, THROTTLED
+
+logger = logging.getLogger(__name__)
+
+# Upstream errors that mean "slow down" rather than "this video is broken"
+THROTTLE_ERRORS = ("HTTP Error 429", "HTTP Error 403", "Too Many Requests")
+
+DEFAULT_ERROR = {"error": "تم تجاوز حد الطلبات. يرجى المحاولة بعد قليل"}
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Outcomes of a guarded extraction
+SUCCEEDED = 'succeeded'
+THROTTLED_OUTCOME = 'throttled'
+FAILED = 'failed'  # an error that says nothing about throttling
+
+
+def is_throttle_error(message):
+    return any(needle in message for needle in THROTTLE_ERRORS)
+
+
+class Throttled(Exception):
+    """
+    Raised by an extraction function when the platform throttled it.
+    `result` is the error result to hand back to the caller
+    """
+    def __init__(self, message, result):
+        super().__init__(message, result)
+        self.message = message
+        self.result = result
+
+    def __str__(self):
+        return self.message
+
+
+class AIMDLimiter:
+    """
+    Concurrency limit with additive increase and multiplicative decrease:
+    it grows by one per `limit` completed extractions and is multiplied by
+    `backoff` when the platform throttles. Only extractions admitted after
+    the last decrease can decrease it again, so one burst of 429s counts
+    once. Not thread-safe; ExtractorGuard holds its lock around every call.
+    """
+    def __init__(self, limit=64, minimum=1, maximum=64, backoff=0.5):
+        self.limit = float(limit)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.in_flight = 0
+        self._last_decrease = float('-inf')
+
+    def available(self):
+        return self.in_flight < int(self.limit)
+
+    def on_success(self):
+        self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def on_throttle(self, admitted_at):
+        if admitted_at < self._last_decrease:
+            return
+        self.limit = max(self.minimum, self.limit * self.backoff)
+        self._last_decrease = time.monotonic()
+
+    def reset(self):
+        self.limit = float(self.minimum)
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive throttled extractions and rejects
+    everything for `cooldown` seconds. It then goes half-open and admits
+    one probe; every successful probe doubles the number of probes allowed
+    at once, and `probes` successes close it again. A throttled probe
+    re-opens it with twice the cooldown, up to `max_cooldown`. Not
+    thread-safe, like AIMDLimiter.
+    """
+    def __init__(self, threshold=5, cooldown=30, max_cooldown=300, probes=3):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.probes = probes
+        self.state = CLOSED
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probe_budget = 0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+    def allow(self, now):
+        """
+        Whether to admit an extraction now. Returns (allowed, is_probe)
+        """
+        if self.state == OPEN:
+            if now - self.opened_at < self.cooldown:
+                return False, False
+            self.state = HALF_OPEN
+            self._probe_budget = 1
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+        if self.state == HALF_OPEN:
+            if self._probes_in_flight >= self._probe_budget:
+                return False, False
+            self._probes_in_flight += 1
+            return True, True
+        return True, False
+
+    def retry_in(self, now):
+        return max(0.0, self.cooldown - (now - self.opened_at)) if self.state == OPEN else 0.0
+
+    def _trip(self, now, cooldown):
+        self.state = OPEN
+        self.opened_at = now
+        self.cooldown = cooldown
+        self.failures = 0
+        self.trips += 1
+
+    def on_success(self, probe):
+        if probe and self.state == HALF_OPEN:
+            self._probes_in_flight -= 1
+            self._probe_successes += 1
+            if self._probe_successes >= self.probes:
+                self.state = CLOSED
+                self.cooldown = self.base_cooldown
+            else:
+                self._probe_budget *= 2
+        self.failures = 0
+
+    def on_failure(self, probe):
+        """
+        Record an extraction that failed for another reason than throttling
+        (a private video, an unsupported URL). It frees its probe slot but
+        neither closes the circuit nor resets the failure count
+        """
+        if probe and self.state == HALF_OPEN:
+            self._probes_in_flight -= 1
+
+    def on_throttle(self, probe, now):
+        """
+        Record a throttled extraction. Returns True when it tripped the
+        circuit
+        """
+        if probe and self.state == HALF_OPEN:
+            self._probes_in_flight -= 1
+            self._trip(now, min(self.max_cooldown, self.cooldown * 2))
+            return True
+        if self.state != CLOSED:
+            return False
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self._trip(now, self.base_cooldown)
+            return True
+        return False
+
+
+class _Extractor:
+    def __init__(self, limiter, breaker):
+        self.limiter = limiter
+        self.breaker = breaker
+        self.last_error = None
+        self.cond = threading.Condition()
+
+
+class GuardStats:
+    """
+    Thread-safe admission counters across all extractors
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.throttled = 0
+        self.rejected_open = 0
+        self.rejected_busy = 0
+        self.stale_served = 0
+        self.trips = 0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'admitted': self.admitted,
+                'throttled': self.throttled,
+                'rejected_open': self.rejected_open,
+                'rejected_busy': self.rejected_busy,
+                'stale_served': self.stale_served,
+                'trips': self.trips
+            }
+
+
+class ExtractorGuard:
+    """
+    One AIMD limiter and circuit breaker per extractor. An extraction that
+    cannot get a slot within `queue_timeout` seconds, or whose circuit is
+    open, is not attempted: the caller gets `fallback()` (a stale cached
+    result) when there is one, else the extractor's last error.
+    """
+    def __init__(self, max_concurrency=64, threshold=5, cooldown=30, max_cooldown=300, probes=3,
+                 queue_timeout=5):
+        self.max_concurrency = max_concurrency
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.probes = probes
+        self.queue_timeout = queue_timeout
+        self.stats = GuardStats()
+        self._extractors = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name):
+        with self._lock:
+            state = self._extractors.get(name)
+            if state is None:
+                state = self._extractors[name] = _Extractor(
+                    AIMDLimiter(self.max_concurrency, maximum=self.max_concurrency),
+                    CircuitBreaker(self.threshold, self.cooldown, self.max_cooldown, self.probes)
+                )
+            return state
+
+    def _admit(self, state):
+        """
+        Wait for a slot. Returns (admitted_at, is_probe), or a rejection
+        reason
+        """
+        deadline = time.monotonic() + self.queue_timeout
+        with state.cond:
+            while True:
+                now = time.monotonic()
+                if state.breaker.state == OPEN and state.breaker.retry_in(now) > 0:
+                    return 'open'
+                if state.limiter.available():
+                    allowed, probe = state.breaker.allow(now)
+                    if not allowed:
+                        return 'open'
+                    state.limiter.in_flight += 1
+                    return now, probe
+                if now >= deadline:
+                    return 'busy'
+                state.cond.wait(deadline - now)
+
+    def _release(self, name, state, ticket, outcome):
+        admitted_at, probe = ticket
+        throttled = outcome == THROTTLED_OUTCOME
+        tripped = False
+        with state.cond:
+            state.limiter.in_flight -= 1
+            if throttled:
+                state.limiter.on_throttle(admitted_at)
+                tripped = state.breaker.on_throttle(probe, time.monotonic())
+                if tripped:
+                    state.limiter.reset()
+            elif outcome == SUCCEEDED:
+                state.limiter.on_success()
+                state.breaker.on_success(probe)
+            else:
+                state.breaker.on_failure(probe)
+            state.cond.notify_all()
+        if throttled:
+            self.stats.incr('throttled')
+            THROTTLED.inc(extractor=name)
+        if tripped:
+            self.stats.incr('trips')
+            CIRCUIT_TRIPS.inc(extractor=name)
+            logger.warning(f"Circuit for {name} opened for {state.breaker.cooldown:.0f}s after repeated throttling")
+
+    def _fallback(self, state, fallback):
+        stale = fallback() if fallback is not None else None
+        if stale is not None:
+            self.stats.incr('stale_served')
+            return stale
+        return state.last_error or DEFAULT_ERROR
+
+    def call(self, name, func, url, fallback=None):
+        """
+        Run `func(url)` under the guard of extractor `name`. `func` raises
+        Throttled when the platform throttles it. Only a result without an
+        'error' counts as a success for the limiter and the circuit
+        """
+        state = self._get(name)
+        ticket = self._admit(state)
+        if isinstance(ticket, str):
+            self.stats.incr(f"rejected_{ticket}")
+            GUARD_REJECTIONS.inc(extractor=name, reason=ticket)
+            return self._fallback(state, fallback)
+
+        self.stats.incr('admitted')
+        try:
+            result = func(url)
+        except Throttled as e:
+            state.last_error = e.result
+            self._release(name, state, ticket, THROTTLED_OUTCOME)
+            return self._fallback(state, fallback)
+        except BaseException:
+            self._release(name, state, ticket, FAILED)
+            raise
+        failed = isinstance(result, Mapping) and 'error' in result
+        self._release(name, state, ticket, FAILED if failed else SUCCEEDED)
+        return result
+
+    def extractors(self):
+        """
+        Limiter and circuit state per extractor
+        """
+        with self._lock:
+            states = dict(self._extractors)
+        now = time.monotonic()
+        data = {}
+        for name, state in states.items():
+            with state.cond:
+                data[name] = {
+                    'limit': round(state.limiter.limit, 2),
+                    'in_flight': state.limiter.in_flight,
+                    'circuit': state.breaker.state,
+                    'circuit_state': STATE_VALUES[state.breaker.state],
+                    'trips': state.breaker.trips,
+                    'retry_in': round(state.breaker.retry_in(now), 1)
+                }
+        return data
+
+    def info(self):
+        data = self.stats.snapshot()
+        states = self.extractors()
+        data.update({
+            'extractors': len(states),
+            'open_circuits': sum(1 for state in states.values() if state['circuit'] != CLOSED),
+            'max_concurrency': self.max_concurrency
+        })
+        return data
+
+
+_default_guard = None
+_default_guard_lock = threading.Lock()
+
+
+def get_extractor_guard():
+    """
+    Build the process-wide guard from the environment on first use.
+    Returns None when disabled with EXTRACTOR_GUARD=off
+    """
+    global _default_guard
+    if _default_guard is None:
+        with _default_guard_lock:
+            if _default_guard is None:
+                if os.environ.get('EXTRACTOR_GUARD', 'on').lower() in ('off', 'none', '0'):
+                    _default_guard = False
+                else:
+                    _default_guard = ExtractorGuard(
+                        max_concurrency=int(os.environ.get('GUARD_MAX_CONCURRENCY', 64)),
+                        threshold=int(os.environ.get('GUARD_FAILURE_THRESHOLD', 5)),
+                        cooldown=float(os.environ.get('GUARD_COOLDOWN', 30)),
+                        max_cooldown=float(os.environ.get('GUARD_MAX_COOLDOWN', 300)),
+                        probes=int(os.environ.get('GUARD_PROBES', 3)),
+                        queue_timeout=float(os.environ.get('GUARD_QUEUE_TIMEOUT', 5))
+                    )
+    return _default_guard or None
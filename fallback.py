@@ -0,0 +1,207 @@
+import time
+import logging
+import threading
+from metrics import ATTEMPTS, FALLBACK_DEPTH, FALLBACK_DECISIONS
+
+logger = logging.getLogger(__name__)
+
+# Decisions taken after a failed attempt
+NEXT = 'next'              # try the next strategy
+SKIP_PROXY = 'skip_proxy'  # the proxy itself is broken: drop every strategy using it
+STOP = 'stop'              # permanent: no connection configuration can help
+
+# First matching substring wins. The permanent entries mirror the messages
+# handle_extraction_error knows how to translate.
+ERROR_DECISIONS = [
+    ("Private video", STOP),
+    ("This video is unavailable", STOP),
+    ("Video unavailable", STOP),
+    ("Incomplete YouTube ID", STOP),
+    ("This live event will begin in", STOP),
+    ("Join this channel to get access", STOP),
+    ("Unsupported URL", STOP),
+    # The extraction worked but the video has nothing playable to return
+    ("No formats found in extracted info", STOP),
+    ("No suitable formats found", STOP),
+    ("Unable to connect to proxy", SKIP_PROXY),
+    ("ProxyError", SKIP_PROXY),
+    ("SOCKS", SKIP_PROXY),
+    ("Connection refused", SKIP_PROXY),
+    ("Sign in to confirm you're not a bot", NEXT),
+    ("HTTP Error 403", NEXT),
+    # Rate limiting is per address, not a broken proxy: another strategy
+    # may get through, and the extractor guard backs the platform off
+    ("HTTP Error 429", NEXT),
+]
+
+
+# An attempt makes several HTTP requests, each retried up to
+# EXTRACTOR_RETRIES times, and the socket timeout applies to each of them
+ATTEMPT_REQUESTS = 4
+EXTRACTOR_RETRIES = 1
+MAX_SOCKET_TIMEOUT = 30
+
+
+def socket_timeout(remaining, ceiling=MAX_SOCKET_TIMEOUT):
+    """
+    Socket timeout keeping an attempt within the `remaining` seconds of the
+    deadline. Rounded down to 5 s steps so the YoutubeDL pool, keyed by
+    options, sees only a few distinct values
+    """
+    timeout = min(ceiling, remaining / (ATTEMPT_REQUESTS * (EXTRACTOR_RETRIES + 1)))
+    return max(1, int(timeout // 5 * 5) or int(timeout))
+
+
+def classify_error(message, decisions=ERROR_DECISIONS):
+    for needle, decision in decisions:
+        if needle in message:
+            return decision
+    return NEXT
+
+
+class ConnectionStrategy:
+    """
+    One connection configuration: proxy, user agent and spoofed client IP
+    """
+    def __init__(self, proxy=None, user_agent=None, ip=None):
+        self.proxy = proxy
+        self.user_agent = user_agent
+        self.ip = ip
+
+    @property
+    def key(self):
+        return (self.proxy, self.user_agent, self.ip)
+
+    def apply(self, ydl_opts):
+        """
+        Return a copy of `ydl_opts` using this configuration
+        """
+        opts = dict(ydl_opts)
+        if self.proxy:
+            opts['proxy'] = self.proxy
+        if self.user_agent:
+            opts['user_agent'] = self.user_agent
+        headers = dict(opts.get('http_headers') or {})
+        if self.user_agent:
+            headers['User-Agent'] = self.user_agent
+        if self.ip:
+            headers.update({'X-Forwarded-For': self.ip, 'Client-IP': self.ip})
+        opts['http_headers'] = headers
+        return opts
+
+    def __repr__(self):
+        return f"ConnectionStrategy(proxy={self.proxy!r}, ip={self.ip!r}, user_agent={(self.user_agent or '')[:40]!r})"
+
+
+class AttemptFailed(Exception):
+    """
+    Raised by an attempt function when a strategy did not produce a result
+    """
+
+
+class AttemptRecord:
+    def __init__(self, strategy, elapsed, outcome, error=None):
+        self.strategy = strategy
+        self.elapsed = elapsed
+        self.outcome = outcome
+        self.error = error
+
+    def to_dict(self):
+        return {
+            'proxy': self.strategy.proxy,
+            'ip': self.strategy.ip,
+            'elapsed': round(self.elapsed, 3),
+            'outcome': self.outcome,
+            'error': self.error
+        }
+
+
+class FallbackResult:
+    def __init__(self, value, attempts, reason, depth=0):
+        self.value = value
+        self.attempts = attempts
+        self.reason = reason
+        self.depth = depth
+
+    @property
+    def ok(self):
+        return self.value is not None
+
+    @property
+    def last_error(self):
+        for record in reversed(self.attempts):
+            if record.error:
+                return record.error
+        return None
+
+
+class FallbackEngine:
+    """
+    Tries connection strategies in priority order until one yields a result,
+    the decision table says to give up, or the total deadline passes.
+
+    The strategy that last succeeded for an extractor is tried first on the
+    next request for that extractor.
+    """
+    def __init__(self, strategies, deadline=90, decisions=ERROR_DECISIONS):
+        self.strategies = list(strategies)
+        self.deadline = deadline
+        self.decisions = decisions
+        self._preferred = {}
+        self._lock = threading.Lock()
+
+    def ordered(self, extractor):
+        with self._lock:
+            preferred = self._preferred.get(extractor)
+        if preferred is None:
+            return list(self.strategies)
+        first = [s for s in self.strategies if s.key == preferred]
+        return first + [s for s in self.strategies if s.key != preferred]
+
+    def run(self, extractor, attempt):
+        """
+        Call `attempt(strategy, remaining)` for each strategy, `remaining`
+        being the seconds left before the deadline. It returns the result or
+        raises AttemptFailed (or any other exception) with a message that is
+        classified against the decision table.
+        """
+        result = self._run(extractor, attempt)
+        ATTEMPTS.observe(len(result.attempts))
+        FALLBACK_DEPTH.observe(result.depth)
+        return result
+
+    def _run(self, extractor, attempt):
+        started = time.monotonic()
+        records = []
+        skipped_proxies = set()
+        depth = 0
+
+        for position, strategy in enumerate(self.ordered(extractor), 1):
+            remaining = self.deadline - (time.monotonic() - started)
+            if remaining <= 0:
+                return FallbackResult(None, records, 'deadline', depth)
+            if strategy.proxy in skipped_proxies:
+                continue
+
+            depth = position
+            attempt_started = time.monotonic()
+            try:
+                value = attempt(strategy, remaining)
+            except Exception as e:
+                message = str(e)
+                decision = classify_error(message, self.decisions)
+                records.append(AttemptRecord(strategy, time.monotonic() - attempt_started, decision, message))
+                FALLBACK_DECISIONS.inc(decision=decision)
+                logger.warning(f"Attempt with {strategy} failed ({decision}): {message}")
+                if decision == STOP:
+                    return FallbackResult(None, records, 'permanent', depth)
+                if decision == SKIP_PROXY:
+                    skipped_proxies.add(strategy.proxy)
+                continue
+
+            records.append(AttemptRecord(strategy, time.monotonic() - attempt_started, 'ok'))
+            with self._lock:
+                self._preferred[extractor] = strategy.key
+            return FallbackResult(value, records, 'ok', depth)
+
+        return FallbackResult(None, records, 'exhausted', depth)
@@ -0,0 +1,197 @@
+import re
+import logging
+from operator import itemgetter
+from result_model import Format, VideoResult
+
+logger = logging.getLogger(__name__)
+
+# Streaming manifests cannot be downloaded as a single file
+EXCLUDED_PROTOCOLS = frozenset(['m3u8', 'm3u8_native', 'dash', 'dash_manifest'])
+EXCLUDED_NOTES = re.compile('audio only|images|thumbnail')
+
+# Query parameters that pin a URL to one byte range or player session
+STRIPPED_PARAMS = ('range', 'rn', 'rbuf', 'mime')
+# Applied to '&' + query, so every parameter starts with a literal '&'
+_STRIPPED_QUERY_PARAM = re.compile(r'&(?:%s)=[^&]*' % '|'.join(STRIPPED_PARAMS))
+
+_sort_key = itemgetter(0)
+
+# Signed CDN URLs (googlevideo) carry the file's content length, as a query
+# parameter or, in manifest-style URLs, as a path segment
+_CLEN_PARAM = re.compile(r'[?&/]clen[=/](\d+)')
+
+def has_audio_and_video(fmt):
+    """
+    True for a format with both tracks, as yt-dlp's `best` requires. A
+    missing codec counts as present, as it does in yt-dlp
+    """
+    return fmt.get('vcodec') != 'none' and fmt.get('acodec') != 'none'
+
+
+# Local equivalents of the format selectors that used to be sent to yt-dlp,
+# most preferred first: best[ext=mp4], best. The merged
+# bestvideo[ext=mp4]+bestaudio[ext=m4a] needs a muxed download and has no
+# single URL to offer as the default, so it has no policy. When no format
+# has both tracks the best one by quality stays first.
+FORMAT_POLICIES = (
+    lambda f: f.get('ext') == 'mp4' and has_audio_and_video(f),
+    has_audio_and_video
+)
+
+# Longer descriptions are cut in the summary view; the full text stays cached
+SUMMARY_DESCRIPTION_LENGTH = 300
+
+
+def strip_url(url):
+    """
+    Drop the STRIPPED_PARAMS from a URL's query, returning the URL untouched
+    when none is present. The other parameters are kept byte for byte, since
+    signed CDN URLs break when re-encoded.
+    """
+    base, question_mark, query = url.partition('?')
+    if not question_mark:
+        return url
+    fragment = ''
+    if '#' in query:
+        query, _, fragment = query.partition('#')
+        fragment = '#' + fragment
+    query, stripped = _STRIPPED_QUERY_PARAM.subn('', '&' + query)
+    if not stripped:
+        return url
+    query = query[1:]
+    return f"{base}?{query}{fragment}" if query else base + fragment
+
+
+def url_content_length(url):
+    """
+    The content length signed into a CDN URL (`clen=`), or None
+    """
+    match = _CLEN_PARAM.search(url)
+    return int(match.group(1)) if match else None
+
+
+def known_filesize(fmt, url):
+    """
+    Size of a format yt-dlp has no exact filesize for, from what is already
+    at hand: its `filesize_approx`, else the content length in its URL
+    """
+    approx = fmt.get('filesize_approx')
+    if approx:
+        return int(approx)
+    return url_content_length(url)
+
+
+def quality_key(fmt):
+    """
+    Sort key, best first when sorted in reverse: bitrate, height, width,
+    fps, then MP4 over other containers
+    """
+    return (
+        float(fmt.get('tbr') or 0),
+        fmt.get('height') or 0,
+        fmt.get('width') or 0,
+        fmt.get('fps') or 0,
+        fmt.get('ext', '') == 'mp4'
+    )
+
+
+def process_formats(formats, policies=(), size_fallback=None):
+    """
+    Filter, sort and project yt-dlp formats into the response format list
+    (of result_model.Format) in a single pass over the input.
+
+    `policies` are predicates over raw yt-dlp formats, most preferred first:
+    the best format of the first policy that matches anything is moved to the
+    front so that it becomes the default download.
+
+    `size_fallback(fmt, url)` (e.g. known_filesize) supplies the size of
+    formats yt-dlp gives no filesize for.
+    """
+    entries = []
+    for fmt in formats:
+        url = fmt.get('url')
+        if not url:
+            continue
+        if (fmt.get('protocol') or '').lower() in EXCLUDED_PROTOCOLS:
+            continue
+        note = fmt.get('format_note')
+        if note and EXCLUDED_NOTES.search(str(note).lower()):
+            continue
+        try:
+            key = quality_key(fmt)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Error processing format: {e}")
+            continue
+
+        record = Format.from_ytdlp(fmt, strip_url(url))
+        if size_fallback is not None and not record.filesize:
+            record.filesize = size_fallback(fmt, record.url) or record.filesize
+        entries.append((key, fmt, record))
+
+    entries.sort(key=_sort_key, reverse=True)
+
+    for policy in policies:
+        index = next((i for i, entry in enumerate(entries) if policy(entry[1])), None)
+        if index is not None:
+            if index:
+                entries.insert(0, entries.pop(index))
+            break
+
+    return [entry[2] for entry in entries]
+
+
+def build_video_data(info, url, formats):
+    """
+    Build the result for an extracted video from its info dict and its
+    processed format list (the first format is the default). Nothing in the
+    result refers back to `info`, so the caller can drop it right away.
+    """
+    return VideoResult.from_info(info, url, formats)
+
+
+def summarize_video_data(video_data, video_id):
+    """
+    The fast-path view of a result: what the page needs before the user
+    opens the quality selector, with only the default format. The full
+    format list is served page by page from the cached result under
+    `video_id`.
+    """
+    formats = video_data.get('formats', [])
+    description = video_data.get('description') or ''
+    if len(description) > SUMMARY_DESCRIPTION_LENGTH:
+        description = description[:SUMMARY_DESCRIPTION_LENGTH].rstrip() + '…'
+    summary = {
+        'video_id': video_id,
+        'title': video_data.get('title', 'Unknown'),
+        'thumbnail': video_data.get('thumbnail', ''),
+        'description': description,
+        'duration': video_data.get('duration', 0),
+        'view_count': video_data.get('view_count', 0),
+        'platform': video_data.get('platform', 'Unknown'),
+        'watch_url': video_data.get('watch_url', ''),
+        'formats': formats[:1],
+        'format_count': len(formats)
+    }
+    for key in ('quality', 'resolution', 'format', 'download_url'):
+        if key in video_data:
+            summary[key] = video_data[key]
+    return summary
+
+
+def filter_formats(formats, height=None, codec=None, ext=None):
+    """
+    Yield `(index, format)` for the response formats matching every given
+    filter, where index is the position in the full list. `codec` matches
+    the start of the video or audio codec name, so 'avc1' matches
+    'avc1.64001F'.
+    """
+    codec = codec.lower() if codec else None
+    for index, fmt in enumerate(formats):
+        if height is not None and fmt.get('quality') != f"{height}p":
+            continue
+        if ext and fmt.get('format') != ext:
+            continue
+        if codec and not (str(fmt.get('vcodec', '')).lower().startswith(codec) or
+                          str(fmt.get('acodec', '')).lower().startswith(codec)):
+            continue
+        yield index, fmt
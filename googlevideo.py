@@ -0,0 +1,155 @@
+"""
+Metadata of direct googlevideo.com URLs, decoded from the URL alone.
+
+A signed videoplayback URL names its format (`itag`), container (`mime`),
+size (`clen`), duration (`dur`) and expiry (`expire`). With a table of
+YouTube's itags that is enough to describe the format without any request.
+"""
+from urllib.parse import unquote
+from result_model import Format, VideoResult, NA, UNKNOWN
+from format_pipeline import strip_url
+
+# itag -> (ext, width, height, fps, vcodec, acodec). Widths are those of
+# 16:9 sources; fps is the nominal frame rate of the itag.
+ITAGS = {
+    # Progressive (audio and video in one file)
+    5: ('flv', 400, 240, 30, 'h263', 'mp3'),
+    17: ('3gp', 176, 144, 12, 'mp4v.20.3', 'mp4a.40.2'),
+    18: ('mp4', 640, 360, 30, 'avc1.42001E', 'mp4a.40.2'),
+    22: ('mp4', 1280, 720, 30, 'avc1.64001F', 'mp4a.40.2'),
+    36: ('3gp', 320, 180, 30, 'mp4v.20.3', 'mp4a.40.2'),
+    37: ('mp4', 1920, 1080, 30, 'avc1.64001F', 'mp4a.40.2'),
+    43: ('webm', 640, 360, 30, 'vp8', 'vorbis'),
+    # DASH video, H.264
+    133: ('mp4', 426, 240, 30, 'avc1.4d4015', 'none'),
+    134: ('mp4', 640, 360, 30, 'avc1.4d401e', 'none'),
+    135: ('mp4', 854, 480, 30, 'avc1.4d401f', 'none'),
+    136: ('mp4', 1280, 720, 30, 'avc1.4d401f', 'none'),
+    137: ('mp4', 1920, 1080, 30, 'avc1.640028', 'none'),
+    160: ('mp4', 256, 144, 30, 'avc1.4d400c', 'none'),
+    212: ('mp4', 854, 480, 30, 'avc1.4d401f', 'none'),
+    264: ('mp4', 2560, 1440, 30, 'avc1.640032', 'none'),
+    266: ('mp4', 3840, 2160, 30, 'avc1.640033', 'none'),
+    298: ('mp4', 1280, 720, 60, 'avc1.4d4020', 'none'),
+    299: ('mp4', 1920, 1080, 60, 'avc1.64002a', 'none'),
+    # DASH video, VP9
+    242: ('webm', 426, 240, 30, 'vp9', 'none'),
+    243: ('webm', 640, 360, 30, 'vp9', 'none'),
+    244: ('webm', 854, 480, 30, 'vp9', 'none'),
+    247: ('webm', 1280, 720, 30, 'vp9', 'none'),
+    248: ('webm', 1920, 1080, 30, 'vp9', 'none'),
+    271: ('webm', 2560, 1440, 30, 'vp9', 'none'),
+    272: ('webm', 3840, 2160, 30, 'vp9', 'none'),
+    278: ('webm', 256, 144, 30, 'vp9', 'none'),
+    302: ('webm', 1280, 720, 60, 'vp9', 'none'),
+    303: ('webm', 1920, 1080, 60, 'vp9', 'none'),
+    308: ('webm', 2560, 1440, 60, 'vp9', 'none'),
+    313: ('webm', 3840, 2160, 30, 'vp9', 'none'),
+    315: ('webm', 3840, 2160, 60, 'vp9', 'none'),
+    # DASH video, VP9.2 HDR
+    330: ('webm', 256, 144, 60, 'vp09.02.10.10', 'none'),
+    331: ('webm', 426, 240, 60, 'vp09.02.10.10', 'none'),
+    332: ('webm', 640, 360, 60, 'vp09.02.10.10', 'none'),
+    333: ('webm', 854, 480, 60, 'vp09.02.10.10', 'none'),
+    334: ('webm', 1280, 720, 60, 'vp09.02.10.10', 'none'),
+    335: ('webm', 1920, 1080, 60, 'vp09.02.10.10', 'none'),
+    336: ('webm', 2560, 1440, 60, 'vp09.02.10.10', 'none'),
+    337: ('webm', 3840, 2160, 60, 'vp09.02.10.10', 'none'),
+    # DASH video, AV1
+    394: ('mp4', 256, 144, 30, 'av01.0.00M.08', 'none'),
+    395: ('mp4', 426, 240, 30, 'av01.0.00M.08', 'none'),
+    396: ('mp4', 640, 360, 30, 'av01.0.01M.08', 'none'),
+    397: ('mp4', 854, 480, 30, 'av01.0.04M.08', 'none'),
+    398: ('mp4', 1280, 720, 30, 'av01.0.05M.08', 'none'),
+    399: ('mp4', 1920, 1080, 30, 'av01.0.08M.08', 'none'),
+    400: ('mp4', 2560, 1440, 30, 'av01.0.12M.08', 'none'),
+    401: ('mp4', 3840, 2160, 30, 'av01.0.12M.08', 'none'),
+    # DASH audio
+    139: ('m4a', NA, NA, NA, 'none', 'mp4a.40.5'),
+    140: ('m4a', NA, NA, NA, 'none', 'mp4a.40.2'),
+    141: ('m4a', NA, NA, NA, 'none', 'mp4a.40.2'),
+    171: ('webm', NA, NA, NA, 'none', 'vorbis'),
+    172: ('webm', NA, NA, NA, 'none', 'vorbis'),
+    249: ('webm', NA, NA, NA, 'none', 'opus'),
+    250: ('webm', NA, NA, NA, 'none', 'opus'),
+    251: ('webm', NA, NA, NA, 'none', 'opus'),
+    256: ('m4a', NA, NA, NA, 'none', 'mp4a.40.5'),
+    258: ('m4a', NA, NA, NA, 'none', 'mp4a.40.2'),
+    599: ('m4a', NA, NA, NA, 'none', 'mp4a.40.5'),
+    600: ('webm', NA, NA, NA, 'none', 'opus'),
+}
+
+# The query parameters the decoder reads; the others are never unquoted
+DECODED_PARAMS = frozenset(('itag', 'mime', 'clen', 'dur'))
+
+# mime subtype -> file extension, for itags missing from the table
+MIME_EXTENSIONS = {'mp4': 'mp4', 'webm': 'webm', '3gpp': '3gp', 'x-flv': 'flv'}
+
+
+def is_direct_url(url):
+    """
+    Whether `url` is a googlevideo videoplayback URL, which needs no
+    extraction
+    """
+    host, _, rest = url.partition('://')[2].partition('/')
+    return host.endswith('.googlevideo.com') and rest.startswith('videoplayback')
+
+
+def _params(url):
+    """
+    The DECODED_PARAMS of a URL's query. A signed URL has some thirty
+    parameters, and parse_qsl would unquote every one of them
+    """
+    query = url.partition('?')[2].partition('#')[0]
+    params = {}
+    for pair in query.split('&'):
+        name, _, value = pair.partition('=')
+        if name in DECODED_PARAMS and name not in params:
+            params[name] = unquote(value)
+    return params
+
+
+def _number(value, cast):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def decode_format(url):
+    """
+    Build the Format of a videoplayback URL from its query parameters.
+    Unknown itags keep only what `mime` and `clen` say
+    """
+    params = _params(url)
+    itag = _number(params.get('itag'), int)
+    mime = params.get('mime', '')
+    kind, _, subtype = mime.partition('/')
+
+    known = ITAGS.get(itag)
+    if known is not None:
+        ext, width, height, fps, vcodec, acodec = known
+    else:
+        ext = MIME_EXTENSIONS.get(subtype, 'm4a' if kind == 'audio' and subtype == 'mp4' else 'mp4')
+        width = height = fps = NA
+        vcodec = 'none' if kind == 'audio' else UNKNOWN
+        acodec = UNKNOWN
+    if kind == 'audio' and ext == 'mp4':
+        ext = 'm4a'
+
+    filesize = _number(params.get('clen'), int) or 0
+    duration = _number(params.get('dur'), float)
+    tbr = round(filesize * 8 / duration / 1000, 3) if filesize and duration else 0
+    return Format(strip_url(url), ext, width, height, filesize, vcodec, acodec, fps, tbr), duration
+
+
+def decode_direct_url(url):
+    """
+    Describe a direct googlevideo URL as an extraction result, without any
+    network access
+    """
+    fmt, duration = decode_format(url)
+    return VideoResult(
+        'Direct Video', '', '', int(round(duration)) if duration else 0, 0, 'googlevideo', url, [fmt],
+        'Unknown', '', 0, '', 0
+    )
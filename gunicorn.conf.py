@@ -0,0 +1,23 @@
+"""
+gunicorn settings for the WSGI app:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+With PRELOAD_APP=1 the master imports the app and prewarms yt-dlp once
+before forking, so workers start ready and share those pages
+copy-on-write. Code changes then need a full restart instead of a HUP
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+preload_app = os.environ.get('PRELOAD_APP', '0').lower() in ('1', 'true', 'yes')
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        import app
+        count = app.prewarm()
+        server.log.info(f"Prewarmed yt-dlp with {count} extractors")
@@ -0,0 +1,31 @@
+"""
+gunicorn settings for the ASGI entry point:
+
+    gunicorn -c gunicorn_asgi.conf.py asgi:application
+
+Each worker is one uvicorn event loop with its own extraction threads
+(ASGI_EXTRACT_WORKERS), so one or two workers per core are enough.
+PRELOAD_APP=1 prewarms yt-dlp in the master, as in gunicorn.conf.py
+"""
+import os
+import multiprocessing
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+worker_class = 'uvicorn.workers.UvicornWorker'
+workers = int(os.environ.get('WEB_CONCURRENCY', min(4, multiprocessing.cpu_count() * 2)))
+# Idle keep-alive and SSE connections only cost a socket on the event loop,
+# so accept bursts of them and keep them open for a while
+backlog = 4096
+keepalive = 75
+# Extractions run off the event loop, so the worker heartbeat only stalls if
+# the loop itself is blocked
+timeout = 60
+graceful_timeout = 30
+preload_app = os.environ.get('PRELOAD_APP', '0').lower() in ('1', 'true', 'yes')
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        import app
+        count = app.prewarm()
+        server.log.info(f"Prewarmed yt-dlp with {count} extractors")
@@ -0,0 +1,216 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from result_model import dumps
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs are kept around this long so that clients can still poll them
+JOB_RETENTION = 600
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+FINISHED = (DONE, FAILED)
+
+
+def sse_message(event, data):
+    """
+    Format one Server-Sent Events message
+    """
+    return f"event: {event}\ndata: {dumps(data).decode('utf-8')}\n\n"
+
+
+class QueueFull(Exception):
+    """
+    Raised by JobManager.submit when the executor backlog is at its limit
+    """
+
+
+class Job:
+    """
+    A single background extraction. Every state change is appended to
+    `events` so that SSE streams can replay what they missed.
+    """
+    def __init__(self, kind, url, progress=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.url = url
+        self.progress = progress
+        self.status = QUEUED
+        self.result = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.events = []
+        self._listeners = []
+        self._cond = threading.Condition()
+        self._emit(QUEUED)
+
+    def _emit(self, status, **data):
+        with self._cond:
+            self.status = status
+            self.events.append(dict(status=status, time=time.time(), **data))
+            self._cond.notify_all()
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener()
+
+    def add_listener(self, callback):
+        """
+        Call `callback()` (from the worker thread) after every new event.
+        Lets async servers wait for events without blocking a thread.
+        """
+        with self._cond:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._cond:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def events_since(self, index):
+        with self._cond:
+            return self.events[index:]
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+    def wait_for_event(self, index, timeout=None):
+        """
+        Block until there are more than `index` events (or `timeout` passes)
+        and return the events from `index` on
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: len(self.events) > index, timeout)
+            return self.events[index:]
+
+    def to_dict(self):
+        data = {
+            'id': self.id,
+            'kind': self.kind,
+            'url': self.url,
+            'status': self.status,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at
+        }
+        if self.progress is not None and self.status != QUEUED:
+            data['progress'] = self.progress.snapshot()
+        if self.finished:
+            data['result'] = self.result
+        return data
+
+
+class JobManager:
+    """
+    Runs extractions on a bounded thread pool so request threads never wait
+    on yt-dlp. At most `max_workers + max_queue` jobs may be pending at once;
+    anything beyond that is rejected with QueueFull.
+    """
+    def __init__(self, max_workers=4, max_queue=32, retention=JOB_RETENTION, name='extract'):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._jobs = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, kind, func, url, progress=None):
+        """
+        Queue `func(url)` and return its Job. The callable returns a result
+        dict; a dict with an `error` key marks the job as failed.
+        `progress`, an object with a `snapshot()` method that `func`
+        updates, is reported with the job while it runs.
+        """
+        with self._lock:
+            self._expire_locked()
+            if self._pending >= self.max_workers + self.max_queue:
+                raise QueueFull()
+            self._pending += 1
+            job = Job(kind, url, progress)
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, func)
+        return job
+
+    def _run(self, job, func):
+        job._emit(RUNNING)
+        try:
+            result = func(job.url)
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}")
+            result = {"error": f"حدث خطأ: {str(e)}"}
+        finally:
+            with self._lock:
+                self._pending -= 1
+        job.result = result
+        job.finished_at = time.time()
+        failed = not isinstance(result, Mapping) or 'error' in result
+        job._emit(FAILED if failed else DONE)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _expire_locked(self):
+        cutoff = time.time() - self.retention
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def info(self):
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'pending': self._pending,
+                'jobs': len(self._jobs)
+            }
+
+
+_default_manager = None
+_default_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """
+    Build the process-wide job manager from the environment on first use
+    """
+    global _default_manager
+    if _default_manager is None:
+        with _default_manager_lock:
+            if _default_manager is None:
+                _default_manager = JobManager(
+                    max_workers=int(os.environ.get('EXTRACTION_WORKERS', 4)),
+                    max_queue=int(os.environ.get('EXTRACTION_QUEUE_SIZE', 32))
+                )
+    return _default_manager
+
+
+_download_manager = None
+_download_manager_lock = threading.Lock()
+
+
+def get_download_manager():
+    """
+    Build the process-wide manager of download jobs on first use. Downloads
+    run for minutes, so they get their own workers instead of holding up
+    extractions
+    """
+    global _download_manager
+    if _download_manager is None:
+        with _download_manager_lock:
+            if _download_manager is None:
+                _download_manager = JobManager(
+                    max_workers=int(os.environ.get('DOWNLOAD_JOBS', 2)),
+                    max_queue=int(os.environ.get('DOWNLOAD_QUEUE_SIZE', 16)),
+                    retention=int(os.environ.get('DOWNLOAD_RETENTION', 3600)),
+                    name='download'
+                )
+    return _download_manager
@@ -0,0 +1,187 @@
+import os
+import time
+import random
+import bisect
+import threading
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+_sample_rate = None
+
+
+def sample_rate():
+    """
+    Fraction of timings that are recorded, from METRICS_SAMPLE_RATE (read on
+    first use so that .env has been loaded)
+    """
+    global _sample_rate
+    if _sample_rate is None:
+        _sample_rate = min(max(float(os.environ.get('METRICS_SAMPLE_RATE', 1.0)), 0.0), 1.0)
+    return _sample_rate
+
+
+def sampled():
+    rate = sample_rate()
+    return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus exposition format
+    """
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Time the block, subject to sampling
+        """
+        if not sampled():
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(counts) for key, counts in self._values.items()}
+        for key, counts in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', bound))} {cumulative}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {round(counts[-1], 6)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def register_collector(self, prefix, func, label=None):
+        """
+        Export every numeric value of the dict returned by `func()` as a
+        gauge named `<prefix>_<key>`, read at scrape time. With `label`,
+        `func()` returns {label value: dict} and each gauge gets one sample
+        per label value
+        """
+        with self._lock:
+            self._collectors.append((prefix, func, label))
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        for prefix, func, label in collectors:
+            try:
+                values = func() or {}
+            except Exception:
+                continue
+            if label is None:
+                values = {None: values}
+            series = {}
+            for label_value, group in sorted(values.items(), key=lambda item: str(item[0])):
+                labels = _format_labels((label,), (label_value,)) if label else ''
+                for key, value in group.items():
+                    if isinstance(value, bool) or not isinstance(value, (int, float)):
+                        continue
+                    series.setdefault(key, []).append(f"{prefix}_{key}{labels} {value}")
+            for key in sorted(series):
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.extend(series[key])
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+EXTRACTION_SECONDS = REGISTRY.histogram(
+    'extraction_duration_seconds', 'Time spent extracting one URL (cache misses only)', ['extractor'])
+PHASE_SECONDS = REGISTRY.histogram(
+    'extraction_phase_seconds', 'Time spent in each extraction phase', ['phase'])
+ATTEMPTS = REGISTRY.histogram(
+    'extraction_attempts', 'Connection strategies tried per extract_cdn_info request', buckets=COUNT_BUCKETS)
+FALLBACK_DEPTH = REGISTRY.histogram(
+    'fallback_depth', 'Position of the last strategy reached in the fallback order', buckets=COUNT_BUCKETS)
+FALLBACK_DECISIONS = REGISTRY.counter(
+    'fallback_decisions_total', 'Failed attempts by decision taken', ['decision'])
+ERRORS = REGISTRY.counter(
+    'extraction_errors_total', 'Extraction errors by class', ['error'])
+THROTTLED = REGISTRY.counter(
+    'extractor_throttled_total', 'Extractions the platform throttled (HTTP 429/403)', ['extractor'])
+CIRCUIT_TRIPS = REGISTRY.counter(
+    'circuit_trips_total', 'Times an extractor circuit opened', ['extractor'])
+GUARD_REJECTIONS = REGISTRY.counter(
+    'extractor_rejections_total', 'Extractions not attempted: circuit open or no slot in time', ['extractor', 'reason'])
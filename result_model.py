@@ -0,0 +1,244 @@
+"""
+Compact extraction results.
+
+VideoResult and Format copy only the fields the responses use out of
+yt-dlp's info dict, so the info dict (formats, thumbnails, subtitles,
+captions: often megabytes) can be dropped as soon as a result is built.
+Both are slotted and read like the dicts they replace (`result['title']`,
+`fmt.get('url')`, `'error' in result`), and serialize to exactly the same
+JSON. The display strings ('720p', '1280x720') are derived on access
+instead of being stored in every cached entry.
+"""
+import json
+from collections.abc import Mapping
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+NA = 'N/A'
+UNKNOWN = 'unknown'
+
+
+class _Record(Mapping):
+    """
+    Read-only dict view over a slotted object: subclasses list their keys in
+    `_keys` and compute a value per key in `_value(key)`
+    """
+    __slots__ = ()
+    _keys = ()
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        return self._value(key)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def to_dict(self):
+        return {key: self._value(key) for key in self._keys}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class Format(_Record):
+    """
+    One downloadable format. Missing values are stored as the same
+    placeholders the dict responses always used
+    """
+    __slots__ = ('url', 'ext', 'width', 'height', 'filesize', 'vcodec', 'acodec', 'fps', 'tbr')
+    _keys = ('quality', 'format', 'resolution', 'filesize', 'url', 'vcodec', 'acodec', 'fps', 'tbr')
+
+    def __init__(self, url, ext='mp4', width=NA, height=NA, filesize=0, vcodec=UNKNOWN, acodec=UNKNOWN,
+                 fps=NA, tbr=0):
+        self.url = url
+        self.ext = ext
+        self.width = width
+        self.height = height
+        self.filesize = filesize
+        self.vcodec = vcodec
+        self.acodec = acodec
+        self.fps = fps
+        self.tbr = tbr
+
+    @classmethod
+    def from_ytdlp(cls, fmt, url):
+        """
+        Copy a yt-dlp format dict; `url` is its already cleaned URL
+        """
+        return cls(
+            url,
+            fmt.get('ext', 'mp4'),
+            fmt.get('width', NA),
+            fmt.get('height', NA),
+            fmt.get('filesize', 0),
+            fmt.get('vcodec', UNKNOWN),
+            fmt.get('acodec', UNKNOWN),
+            fmt.get('fps', NA),
+            fmt.get('tbr', 0)
+        )
+
+    @property
+    def quality(self):
+        height = self.height
+        return f"{height}p" if height and height != NA else 'auto'
+
+    @property
+    def resolution(self):
+        return f"{self.width}x{self.height}"
+
+    def _value(self, key):
+        if key == 'format':
+            return self.ext
+        return getattr(self, key)
+
+    def to_dict(self):
+        height = self.height
+        return {
+            'quality': f"{height}p" if height and height != NA else 'auto',
+            'format': self.ext,
+            'resolution': f"{self.width}x{height}",
+            'filesize': self.filesize,
+            'url': self.url,
+            'vcodec': self.vcodec,
+            'acodec': self.acodec,
+            'fps': self.fps,
+            'tbr': self.tbr
+        }
+
+    def __reduce__(self):
+        return (Format, tuple(getattr(self, name) for name in Format.__slots__))
+
+
+class VideoResult(_Record):
+    """
+    A successful extraction: video metadata plus its formats, best first.
+    The first format is the default download
+    """
+    __slots__ = ('title', 'thumbnail', 'description', 'duration', 'view_count', 'platform', 'watch_url',
+                 'formats', 'uploader', 'upload_date', 'like_count', 'channel_url', 'channel_follower_count')
+    _base_keys = ('title', 'thumbnail', 'description', 'duration', 'view_count', 'platform', 'watch_url',
+                  'formats', 'uploader', 'upload_date', 'like_count', 'channel_url', 'channel_follower_count')
+    _default_keys = ('quality', 'resolution', 'format', 'download_url')
+
+    def __init__(self, title, thumbnail, description, duration, view_count, platform, watch_url, formats,
+                 uploader, upload_date, like_count, channel_url, channel_follower_count):
+        self.title = title
+        self.thumbnail = thumbnail
+        self.description = description
+        self.duration = duration
+        self.view_count = view_count
+        self.platform = platform
+        self.watch_url = watch_url
+        self.formats = formats
+        self.uploader = uploader
+        self.upload_date = upload_date
+        self.like_count = like_count
+        self.channel_url = channel_url
+        self.channel_follower_count = channel_follower_count
+
+    @classmethod
+    def from_info(cls, info, url, formats):
+        return cls(
+            info.get('title', 'Unknown'),
+            info.get('thumbnail', ''),
+            info.get('description', ''),
+            info.get('duration', 0),
+            info.get('view_count', 0),
+            info.get('extractor', 'Unknown'),
+            info.get('webpage_url', url),
+            formats,
+            info.get('uploader', 'Unknown'),
+            info.get('upload_date', ''),
+            info.get('like_count', 0),
+            info.get('channel_url', ''),
+            info.get('channel_follower_count', 0)
+        )
+
+    @property
+    def _keys(self):
+        return self._base_keys + self._default_keys if self.formats else self._base_keys
+
+    def _value(self, key):
+        if key in self._default_keys:
+            default = self.formats[0]
+            return default['url'] if key == 'download_url' else default[key]
+        return getattr(self, key)
+
+    def to_dict(self):
+        data = {key: getattr(self, key) for key in self._base_keys}
+        data['formats'] = [fmt.to_dict() if isinstance(fmt, Format) else dict(fmt) for fmt in self.formats]
+        if self.formats:
+            default = data['formats'][0]
+            data.update({
+                'quality': default['quality'],
+                'resolution': default['resolution'],
+                'format': default['format'],
+                'download_url': default['url']
+            })
+        return data
+
+    def __reduce__(self):
+        return (VideoResult, tuple(getattr(self, name) for name in VideoResult.__slots__))
+
+
+# Columns of the columnar format layout; missing values are null instead of
+# the 'N/A'/'unknown' placeholders
+FORMAT_COLUMNS = ('quality', 'format', 'width', 'height', 'filesize', 'url', 'vcodec', 'acodec', 'fps', 'tbr')
+_PLACEHOLDERS = (NA, UNKNOWN)
+
+
+def columnar_formats(formats):
+    """
+    Encode a format list as one array per field, for clients that ask for
+    layout=columnar
+    """
+    rows = []
+    for fmt in formats:
+        if isinstance(fmt, Format):
+            rows.append((fmt.quality, fmt.ext, fmt.width, fmt.height, fmt.filesize, fmt.url,
+                         fmt.vcodec, fmt.acodec, fmt.fps, fmt.tbr))
+            continue
+        # Plain dicts (e.g. read back from the SQLite cache) only keep the
+        # resolution string
+        width, _, height = str(fmt.get('resolution', '')).partition('x')
+        rows.append((fmt.get('quality'), fmt.get('format'), int(width) if width.isdigit() else None,
+                     int(height) if height.isdigit() else None, fmt.get('filesize'), fmt.get('url'),
+                     fmt.get('vcodec'), fmt.get('acodec'), fmt.get('fps'), fmt.get('tbr')))
+    columns = {
+        name: [None if value in _PLACEHOLDERS else value for value in column]
+        for name, column in zip(FORMAT_COLUMNS, zip(*rows))
+    } if rows else {name: [] for name in FORMAT_COLUMNS}
+    columns['count'] = len(formats)
+    return columns
+
+
+def json_default(obj):
+    if isinstance(obj, _Record):
+        return obj.to_dict()
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    def dumps(obj):
+        """
+        Serialize to compact UTF-8 JSON bytes
+        """
+        return orjson.dumps(obj, default=json_default)
+else:
+    def dumps(obj):
+        """
+        Serialize to compact UTF-8 JSON bytes
+        """
+        return json.dumps(obj, default=json_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
@@ -0,0 +1,535 @@
+"""
+Server-side downloads split into byte ranges fetched in parallel.
+
+The file is preallocated as `<path>.part` and every segment is written in
+place at its offset, so segments can finish in any order. How far
+every segment got is recorded in `<path>.part.json`; a download that is
+interrupted (error, expired URL, restart) picks up from there the next
+time the same file is requested, even with a freshly signed URL.
+
+Files (finished or partial) unused for the retention period are deleted,
+and a download is refused when it would take the directory past its size
+or file quota.
+"""
+import os
+import time
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36'
+
+DOWNLOAD_DIR = os.path.join(tempfile.gettempdir(), "video_extractor_downloads")
+
+SEGMENT_SIZE = 8 * 1024 * 1024
+CHUNK_SIZE = 256 * 1024
+PART_SUFFIXES = ('.part.json.tmp', '.part.json', '.part')
+
+
+class DownloadError(Exception):
+    """
+    Raised when a download cannot be completed
+    """
+
+
+class QuotaExceeded(DownloadError):
+    """
+    Raised when a download would take the directory past its quota
+    """
+
+
+class _Refused(DownloadError):
+    """
+    The CDN refused a segment (expired or forbidden URL); retrying the
+    same URL cannot help
+    """
+
+
+def download_name(video_key, fmt):
+    """
+    Stable file name for a format of a video: the same format maps to the
+    same file across extractions, so an interrupted download resumes
+    """
+    identity = '|'.join(str(fmt.get(field)) for field in ('quality', 'format', 'resolution', 'vcodec', 'acodec'))
+    digest = hashlib.sha1(f"{video_key}|{identity}".encode('utf-8')).hexdigest()[:16]
+    return f"{digest}.{fmt.get('format') or 'mp4'}"
+
+
+class DownloadProgress:
+    """
+    Thread-safe progress of one download
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = None
+        self.downloaded = 0
+        self.resumed = 0
+        self.segments = 0
+        self.segments_done = 0
+        self.started_at = None
+
+    def start(self, total, segments, segments_done, resumed):
+        with self._lock:
+            self.total = total
+            self.segments = segments
+            self.segments_done = segments_done
+            self.downloaded = self.resumed = resumed
+            self.started_at = time.monotonic()
+
+    def add(self, amount):
+        with self._lock:
+            self.downloaded += amount
+
+    def segment_done(self):
+        with self._lock:
+            self.segments_done += 1
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+            # Bytes resumed from an earlier attempt are not part of the speed
+            speed = (self.downloaded - self.resumed) / elapsed if elapsed > 0 else 0.0
+            data = {
+                'total': self.total,
+                'downloaded': self.downloaded,
+                'resumed': self.resumed,
+                'segments': self.segments,
+                'segments_done': self.segments_done,
+                'elapsed': round(elapsed, 2),
+                'speed': int(speed)
+            }
+            if self.total:
+                data['percent'] = round(100.0 * self.downloaded / self.total, 1)
+                if speed > 0:
+                    data['eta'] = round((self.total - self.downloaded) / speed, 1)
+            return data
+
+
+class DownloadStats:
+    """
+    Thread-safe download counters
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = 0
+        self.completed = 0
+        self.failed = 0
+        self.resumed = 0
+        self.bytes = 0
+        self.segment_retries = 0
+        self.expired = 0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'started': self.started,
+                'completed': self.completed,
+                'failed': self.failed,
+                'resumed': self.resumed,
+                'bytes': self.bytes,
+                'segment_retries': self.segment_retries,
+                'expired': self.expired
+            }
+
+
+class _CompletionMap:
+    """
+    How far each segment of a `.part` file got, persisted next to it:
+    finished segments, and the bytes already written of unfinished ones
+    """
+    def __init__(self, path, size, segment_size):
+        self.path = path
+        self.size = size
+        self.segment_size = segment_size
+        self.done = set()
+        # segment index -> bytes written from its start
+        self.partial = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Read the map of an earlier attempt. Returns False when there is
+        none or it describes a different file
+        """
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get('size') != self.size or data.get('segment_size') != self.segment_size:
+            return False
+        self.done = set(data.get('done', []))
+        self.partial = {int(index): written for index, written in data.get('partial', {}).items()}
+        return True
+
+    def length(self, index):
+        return min(self.segment_size, self.size - index * self.segment_size)
+
+    def completed_bytes(self):
+        return sum(self.length(index) for index in self.done) + sum(self.partial.values())
+
+    def save(self, fd):
+        with self._lock:
+            data = {'size': self.size, 'segment_size': self.segment_size, 'done': sorted(self.done),
+                    'partial': {str(index): written for index, written in list(self.partial.items())}}
+            # What the map records must reach the disk before the map does
+            getattr(os, 'fdatasync', os.fsync)(fd)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+
+    def mark(self, index, written, fd):
+        """
+        Record segment `index` as finished after `written` bytes of it were
+        written in total
+        """
+        if written != self.length(index):
+            raise DownloadError(f"Segment {index} has {written} of {self.length(index)} bytes")
+        self.done.add(index)
+        self.partial.pop(index, None)
+        self.save(fd)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _pwrite(fd, data, offset, lock):
+    if hasattr(os, 'pwrite'):
+        os.pwrite(fd, data, offset)
+    else:  # Windows
+        with lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            os.write(fd, data)
+
+
+class SegmentedDownloader:
+    """
+    Downloads files in `segment_size` byte ranges over at most `connections`
+    concurrent connections, shared by every download in the process. A
+    segment that fails is retried `retries` times before the download
+    fails. Servers that ignore Range requests get a single-connection
+    download instead, which cannot resume.
+
+    Files in `directory` not used for `retention` seconds are deleted. The
+    directory holds at most `max_bytes` in `max_files` files, counting the
+    full size of downloads in progress.
+    """
+    def __init__(self, directory=DOWNLOAD_DIR, connections=8, segment_size=SEGMENT_SIZE, retries=3,
+                 timeout=(10, 60), retention=3600, max_bytes=10 * 1024 ** 3, max_files=50):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.directory = directory
+        self.connections = connections
+        self.segment_size = segment_size
+        self.retries = retries
+        self.timeout = timeout
+        self.retention = retention
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        # path -> bytes reserved by a download of this process in progress
+        self._active = {}
+        self._quota_lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=connections, pool_maxsize=connections, pool_block=True, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # Byte ranges only make sense on the unencoded body
+        self.session.headers.update({'User-Agent': USER_AGENT, 'Accept-Encoding': 'identity'})
+        self._executor = ThreadPoolExecutor(max_workers=connections, thread_name_prefix='download')
+        self._flight = SingleFlight()
+        self.stats = DownloadStats()
+        os.makedirs(directory, exist_ok=True)
+
+    def _scan(self, exclude=None):
+        """
+        Bytes and files in the directory, deleting files unused for longer
+        than the retention. Downloads in progress here count with their
+        reservation, and `exclude` not at all
+        """
+        now = time.time()
+        used = files = 0
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return 0, 0
+        for entry in entries:
+            name = entry.path
+            for suffix in PART_SUFFIXES:
+                if name.endswith(suffix):
+                    name = name[:-len(suffix)]
+                    break
+            if name == exclude or name in self._active:
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            # Downloads in other processes keep writing, so their mtime stays fresh
+            if self.retention and now - stat.st_mtime > self.retention:
+                try:
+                    os.remove(entry.path)
+                    self.stats.incr('expired')
+                except FileNotFoundError:
+                    pass
+                continue
+            used += stat.st_size
+            if not entry.name.endswith(('.part.json', '.part.json.tmp')):
+                files += 1
+        return used + sum(self._active.values()), files + len(self._active)
+
+    def check_quota(self, pending=0):
+        """
+        Delete expired files, then raise QuotaExceeded unless there is room
+        for another download besides `pending` ones not started yet
+        """
+        with self._quota_lock:
+            used, files = self._scan()
+        if used >= self.max_bytes or files + pending >= self.max_files:
+            raise QuotaExceeded(f"Download directory full: {files} files, {used} bytes")
+
+    def _reserve(self, path, size):
+        """
+        Reserve room for `size` bytes at `path`. Returns the bytes left
+        for it when its size is unknown
+        """
+        with self._quota_lock:
+            used, files = self._scan(exclude=path)
+            if files + 1 > self.max_files or used + (size or 0) > self.max_bytes:
+                raise QuotaExceeded(f"No room for {size or 'a file of unknown size'}: "
+                                    f"{files} files, {used} bytes in use")
+            self._active[path] = size or 0
+            return self.max_bytes - used
+
+    def _release(self, path):
+        with self._quota_lock:
+            self._active.pop(path, None)
+
+    def _probe(self, url):
+        """
+        The file's size and whether the server honours Range requests
+        """
+        import requests
+
+        try:
+            with self.session.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=self.timeout) as response:
+                content_range = response.headers.get('Content-Range', '')
+                if response.status_code == 206 and content_range.rsplit('/', 1)[-1].isdigit():
+                    return int(content_range.rsplit('/', 1)[1]), True
+                if response.status_code == 200:
+                    length = response.headers.get('Content-Length', '')
+                    return (int(length) if length.isdigit() else None), False
+                raise DownloadError(f"HTTP {response.status_code} for {url[:80]}")
+        except requests.RequestException as e:
+            raise DownloadError(str(e))
+
+    def download(self, url, path, filesize=None, progress=None):
+        """
+        Download `url` to `path`. `filesize` is the expected size when
+        known. Concurrent calls for the same path share one download.
+        Returns a summary of the download
+        """
+        result, _ = self._flight.do(os.path.abspath(path), self._download, url, path, filesize,
+                                    progress or DownloadProgress())
+        return result
+
+    def _download(self, url, path, filesize, progress):
+        if os.path.exists(path) and filesize and os.path.getsize(path) == filesize:
+            # Reused: its retention starts over
+            os.utime(path)
+            progress.start(filesize, 1, 1, filesize)
+            return {'path': path, 'size': filesize, 'resumed': filesize, 'elapsed': 0.0, 'speed': 0}
+
+        self.stats.incr('started')
+        start = time.monotonic()
+        try:
+            size, ranged = self._probe(url)
+            if filesize and size and filesize != size:
+                logger.info(f"Size of {path} is {size}, not the {filesize} reported by the extractor")
+            room = self._reserve(path, size)
+            try:
+                part = f"{path}.part"
+                if ranged and size:
+                    resumed = self._segmented(url, part, size, progress)
+                else:
+                    resumed = 0
+                    size = self._single(url, part, size, progress, room)
+                os.replace(part, path)
+                os.utime(path)
+            finally:
+                self._release(path)
+        except DownloadError:
+            self.stats.incr('failed')
+            raise
+        except Exception as e:
+            self.stats.incr('failed')
+            raise DownloadError(str(e))
+        elapsed = time.monotonic() - start
+        self.stats.incr('completed')
+        return {
+            'path': path,
+            'size': size,
+            'resumed': resumed,
+            'elapsed': round(elapsed, 3),
+            'speed': int((size - resumed) / elapsed) if elapsed > 0 else 0
+        }
+
+    def _segmented(self, url, part, size, progress):
+        """
+        Fetch the missing segments of `part` concurrently. Returns the
+        number of bytes already there from an earlier attempt
+        """
+        count = (size + self.segment_size - 1) // self.segment_size
+        completion = _CompletionMap(f"{part}.json", size, self.segment_size)
+        fd = os.open(part, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644)
+        try:
+            # A map only counts with the file it describes
+            if os.fstat(fd).st_size != size or not completion.load():
+                completion.done = set()
+                completion.partial = {}
+                if hasattr(os, 'posix_fallocate'):
+                    os.posix_fallocate(fd, 0, size)
+                os.ftruncate(fd, size)
+            resumed = completion.completed_bytes()
+            if resumed:
+                self.stats.incr('resumed')
+                logger.info(f"Resuming {part}: {resumed} of {size} bytes already there")
+            progress.start(size, count, len(completion.done), resumed)
+
+            lock = threading.Lock()
+            failed = threading.Event()
+            futures = [
+                self._executor.submit(self._fetch_segment, url, fd, lock, index, size, completion, progress, failed)
+                for index in range(count) if index not in completion.done
+            ]
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            errors = [future.exception() for future in done if future.exception() is not None]
+            if errors:
+                # Segments not started yet give up; finished ones stay recorded
+                failed.set()
+                wait(futures)
+                raise errors[0]
+            # Every segment's byte count was checked against its range when marked
+            if len(completion.done) != count:
+                raise DownloadError(f"Incomplete download: {len(completion.done)} of {count} segments")
+        finally:
+            os.close(fd)
+        completion.remove()
+        return resumed
+
+    def _fetch_segment(self, url, fd, lock, index, size, completion, progress, failed):
+        import requests
+
+        start = index * self.segment_size
+        end = min(size, start + self.segment_size) - 1
+        fetched = 0
+        for attempt in range(self.retries + 1):
+            if failed.is_set():
+                return
+            # Retries, like resumed downloads, continue where the segment got to
+            offset = start + completion.partial.get(index, 0)
+            try:
+                with self.session.get(url, headers={'Range': f"bytes={offset}-{end}"}, stream=True,
+                                      timeout=self.timeout) as response:
+                    if response.status_code in (401, 403, 404, 410):
+                        raise _Refused(f"HTTP {response.status_code} for bytes {offset}-{end}")
+                    if response.status_code != 206 or not response.headers.get('Content-Range', '').startswith(
+                            f"bytes {offset}-{end}/"):
+                        raise DownloadError(f"HTTP {response.status_code} for bytes {offset}-{end}")
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        if offset + len(chunk) > end + 1:
+                            raise DownloadError(f"Too much data for bytes {start}-{end}")
+                        _pwrite(fd, chunk, offset, lock)
+                        offset += len(chunk)
+                        fetched += len(chunk)
+                        completion.partial[index] = offset - start
+                        progress.add(len(chunk))
+                if offset != end + 1:
+                    raise DownloadError(f"Got {offset - start} of {end - start + 1} bytes for bytes {start}-{end}")
+            except (requests.RequestException, DownloadError) as e:
+                if attempt == self.retries or isinstance(e, _Refused):
+                    self.stats.incr('bytes', fetched)
+                    completion.save(fd)
+                    raise DownloadError(f"Segment {index} failed: {str(e)}")
+                self.stats.incr('segment_retries')
+                time.sleep(min(2 ** attempt * 0.5, 5))
+                continue
+            self.stats.incr('bytes', fetched)
+            completion.mark(index, offset - start, fd)
+            progress.segment_done()
+            return
+
+    def _single(self, url, part, size, progress, limit=None):
+        """
+        Fetch the whole file over one connection, giving up past `limit`
+        bytes. Returns its size
+        """
+        import requests
+
+        progress.start(size, 1, 0, 0)
+        # Left by an earlier segmented attempt, and useless now
+        _CompletionMap(f"{part}.json", size, self.segment_size).remove()
+        written = 0
+        try:
+            with self.session.get(url, stream=True, timeout=self.timeout) as response, open(part, 'wb') as f:
+                if response.status_code != 200:
+                    raise DownloadError(f"HTTP {response.status_code} for {url[:80]}")
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    if limit is not None and written + len(chunk) > limit:
+                        raise QuotaExceeded(f"{url[:80]} is larger than the {limit} bytes left")
+                    f.write(chunk)
+                    written += len(chunk)
+                    progress.add(len(chunk))
+        except requests.RequestException as e:
+            raise DownloadError(str(e))
+        if size is not None and written != size:
+            raise DownloadError(f"Got {written} of {size} bytes")
+        self.stats.incr('bytes', written)
+        progress.segment_done()
+        return written
+
+    def info(self):
+        data = self.stats.snapshot()
+        with self._quota_lock:
+            used, files = self._scan()
+        data.update({'connections': self.connections, 'segment_size': self.segment_size,
+                     'used_bytes': used, 'files': files, 'max_bytes': self.max_bytes, 'max_files': self.max_files})
+        return data
+
+
+_default_downloader = None
+_default_downloader_lock = threading.Lock()
+
+
+def get_downloader():
+    """
+    Build the process-wide downloader from the environment on first use
+    """
+    global _default_downloader
+    if _default_downloader is None:
+        with _default_downloader_lock:
+            if _default_downloader is None:
+                _default_downloader = SegmentedDownloader(
+                    directory=os.environ.get('DOWNLOAD_DIR', DOWNLOAD_DIR),
+                    connections=int(os.environ.get('DOWNLOAD_CONNECTIONS', 8)),
+                    segment_size=int(float(os.environ.get('DOWNLOAD_SEGMENT_MB', 8)) * 1024 * 1024),
+                    retries=int(os.environ.get('DOWNLOAD_RETRIES', 3)),
+                    retention=int(os.environ.get('DOWNLOAD_RETENTION', 3600)),
+                    max_bytes=int(float(os.environ.get('DOWNLOAD_MAX_GB', 10)) * 1024 ** 3),
+                    max_files=int(os.environ.get('DOWNLOAD_MAX_FILES', 50))
+                )
+    return _default_downloader
@@ -0,0 +1,157 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from metrics import PHASE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36'
+
+
+def _content_length(response):
+    """
+    Total size from a HEAD/GET response: the `/total` of Content-Range for
+    a ranged reply, else Content-Length
+    """
+    content_range = response.headers.get('Content-Range', '')
+    if response.status_code == 206 and '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        return int(total) if total.isdigit() else None
+    if response.status_code == 200:
+        length = response.headers.get('Content-Length', '')
+        return int(length) if length.isdigit() and int(length) > 0 else None
+    return None
+
+
+class ProbeStats:
+    """
+    Thread-safe probe counters
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.probed = 0
+        self.filled = 0
+        self.failed = 0
+        self.timed_out = 0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'probed': self.probed,
+                'filled': self.filled,
+                'failed': self.failed,
+                'timed_out': self.timed_out
+            }
+
+
+class SizeProber:
+    """
+    Fills in missing sizes of the first `top` formats of a result by asking
+    the CDN: a HEAD request, or a `Range: bytes=0-0` GET when HEAD gives no
+    length. Probes run concurrently over one keep-alive connection pool, and
+    a whole result gets at most `budget` seconds; sizes that are not known
+    by then stay unknown.
+    """
+    def __init__(self, top=8, budget=1.5, workers=16):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.top = top
+        self.budget = budget
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'User-Agent': USER_AGENT, 'Accept-Encoding': 'identity'})
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='size-probe')
+        self.stats = ProbeStats()
+
+    def probe(self, url, timeout):
+        """
+        Return the size of the file at `url`, or None
+        """
+        try:
+            with self.session.head(url, allow_redirects=True, timeout=timeout) as response:
+                size = _content_length(response)
+            if size is None:
+                with self.session.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=timeout) as response:
+                    size = _content_length(response)
+        except Exception as e:
+            logger.debug(f"Size probe failed for {url[:80]}: {str(e)}")
+            size = None
+        if size is None:
+            self.stats.incr('failed')
+        return size
+
+    def fill(self, formats):
+        """
+        Probe the formats among the first `top` that have no size and set
+        the sizes found within the budget. Returns the number filled
+        """
+        missing = [fmt for fmt in formats[:self.top] if not fmt.filesize]
+        if not missing:
+            return 0
+        deadline = time.monotonic() + self.budget
+        futures = {self._executor.submit(self.probe, fmt.url, self.budget): fmt for fmt in missing}
+        self.stats.incr('probed', len(futures))
+        done, not_done = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+        for future in not_done:
+            future.cancel()
+        if not_done:
+            self.stats.incr('timed_out', len(not_done))
+        filled = 0
+        for future in done:
+            size = future.result()
+            if size:
+                futures[future].filesize = size
+                filled += 1
+        self.stats.incr('filled', filled)
+        return filled
+
+    def info(self):
+        data = self.stats.snapshot()
+        data.update({'top': self.top, 'budget': self.budget})
+        return data
+
+
+_default_prober = None
+_default_prober_lock = threading.Lock()
+
+
+def get_size_prober():
+    """
+    Build the process-wide prober from the environment on first use.
+    Returns None unless FILESIZE_PROBE_TOP is above 0
+    """
+    global _default_prober
+    if _default_prober is None:
+        with _default_prober_lock:
+            if _default_prober is None:
+                top = int(os.environ.get('FILESIZE_PROBE_TOP', 0))
+                if top <= 0:
+                    _default_prober = False
+                else:
+                    _default_prober = SizeProber(
+                        top=top,
+                        budget=float(os.environ.get('FILESIZE_PROBE_BUDGET', 1.5)),
+                        workers=int(os.environ.get('FILESIZE_PROBE_WORKERS', 16))
+                    )
+    return _default_prober or None
+
+
+def enrich_sizes(formats):
+    """
+    Probe missing format sizes when probing is enabled. Runs before the
+    result is cached, so the sizes are cached with it
+    """
+    prober = get_size_prober()
+    if prober is None or not formats:
+        return 0
+    with PHASE_SECONDS.time(phase='size_probe'):
+        return prober.fill(formats)
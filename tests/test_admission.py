@@ -0,0 +1,55 @@
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from admission import FairQueue
+
+
+def queue_behind(queue, clients):
+    """
+    Start one waiting acquire per client, in order, and return the order
+    in which they are granted as the holders release
+    """
+    granted, lock = [], threading.Lock()
+
+    def acquire(client):
+        queue.acquire(client)
+        with lock:
+            granted.append(client)
+
+    threads = []
+    for client in clients:
+        before = queue.queued
+        thread = threading.Thread(target=acquire, args=(client,))
+        thread.start()
+        while queue.queued == before:
+            time.sleep(0.001)
+        threads.append(thread)
+    for count in range(len(clients)):
+        queue.release()
+        while len(granted) == count:
+            time.sleep(0.001)
+    for thread in threads:
+        thread.join()
+    return granted
+
+
+def test_uncontended_requests_leave_no_history():
+    queue = FairQueue(max_in_flight=1, max_queue=64, client_queue=8)
+    for _ in range(50):
+        queue.acquire('light')
+        queue.release()
+
+    queue.acquire('flood')
+    order = queue_behind(queue, ['flood'] * 4 + ['light'])
+    assert order.index('light') <= 1
+
+
+def test_queued_requests_served_round_robin():
+    queue = FairQueue(max_in_flight=1, max_queue=64, client_queue=8)
+    queue.acquire('holder')
+    order = queue_behind(queue, ['a', 'a', 'a', 'b', 'b', 'c'])
+    assert order[:3] == ['a', 'b', 'c']
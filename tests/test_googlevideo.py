@@ -0,0 +1,64 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+import pytest
+from bench_googlevideo import NOT_DIRECT, check_fixtures, check_table
+from googlevideo import is_direct_url, decode_direct_url, decode_format
+from result_model import NA
+
+HOST = 'https://rr1---sn-a.googlevideo.com/videoplayback'
+
+
+def test_is_direct_url():
+    assert is_direct_url(f"{HOST}?itag=22")
+    for url in NOT_DIRECT:
+        assert not is_direct_url(url)
+
+
+def test_progressive_itag():
+    fmt, duration = decode_format(f"{HOST}?expire=1792282246&itag=22&mime=video%2Fmp4&clen=10000000&dur=120.5")
+    assert (fmt.ext, fmt.width, fmt.height, fmt.fps) == ('mp4', 1280, 720, 30)
+    assert (fmt.vcodec, fmt.acodec) == ('avc1.64001F', 'mp4a.40.2')
+    assert fmt.filesize == 10000000
+    assert duration == 120.5
+    assert fmt.tbr == round(10000000 * 8 / 120.5 / 1000, 3)
+
+
+def test_audio_itag():
+    fmt, _ = decode_format(f"{HOST}?itag=140&mime=audio%2Fmp4&clen=3000000&dur=180")
+    assert (fmt.ext, fmt.vcodec, fmt.acodec, fmt.height) == ('m4a', 'none', 'mp4a.40.2', NA)
+
+
+@pytest.mark.parametrize('mime, ext, vcodec', [
+    ('audio%2Fwebm', 'webm', 'none'),
+    ('audio%2Fmp4', 'm4a', 'none'),
+    ('video%2Fmp4', 'mp4', 'unknown'),
+])
+def test_unknown_itag_uses_mime(mime, ext, vcodec):
+    fmt, duration = decode_format(f"{HOST}?itag=9999&mime={mime}")
+    assert (fmt.ext, fmt.vcodec, fmt.height, fmt.filesize, fmt.tbr) == (ext, vcodec, NA, 0, 0)
+    assert duration is None
+
+
+def test_decode_direct_url():
+    url = f"{HOST}?expire=1792282246&itag=18&mime=video%2Fmp4&clen=5000000&dur=59.6&sig=AJfQdSswRQIh"
+    result = decode_direct_url(url)
+    assert result['platform'] == 'googlevideo'
+    assert result['duration'] == 60
+    assert result['watch_url'] == url
+    assert [fmt['quality'] for fmt in result['formats']] == ['360p']
+    assert result['download_url'] == result['formats'][0]['url']
+
+
+def test_fixture_formats_decode_to_their_fields():
+    urls, mismatches = check_fixtures(5)
+    assert urls
+    assert mismatches == []
+
+
+def test_itag_table():
+    _, mismatches = check_table()
+    assert mismatches == []
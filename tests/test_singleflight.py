@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+os.environ['EXTRACTION_CACHE'] = 'memory'
+os.environ['EXTRACTION_REFRESH'] = 'off'
+
+import pytest
+import yt_dlp
+from fixtures import load_info, FakeYoutubeDL
+from singleflight import SingleFlight
+
+CALLERS = 16
+
+
+def concurrent_calls(func, *args):
+    """
+    Call `func(*args)` from CALLERS threads released together. Returns the
+    results, or the exceptions raised instead
+    """
+    barrier = threading.Barrier(CALLERS)
+    results = [None] * CALLERS
+
+    def call(index):
+        barrier.wait()
+        try:
+            results[index] = func(*args)
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(CALLERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_calls_run_once():
+    calls = []
+
+    def slow(value):
+        calls.append(value)
+        time.sleep(0.2)
+        return {'value': value}
+
+    group = SingleFlight()
+    results = concurrent_calls(group.do, 'key', slow, 42)
+    assert calls == [42]
+    assert all(result == {'value': 42} for result, _ in results)
+    assert sorted(shared for _, shared in results) == [False] + [True] * (CALLERS - 1)
+    assert group.in_flight() == 0
+
+
+def test_error_reaches_every_caller():
+    def failing():
+        time.sleep(0.2)
+        raise ValueError('boom')
+
+    results = concurrent_calls(SingleFlight().do, 'key', failing)
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+@pytest.fixture
+def fake_youtubedl(monkeypatch):
+    FakeYoutubeDL.configure(load_info('youtube'), latency=0.3)
+    FakeYoutubeDL.calls = 0
+    monkeypatch.setattr(yt_dlp, 'YoutubeDL', FakeYoutubeDL)
+    return FakeYoutubeDL
+
+
+@pytest.mark.parametrize('module, function, video_id', [
+    ('app', 'extract_video_info', 'coalesce001'),
+    ('video_cdn_extractor', 'extract_cdn_info', 'coalesce002'),
+])
+def test_concurrent_extractions_coalesce(fake_youtubedl, module, function, video_id):
+    extract = getattr(__import__(module), function)
+    results = concurrent_calls(extract, f'https://www.youtube.com/watch?v={video_id}')
+    assert fake_youtubedl.calls == 1
+    assert 'error' not in results[0]
+    assert all(dict(result) == dict(results[0]) for result in results)
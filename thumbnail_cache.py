@@ -0,0 +1,353 @@
+"""
+Server-side thumbnail cache.
+
+Each video's thumbnail is fetched from the platform once, turned into a
+few resized JPEG/WebP variants, and kept on disk in a bounded LRU so that
+result pages and batch lists load small local images instead of the
+full-size original from the platform CDN.
+"""
+import io
+import os
+import hashlib
+import time
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from singleflight import SingleFlight, interprocess_lock
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36'
+
+CACHE_DIR = os.path.join(tempfile.gettempdir(), "video_extractor_thumbs")
+
+# Variant name -> maximum width in pixels. 'original' is the image as the
+# platform served it
+SIZES = {'small': 160, 'medium': 320, 'large': 640}
+ORIGINAL = 'original'
+FORMATS = ('jpeg', 'webp')
+QUALITY = 80
+
+# Temporary files older than this at startup are leftovers of a crash
+STALE_TEMP_SECONDS = 300
+
+# Upstream images larger than this are refused
+MAX_SOURCE_BYTES = 5 * 1024 * 1024
+
+CONTENT_TYPES = {'jpeg': 'image/jpeg', 'webp': 'image/webp', 'png': 'image/png', 'gif': 'image/gif'}
+
+
+class ThumbnailError(Exception):
+    """
+    Raised when a thumbnail cannot be fetched from the platform
+    """
+
+
+class ThumbnailNotFound(ThumbnailError):
+    """
+    Raised when the video has no known thumbnail
+    """
+
+
+def _image_type(data):
+    """
+    Image format from the file's magic bytes
+    """
+    if data[:3] == b'\xff\xd8\xff':
+        return 'jpeg'
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'png'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    if data[:4] == b'GIF8':
+        return 'gif'
+    return None
+
+
+def etag_for(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def make_variants(data):
+    """
+    Resized JPEG and WebP versions of an image, keyed `<size>.<format>`.
+    Empty when Pillow is not installed; the original is served instead
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return {}
+
+    variants = {}
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        for size, width in SIZES.items():
+            resized = image.copy()
+            # Keeps the aspect ratio and never upscales
+            resized.thumbnail((width, width * 4), Image.LANCZOS)
+            for fmt in FORMATS:
+                out = io.BytesIO()
+                resized.save(out, fmt.upper(), quality=QUALITY)
+                variants[f"{size}.{fmt}"] = out.getvalue()
+    return variants
+
+
+class ThumbStats:
+    """
+    Thread-safe thumbnail cache counters
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.evictions = 0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'fetches': self.fetches,
+                'coalesced': self.coalesced,
+                'errors': self.errors,
+                'evictions': self.evictions
+            }
+
+
+class ThumbnailCache:
+    """
+    Thumbnails on disk under `directory`, at most `max_bytes` in total.
+    A video's original and variants are kept and evicted together, least
+    recently served video first. A miss fetches the original once, with
+    concurrent misses for the same video coalesced (across worker
+    processes too, through a file lock), and writes every variant at once.
+    """
+    def __init__(self, directory=CACHE_DIR, max_bytes=256 * 1024 * 1024, timeout=(5, 15)):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'User-Agent': USER_AGENT, 'Accept': 'image/*'})
+        self.stats = ThumbStats()
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        # video digest -> bytes on disk, least recently served first
+        self._videos = OrderedDict()
+        self._bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """
+        Index the videos already on disk, least recently written first
+        """
+        found = {}
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if name.startswith('.'):
+                    # Left behind by an interrupted write, unless another
+                    # worker is writing it right now
+                    if time.time() - stat.st_mtime > STALE_TEMP_SECONDS:
+                        os.remove(path)
+                    continue
+                digest = name.split('.', 1)[0]
+                mtime, size = found.get(digest, (0, 0))
+                found[digest] = (max(mtime, stat.st_mtime), size + stat.st_size)
+        for digest, (_, size) in sorted(found.items(), key=lambda item: item[1][0]):
+            self._videos[digest] = size
+            self._bytes += size
+        self._evict()
+
+    @staticmethod
+    def _digest(video_id):
+        return hashlib.sha1(video_id.encode('utf-8')).hexdigest()
+
+    def _path(self, digest, variant):
+        return os.path.join(self.directory, digest[:2], f"{digest}.{variant}")
+
+    def _variants(self):
+        return [ORIGINAL] + [f"{size}.{fmt}" for size in SIZES for fmt in FORMATS]
+
+    def _account(self, digest, size):
+        """
+        Mark a video as just served; with `size`, set its size on disk
+        """
+        if size is None:
+            with self._lock:
+                if digest in self._videos:
+                    self._videos.move_to_end(digest)
+                    return
+            # Written by another worker process
+            paths = [self._path(digest, variant) for variant in self._variants()]
+            size = sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+        with self._lock:
+            old = self._videos.pop(digest, None)
+            self._videos[digest] = size
+            self._bytes += size - (old or 0)
+        self._evict()
+
+    def _evict(self):
+        while True:
+            with self._lock:
+                if self._bytes <= self.max_bytes or not self._videos:
+                    return
+                digest, size = self._videos.popitem(last=False)
+                self._bytes -= size
+            self._remove(digest)
+            self.stats.incr('evictions')
+
+    def _remove(self, digest):
+        # The original goes first, so a half-removed video reads as a miss
+        for variant in self._variants():
+            try:
+                os.remove(self._path(digest, variant))
+            except FileNotFoundError:
+                pass
+
+    def _read(self, digest, variant):
+        try:
+            with open(self._path(digest, variant), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, digest, variant, data):
+        path = self._path(digest, variant)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    def _download(self, url):
+        import requests
+
+        try:
+            with self.session.get(url, stream=True, timeout=self.timeout) as response:
+                if response.status_code != 200:
+                    raise ThumbnailError(f"HTTP {response.status_code} for {url}")
+                data = response.raw.read(MAX_SOURCE_BYTES + 1, decode_content=True)
+        except requests.RequestException as e:
+            raise ThumbnailError(str(e))
+        if len(data) > MAX_SOURCE_BYTES or _image_type(data) is None:
+            raise ThumbnailError(f"Not a usable image: {url}")
+        return data
+
+    def _fill(self, digest, source):
+        """
+        Fetch the original and write it with its variants. Returns every
+        variant by name, or None when another process already wrote them
+        """
+        with interprocess_lock(f"thumb:{digest}"):
+            if os.path.exists(self._path(digest, ORIGINAL)):
+                return None
+            url = source()
+            if not url:
+                raise ThumbnailNotFound(digest)
+            self.stats.incr('fetches')
+            original = self._download(url)
+            try:
+                variants = make_variants(original)
+            except Exception as e:
+                logger.warning(f"Could not resize thumbnail {url}: {str(e)}")
+                variants = {}
+            for variant, data in variants.items():
+                self._write(digest, variant, data)
+            # Written last: its presence means the variants are there too
+            self._write(digest, ORIGINAL, original)
+        variants[ORIGINAL] = original
+        self._account(digest, sum(len(data) for data in variants.values()))
+        return variants
+
+    def get(self, video_id, size, fmt, source):
+        """
+        The thumbnail of `video_id` in size `size` and format `fmt`, as
+        `(data, content_type, etag)`. `source()` gives the platform URL of
+        the thumbnail and is only called on a miss. Falls back to the
+        original when there is no such variant (no Pillow, or an image
+        Pillow could not read)
+        """
+        digest = self._digest(video_id)
+        wanted = [ORIGINAL] if size == ORIGINAL else [f"{size}.{fmt}", ORIGINAL]
+        if os.path.exists(self._path(digest, ORIGINAL)):
+            for variant in wanted:
+                data = self._read(digest, variant)
+                if data is not None:
+                    self.stats.incr('hits')
+                    self._account(digest, None)
+                    return self._image(data)
+
+        self.stats.incr('misses')
+        try:
+            variants, shared = self._flight.do(digest, self._fill, digest, source)
+        except ThumbnailError as e:
+            if not isinstance(e, ThumbnailNotFound):
+                self.stats.incr('errors')
+            raise
+        if shared:
+            self.stats.incr('coalesced')
+        if variants is None:
+            variants = {variant: self._read(digest, variant) for variant in wanted}
+            self._account(digest, None)
+        for variant in wanted:
+            if variants.get(variant) is not None:
+                return self._image(variants[variant])
+        raise ThumbnailNotFound(video_id)
+
+    @staticmethod
+    def _image(data):
+        return data, CONTENT_TYPES.get(_image_type(data), 'application/octet-stream'), etag_for(data)
+
+    def info(self):
+        data = self.stats.snapshot()
+        with self._lock:
+            data.update({'videos': len(self._videos), 'bytes': self._bytes, 'max_bytes': self.max_bytes})
+        return data
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_thumbnail_cache():
+    """
+    Build the process-wide thumbnail cache from the environment on first
+    use. Returns None when disabled with THUMB_CACHE=off
+    """
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                if os.environ.get('THUMB_CACHE', 'on').lower() in ('off', 'none', '0'):
+                    _default_cache = False
+                else:
+                    _default_cache = ThumbnailCache(
+                        directory=os.environ.get('THUMB_CACHE_DIR', CACHE_DIR),
+                        max_bytes=int(float(os.environ.get('THUMB_CACHE_MAX_MB', 256)) * 1024 * 1024)
+                    )
+    return _default_cache or None
@@ -1,16 +1,74 @@
-import yt_dlp
 from urllib.parse import urlparse
 import sys
+import os
+import time
 import random
 import logging
-import browser_cookie3
-import tempfile
-import os
+import threading
+from extraction_cache import cached_extraction, canonical_key
+from fallback import FallbackEngine, ConnectionStrategy, AttemptFailed, socket_timeout, EXTRACTOR_RETRIES
+from ydl_pool import get_ydl_pool
+from cookie_provider import get_cookie_provider
+from metrics import PHASE_SECONDS, ERRORS
+from format_pipeline import process_formats, build_video_data, known_filesize
+from size_probe import enrich_sizes
+from result_model import dumps
+from extraction_backend import get_extraction_backend, BackendError
+from extractor_guard import Throttled, is_throttle_error
+from googlevideo import is_direct_url, decode_direct_url
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Spoofed client addresses for X-Forwarded-For. They are picked once per
+# process: the pool keys YoutubeDL instances by their headers, so fresh
+# addresses on every request would mean a fresh instance every attempt.
+SPOOFED_IPS = [
+    f"{random.randint(1, 255)}.{random.randint(1, 255)}.{random.randint(1, 255)}.{random.randint(1, 255)}"
+    for _ in range(5)
+]
+
+# Updated list of user agents
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36 Edg/121.0.0.0',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:122.0) Gecko/20100101 Firefox/122.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2.1 Safari/605.1.15',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_2_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Mobile/15E148 Safari/604.1'
+]
+
+# Add proxy support with more options
+PROXIES = [
+    None,  # Try without proxy first
+    'socks5://127.0.0.1:9050',  # Tor proxy if available
+    'http://127.0.0.1:8080',    # Local proxy if available
+    'https://127.0.0.1:8080'    # HTTPS proxy if available
+]
+
+_fallback_engine = None
+_fallback_engine_lock = threading.Lock()
+
+def get_fallback_engine():
+    """
+    Build the process-wide strategy engine on first use: every proxy, user
+    agent and spoofed IP combination, in that order of precedence
+    """
+    global _fallback_engine
+    if _fallback_engine is None:
+        with _fallback_engine_lock:
+            if _fallback_engine is None:
+                strategies = [
+                    ConnectionStrategy(proxy, user_agent, ip)
+                    for proxy in PROXIES
+                    for user_agent in USER_AGENTS
+                    for ip in SPOOFED_IPS
+                ]
+                _fallback_engine = FallbackEngine(
+                    strategies, deadline=float(os.environ.get('EXTRACTION_DEADLINE', 90))
+                )
+    return _fallback_engine
+
 def is_valid_url(url):
     try:
         result = urlparse(url)
@@ -20,104 +78,51 @@ def is_valid_url(url):
 
 def get_browser_cookies():
     """
-    Get cookies from installed browsers with better error handling and logging
+    Get YouTube/Google cookies from installed browsers. They are read once
+    and cached in memory by the cookie provider.
     """
-    cookies = []
-    browsers = [
-        (browser_cookie3.chrome, "Chrome"),
-        (browser_cookie3.firefox, "Firefox"),
-        (browser_cookie3.edge, "Edge")
-    ]
-    
-    for browser_func, browser_name in browsers:
-        try:
-            # Get YouTube cookies
-            browser_cookies = browser_func(domain_name=".youtube.com")
-            if browser_cookies:
-                logger.info(f"Found {len(list(browser_cookies))} YouTube cookies in {browser_name}")
-                for cookie in browser_cookies:
-                    logger.info(f"Cookie: {cookie.name} from {cookie.domain}")
-                    cookies.append(cookie)
-
-            # Get googlevideo.com cookies
-            video_cookies = browser_func(domain_name=".googlevideo.com")
-            if video_cookies:
-                logger.info(f"Found {len(list(video_cookies))} googlevideo cookies in {browser_name}")
-                for cookie in video_cookies:
-                    logger.info(f"Cookie: {cookie.name} from {cookie.domain}")
-                    cookies.append(cookie)
-
-            # Get google.com cookies
-            google_cookies = browser_func(domain_name=".google.com")
-            if google_cookies:
-                logger.info(f"Found {len(list(google_cookies))} Google cookies in {browser_name}")
-                for cookie in google_cookies:
-                    logger.info(f"Cookie: {cookie.name} from {cookie.domain}")
-                    cookies.append(cookie)
-
-        except Exception as e:
-            logger.warning(f"Could not get cookies from {browser_name}: {str(e)}")
-            continue
-    
-    return cookies
+    return get_cookie_provider().cookies()
 
-def save_browser_cookies():
+def video_data_from_info(info, url):
     """
-    Save browser cookies to a temporary file with better formatting
+    Build the response dict from a yt-dlp info dict. Raises AttemptFailed
+    when it has no usable progressive format.
     """
-    cookies = get_browser_cookies()
-    if not cookies:
-        logger.warning("No browser cookies found")
-        return None
-        
-    cookie_file = os.path.join(tempfile.gettempdir(), "youtube_cookies.txt")
-    try:
-        with open(cookie_file, "w", encoding="utf-8") as f:
-            f.write("# Netscape HTTP Cookie File\n")
-            f.write("# https://curl.haxx.se/rfc/cookie_spec.html\n")
-            f.write("# This is a generated file!  Do not edit.\n\n")
-            
-            for cookie in cookies:
-                if cookie.domain in [".youtube.com", ".googlevideo.com", ".google.com"]:
-                    # Format: domain\tdom_spec\tpath\tsecure\texpiry\tname\tvalue
-                    f.write(f"{cookie.domain}\t"  # domain
-                           f"{'TRUE' if cookie.domain.startswith('.') else 'FALSE'}\t"  # include subdomains
-                           f"{cookie.path}\t"  # path
-                           f"{'TRUE' if cookie.secure else 'FALSE'}\t"  # secure
-                           f"{int(cookie.expires) if cookie.expires else 0}\t"  # expiry
-                           f"{cookie.name}\t"  # name
-                           f"{cookie.value}\n")  # value
-                           
-        logger.info(f"Saved {len(cookies)} cookies to {cookie_file}")
-        return cookie_file
-    except Exception as e:
-        logger.error(f"Error saving cookies: {str(e)}")
-        return None
+    if 'formats' not in info:
+        raise AttemptFailed("No formats found in extracted info")
+
+    with PHASE_SECONDS.time(phase='format_pipeline'):
+        formats = process_formats(info['formats'], size_fallback=known_filesize)
+
+    if not formats:
+        raise AttemptFailed("No suitable formats found")
+    enrich_sizes(formats)
+    return build_video_data(info, url, formats)
 
 def extract_cdn_info(url):
     """
     Extract CDN information from videos on a webpage
     Returns a dictionary containing the CDN URL and other info
     """
+    # A direct googlevideo URL describes itself: no cache, no extraction
+    if is_direct_url(url):
+        return decode_direct_url(url)
+    return _cached_cdn_info(url)
+
+@cached_extraction('cdn')
+def _cached_cdn_info(url):
+    try:
+        return get_extraction_backend().run(_extract_cdn_info, url)
+    except BackendError as e:
+        logger.error(f"Extraction backend failed for {url}: {str(e)}")
+        ERRORS.inc(error='backend')
+        return {"error": "تعذر استخراج معلومات الفيديو. يرجى المحاولة مرة أخرى لاحقاً"}
+
+def _extract_cdn_info(url):
     if not is_valid_url(url):
         logger.error(f"Invalid URL format: {url}")
         return {"error": "رابط غير صالح"}
 
-    # Try to get browser cookies first
-    cookie_file = save_browser_cookies()
-    if cookie_file:
-        logger.info(f"Using browser cookies from {cookie_file}")
-        # Verify cookie file contents
-        try:
-            with open(cookie_file, 'r', encoding='utf-8') as f:
-                cookie_content = f.read()
-                logger.info(f"Cookie file contents: {cookie_content[:500]}...")  # Log first 500 chars
-        except Exception as e:
-            logger.error(f"Error reading cookie file: {str(e)}")
-    else:
-        logger.warning("Using default cookies")
-        cookie_file = 'cookies.txt'
-
     # Updated headers with more modern values
     base_headers = {
         'Accept': '*/*',
@@ -136,52 +141,23 @@ def extract_cdn_info(url):
         'Connection': 'keep-alive'
     }
 
-    # Check if it's a direct googlevideo.com URL
-    if 'googlevideo.com' in url:
-        try:
-            # Create a video data structure for direct URLs
-            video_data = {
-                'title': 'Direct Video',
-                'thumbnail': '',
-                'description': '',
-                'duration': 0,
-                'view_count': 0,
-                'platform': 'googlevideo',
-                'watch_url': url,
-                'formats': [{
-                    'quality': 'direct',
-                    'format': 'mp4',
-                    'resolution': 'original',
-                    'filesize': 0,
-                    'url': url,
-                    'vcodec': 'unknown',
-                    'acodec': 'unknown',
-                    'fps': 'N/A',
-                    'tbr': 0
-                }],
-                'download_url': url
-            }
-            return video_data
-        except Exception as e:
-            logger.error(f"Error processing direct URL: {str(e)}")
-            return {"error": "تعذر معالجة الرابط المباشر"}
-
     ydl_opts = {
         'quiet': True,
         'no_warnings': True,
-        'ignoreerrors': True,
+        # Errors must surface so the fallback engine can classify them
+        'ignoreerrors': False,
         'extract_flat': False,
         'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
         'no_check_certificates': True,
         'prefer_insecure': True,
-        'cookiefile': cookie_file,
         'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
         'referer': 'https://www.youtube.com/',
         'http_headers': base_headers,
-        'socket_timeout': 30,
-        'retries': 15,
+        # socket_timeout is set per attempt from the time left before the
+        # deadline; retries stay low since failed attempts fall back anyway
+        'retries': 2,
+        'extractor_retries': EXTRACTOR_RETRIES,
         'fragment_retries': 10,
-        'retry_sleep': lambda n: 5 * (n + 1),
         'age_limit': None,
         'prefer_ffmpeg': True,
         'hls_prefer_native': False,
@@ -197,226 +173,206 @@ def extract_cdn_info(url):
         }
     }
 
-    # Add random IP addresses for X-Forwarded-For
-    ip_addresses = [
-        f"{random.randint(1, 255)}.{random.randint(1, 255)}.{random.randint(1, 255)}.{random.randint(1, 255)}"
-        for _ in range(5)
-    ]
-
-    # Updated list of user agents
-    user_agents = [
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36 Edg/121.0.0.0',
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:122.0) Gecko/20100101 Firefox/122.0',
-        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2.1 Safari/605.1.15',
-        'Mozilla/5.0 (iPhone; CPU iPhone OS 17_2_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Mobile/15E148 Safari/604.1'
-    ]
-    
-    # Add proxy support with more options
-    proxies = [
-        None,  # Try without proxy first
-        'socks5://127.0.0.1:9050',  # Tor proxy if available
-        'http://127.0.0.1:8080',    # Local proxy if available
-        'https://127.0.0.1:8080'    # HTTPS proxy if available
-    ]
-
-    for proxy in proxies:
-        if proxy:
-            ydl_opts['proxy'] = proxy
-            
-        for user_agent in user_agents:
-            for ip in ip_addresses:
-                try:
-                    ydl_opts['user_agent'] = user_agent
-                    ydl_opts['http_headers'].update({
-                        'User-Agent': user_agent,
-                        'X-Forwarded-For': ip,
-                        'Client-IP': ip
-                    })
-                    
-                    logger.info(f"Attempting to extract info for URL: {url}")
-                    logger.info(f"Using User-Agent: {user_agent}")
-                    logger.info(f"Using IP: {ip}")
-                    
-                    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                        try:
-                            info = ydl.extract_info(url, download=False)
-                            
-                            if not info:
-                                logger.error("No information extracted")
-                                continue
-                            
-                            # Get direct video URLs
-                            if 'formats' in info:
-                                formats = []
-                                for f in info['formats']:
-                                    if not f.get('url'):
-                                        continue
-                                    
-                                    # Skip HLS and DASH formats
-                                    if f.get('protocol', '').lower() in ['m3u8', 'm3u8_native', 'dash', 'dash_manifest']:
-                                        continue
-                                        
-                                    # Skip audio-only formats
-                                    if any(x in str(f.get('format_note', '')).lower() for x in ['audio only', 'images', 'thumbnail']):
-                                        continue
-                                        
-                                    # Add format to list
-                                    formats.append(f)
-                                
-                                if not formats:
-                                    logger.error("No suitable formats found")
-                                    continue
-                                
-                                # Sort formats by quality
-                                formats.sort(key=lambda x: (
-                                    float(x.get('tbr', 0) or 0),
-                                    x.get('height', 0) or 0,
-                                    x.get('width', 0) or 0,
-                                    x.get('fps', 0) or 0,
-                                    x.get('ext', '') == 'mp4'
-                                ), reverse=True)
-                                
-                                video_data = {
-                                    'title': info.get('title', 'Unknown'),
-                                    'thumbnail': info.get('thumbnail', ''),
-                                    'description': info.get('description', ''),
-                                    'duration': info.get('duration', 0),
-                                    'view_count': info.get('view_count', 0),
-                                    'platform': info.get('extractor', 'Unknown'),
-                                    'watch_url': info.get('webpage_url', url),
-                                    'formats': [],
-                                    'uploader': info.get('uploader', 'Unknown'),
-                                    'upload_date': info.get('upload_date', ''),
-                                    'like_count': info.get('like_count', 0),
-                                    'channel_url': info.get('channel_url', ''),
-                                    'channel_follower_count': info.get('channel_follower_count', 0)
-                                }
-                                
-                                # Process each format
-                                for fmt in formats:
-                                    try:
-                                        video_url = fmt['url']
-                                        if '?' in video_url:
-                                            base_url = video_url.split('?')[0]
-                                            params = [
-                                                param for param in video_url.split('?')[1].split('&')
-                                                if not param.startswith(('range=', 'rn=', 'rbuf=', 'mime='))
-                                            ]
-                                            video_url = f"{base_url}?{'&'.join(params)}" if params else base_url
-                                        
-                                        format_info = {
-                                            'quality': f"{fmt.get('height', 0)}p" if fmt.get('height') else 'auto',
-                                            'format': fmt.get('ext', 'mp4'),
-                                            'resolution': f"{fmt.get('width', 'N/A')}x{fmt.get('height', 'N/A')}",
-                                            'filesize': fmt.get('filesize', 0),
-                                            'url': video_url,
-                                            'vcodec': fmt.get('vcodec', 'unknown'),
-                                            'acodec': fmt.get('acodec', 'unknown'),
-                                            'fps': fmt.get('fps', 'N/A'),
-                                            'tbr': fmt.get('tbr', 0)
-                                        }
-                                        video_data['formats'].append(format_info)
-                                    except Exception as e:
-                                        logger.warning(f"Error processing format: {e}")
-                                        continue
-                                
-                                if video_data['formats']:
-                                    default_format = video_data['formats'][0]
-                                    video_data.update({
-                                        'quality': default_format['quality'],
-                                        'resolution': default_format['resolution'],
-                                        'format': default_format['format'],
-                                        'download_url': default_format['url']
-                                    })
-                                    logger.info("Successfully extracted video information")
-                                    
-                                    # Clean up temporary cookie file
-                                    if cookie_file != 'cookies.txt':
-                                        try:
-                                            os.remove(cookie_file)
-                                        except:
-                                            pass
-                                        
-                                    return video_data
-                                
-                                logger.error("No valid formats found after processing")
-                                continue
-                            
-                            logger.error("No formats found in extracted info")
-                            continue
-                            
-                        except yt_dlp.utils.DownloadError as e:
-                            error_message = str(e)
-                            if "Sign in to confirm you're not a bot" in error_message:
-                                logger.warning(f"Bot detection encountered with User-Agent: {user_agent}")
-                                continue
-                            elif "HTTP Error 403" in error_message:
-                                logger.warning(f"Access denied (403) with User-Agent: {user_agent}")
-                                continue
-                            logger.error(f"yt-dlp download error: {error_message}")
-                            continue
-                        except Exception as e:
-                            logger.error(f"Error during info extraction: {str(e)}")
-                            continue
-                            
-                except Exception as e:
-                    logger.error(f"Unexpected error with User-Agent {user_agent}: {str(e)}")
-                    continue
-            
-    # Clean up temporary cookie file
-    if cookie_file != 'cookies.txt':
-        try:
-            os.remove(cookie_file)
-        except:
-            pass
-    
-    return {"error": "تعذر استخراج معلومات الفيديو. يرجى المحاولة مرة أخرى لاحقاً"}
-
-def print_highest_quality(info):
+    def attempt(strategy, remaining):
+        opts = strategy.apply(ydl_opts)
+        opts['socket_timeout'] = socket_timeout(remaining)
+        with get_ydl_pool().session(opts) as ydl:
+            with PHASE_SECONDS.time(phase='cookie_load'):
+                get_cookie_provider().install(ydl)
+            with PHASE_SECONDS.time(phase='extract_info'):
+                info = ydl.extract_info(url, download=False)
+        if not info:
+            raise AttemptFailed("No information extracted")
+        return video_data_from_info(info, url)
+
+    extractor = canonical_key(url).split(':', 1)[0]
+    outcome = get_fallback_engine().run(extractor, attempt)
+    timings = ', '.join(f"{r.elapsed:.2f}s {r.outcome}" for r in outcome.attempts)
+    logger.info(f"{len(outcome.attempts)} attempt(s) for {url} ({outcome.reason}): {timings}")
+
+    if outcome.ok:
+        logger.info("Successfully extracted video information")
+        return outcome.value
+    ERRORS.inc(error=f"fallback_{outcome.reason}")
+    error = {"error": "تعذر استخراج معلومات الفيديو. يرجى المحاولة مرة أخرى لاحقاً"}
+    throttled = [r.error for r in outcome.attempts if r.error and is_throttle_error(r.error)]
+    if outcome.reason != 'permanent' and throttled:
+        raise Throttled(throttled[-1], error)
+    return error
+
+def print_highest_quality(result):
     """
-    Print highest quality format information
+    Print the default (highest quality) format of an extraction result
     """
-    if 'formats' in info:
-        # Filter and sort video formats
-        formats = sorted(
-            [f for f in info['formats'] if 
-             f.get('url') is not None and
-             not any(x in str(f.get('format_note', '')).lower() for x in ['audio', 'images', 'thumbnail'])
-            ],
-            key=lambda x: (
-                float(x.get('tbr', 0) or 0),  # Bitrate
-                x.get('height', 0) or 0,      # Height
-                x.get('width', 0) or 0,       # Width
-                x.get('fps', 0) or 0          # FPS
-            ),
-            reverse=True
-        )
-        
-        if formats:
-            best_format = formats[0]
-            print(f"Title: {info.get('title', 'Unknown')}")
-            print(f"Platform: {info.get('extractor', 'Unknown')}")
-            print(f"Quality: {best_format.get('format_note', 'N/A')}")
-            print(f"Resolution: {best_format.get('resolution', 'N/A')}")
-            print(f"Bitrate: {best_format.get('tbr', 'N/A')} kbps")
-            print(f"FPS: {best_format.get('fps', 'N/A')}")
-            print(f"Format: {best_format.get('ext', 'N/A')}")
-            print(f"CDN URL: {best_format.get('url', 'N/A')}")
-            print("-" * 50)
-        else:
-            # Try alternative format extraction
-            if 'url' in info:
-                print(f"Title: {info.get('title', 'Unknown')}")
-                print(f"Platform: {info.get('extractor', 'Unknown')}")
-                print(f"Direct URL: {info['url']}")
-                print("-" * 50)
-            else:
-                print("No video formats found.")
+    if 'error' in result:
+        print(f"Error: {result['error']}")
+    elif result.get('formats'):
+        best_format = result['formats'][0]
+        print(f"Title: {result.get('title', 'Unknown')}")
+        print(f"Platform: {result.get('platform', 'Unknown')}")
+        print(f"Quality: {best_format.get('quality', 'N/A')}")
+        print(f"Resolution: {best_format.get('resolution', 'N/A')}")
+        print(f"Bitrate: {best_format.get('tbr', 'N/A')} kbps")
+        print(f"FPS: {best_format.get('fps', 'N/A')}")
+        print(f"Format: {best_format.get('format', 'N/A')}")
+        print(f"CDN URL: {best_format.get('url', 'N/A')}")
     else:
-        print("No CDN information found for this video.")
+        print("No video formats found.")
+    print("-" * 50)
+
+# Columns of --format csv; the format columns describe the default format
+CSV_FIELDS = ['line', 'url', 'status', 'title', 'platform', 'duration', 'quality', 'resolution', 'format',
+              'filesize', 'download_url', 'error']
+PROGRESS_INTERVAL = 5
+
+def read_urls(lines, skip, positions=None):
+    """
+    Yield the URLs of `lines` (one per line, blank lines and # comments
+    ignored), leaving out `skip` and repeats. Records the line number of
+    each URL yielded in `positions`
+    """
+    seen = set(skip)
+    for number, line in enumerate(lines, 1):
+        url = line.strip()
+        if not url or url.startswith('#') or url in seen:
+            continue
+        seen.add(url)
+        if positions is not None:
+            positions[url] = number
+        yield url
+
+def load_checkpoint(path, retry_errors=False):
+    """
+    Return the URLs a previous run already finished: every line of the
+    checkpoint is `ok<TAB>url` or `error<TAB>url`
+    """
+    done = set()
+    if not path or not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            status, _, url = line.rstrip('\n').partition('\t')
+            # A line cut short by an interrupted run has no URL and is redone
+            if url and (status == 'ok' or (status == 'error' and not retry_errors)):
+                done.add(url)
+    return done
+
+def load_output(path, fmt, retry_errors=False):
+    """
+    Return the URLs already in a previous run's output file. A run stopped
+    after writing a row but before its checkpoint line would otherwise
+    write that row again
+    """
+    done = set()
+    if path == '-' or not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8', newline='') as f:
+        if fmt == 'csv':
+            import csv
+            rows = ((row.get('url'), row.get('status')) for row in csv.DictReader(f))
+        else:
+            import json
+
+            def parse(lines):
+                for line in lines:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Cut short by the interruption
+                        continue
+                    yield entry.get('url'), 'error' if 'error' in (entry.get('result') or {}) else 'ok'
+            rows = parse(f)
+        for url, status in rows:
+            if url and (status == 'ok' or (status == 'error' and not retry_errors)):
+                done.add(url)
+    return done
+
+class ResultWriter:
+    """
+    Append results as NDJSON lines or CSV rows, flushed as they finish
+    """
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.fmt = fmt
+        self._csv = None
+        if fmt == 'csv':
+            import csv
+            self._csv = csv.DictWriter(stream, CSV_FIELDS, extrasaction='ignore')
+            if not stream.seekable() or stream.tell() == 0:
+                self._csv.writeheader()
+
+    def write(self, line, url, result):
+        if self._csv is None:
+            self.stream.write(dumps({'line': line, 'url': url, 'result': result}).decode('utf-8') + '\n')
+        else:
+            row = {'line': line, 'url': url, 'status': 'error' if 'error' in result else 'ok'}
+            row.update({key: result.get(key) for key in CSV_FIELDS if key in result})
+            if result.get('formats'):
+                row['filesize'] = result['formats'][0].get('filesize')
+            self._csv.writerow(row)
+        self.stream.flush()
 
-def main():
+def _duration(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+def run_batch_cli(args):
+    from batch import run_batch
+
+    done = load_checkpoint(args.checkpoint, args.retry_errors)
+    if args.checkpoint:
+        done |= load_output(args.output, args.format, args.retry_errors)
+    source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    total = None
+    if source is not sys.stdin:
+        total = sum(1 for _ in read_urls(source, done))
+        source.seek(0)
+    output = sys.stdout if args.output == '-' else open(args.output, 'a', encoding='utf-8', newline='')
+    writer = ResultWriter(output, args.format)
+    checkpoint = open(args.checkpoint, 'a', encoding='utf-8') if args.checkpoint else None
+    if done:
+        print(f"Resuming: {len(done)} URL(s) already done", file=sys.stderr)
+
+    started = last_report = time.monotonic()
+    counts = {'ok': 0, 'error': 0}
+    positions = {}
+
+    def report(final=False):
+        elapsed = time.monotonic() - started
+        finished = counts['ok'] + counts['error']
+        rate = finished / elapsed if elapsed else 0.0
+        line = f"{finished}{f'/{total}' if total is not None else ''} done, {counts['error']} error(s), {rate:.1f} URL/s"
+        if total is not None and rate and not final:
+            line += f", ETA {_duration((total - finished) / rate)}"
+        if final:
+            line += f" in {_duration(elapsed)}"
+        print(line, file=sys.stderr)
+
+    results = run_batch(read_urls(source, done, positions), extract_cdn_info, args.workers, args.per_domain)
+    try:
+        for _, url, result in results:
+            status = 'error' if 'error' in result else 'ok'
+            counts[status] += 1
+            writer.write(positions.pop(url), url, result)
+            if checkpoint is not None:
+                checkpoint.write(f"{status}\t{url}\n")
+                checkpoint.flush()
+            if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                last_report = time.monotonic()
+                report()
+    except KeyboardInterrupt:
+        print("Interrupted" + (": run the same command again to resume" if checkpoint else ""), file=sys.stderr)
+        return 130
+    finally:
+        # Stops the batch without waiting for the extractions still running
+        results.close()
+        report(final=True)
+        for stream in (source, output, checkpoint):
+            if stream is not None and stream not in (sys.stdin, sys.stdout):
+                stream.close()
+    return 0 if counts['ok'] or not counts['error'] else 1
+
+def interactive():
     print("Universal Video CDN Extractor")
     print("=" * 50)
     print("Supported Platforms:")
@@ -434,14 +390,45 @@ def main():
     print("- Channels")
     print("- User profiles")
     print("- Watch pages")
-    
+
     while True:
         url = input("\nEnter URL (or 'q' to quit): ")
-        
+
         if url.lower() == 'q':
             break
-            
-        extract_cdn_info(url)
+
+        print_highest_quality(extract_cdn_info(url))
+
+def main(argv=None):
+    import argparse
+    from batch import batch_settings
+
+    parser = argparse.ArgumentParser(
+        description="Extract CDN URLs interactively, or for a list of URLs (one per line) with -i",
+        epilog="Example: python video_cdn_extractor.py -i urls.txt -o results.ndjson --checkpoint urls.done"
+    )
+    parser.add_argument('-i', '--input', help="file of URLs, or - for stdin (default: interactive prompt)")
+    parser.add_argument('-o', '--output', default='-', help="results file, appended to (default: stdout)")
+    parser.add_argument('-f', '--format', choices=['ndjson', 'csv'], default='ndjson')
+    parser.add_argument('-w', '--workers', type=int, default=batch_settings()['workers'],
+                        help="concurrent extractions (default: BATCH_WORKERS)")
+    parser.add_argument('--per-domain', type=int,
+                        help="concurrent extractions per site (default: same as --workers)")
+    parser.add_argument('--checkpoint', help="record finished URLs here and skip them when run again")
+    parser.add_argument('--retry-errors', action='store_true', help="when resuming, redo URLs that failed")
+    parser.add_argument('-v', '--verbose', action='store_true', help="log every extraction")
+    args = parser.parse_args(argv)
+
+    if args.input is None:
+        if not sys.stdin.isatty():
+            args.input = '-'
+        else:
+            interactive()
+            return 0
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    args.per_domain = args.per_domain or args.workers
+    return run_batch_cli(args)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,229 @@
+import os
+import copy
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from metrics import PHASE_SECONDS, sampled
+
+logger = logging.getLogger(__name__)
+
+
+def _option_default(value):
+    # Callables (retry_sleep, hooks) are created per call, so key them by
+    # name rather than by identity
+    if callable(value):
+        return f"{getattr(value, '__module__', '')}.{getattr(value, '__qualname__', repr(value))}"
+    return repr(value)
+
+
+def options_key(ydl_opts):
+    """
+    Normalize an option dict into a stable key: key order, nested dicts and
+    freshly created callables do not change it
+    """
+    return json.dumps(ydl_opts, sort_keys=True, default=_option_default)
+
+
+class PoolStats:
+    """
+    Thread-safe checkout counters and construction timings
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.discarded = 0
+        self.construction_time = 0.0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def snapshot(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'discarded': self.discarded,
+                'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+                'construction_time_total': round(self.construction_time, 6),
+                'construction_time_avg': round(self.construction_time / self.misses, 6) if self.misses else 0.0
+            }
+
+
+class _Pooled:
+    def __init__(self, ydl, key):
+        self.ydl = ydl
+        self.key = key
+        self.created_at = time.time()
+        self.uses = 0
+
+
+class YoutubeDLPool:
+    """
+    Keeps warmed-up YoutubeDL objects between extractions, keyed by their
+    normalized options. A checked-out instance is used by one thread only.
+
+    At most `max_size` instances exist at once; when the limit is reached an
+    idle instance with other options is evicted, or the caller waits for one
+    to be checked in. Instances are retired after `max_uses` extractions,
+    after `max_age` seconds, or when an extraction fails unexpectedly.
+    """
+    def __init__(self, max_size=16, max_uses=200, max_age=1800, factory=None):
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self._factory = factory
+        self._idle = OrderedDict()  # id(pooled) -> pooled, least recently used first
+        self._live = 0
+        self._cond = threading.Condition()
+        self.stats = PoolStats()
+
+    def _construct(self, ydl_opts):
+        factory = self._factory
+        if factory is None:
+            import yt_dlp
+            factory = yt_dlp.YoutubeDL
+        start = time.perf_counter()
+        ydl = factory(copy.deepcopy(ydl_opts))
+        elapsed = time.perf_counter() - start
+        self.stats.incr('construction_time', elapsed)
+        if sampled():
+            PHASE_SECONDS.observe(elapsed, phase='ydl_construct')
+        return ydl
+
+    def _expired(self, pooled):
+        return pooled.uses >= self.max_uses or time.time() - pooled.created_at >= self.max_age
+
+    def _close(self, pooled):
+        try:
+            # YoutubeDL.close() writes its cookie jar back to the cookie
+            # file; retired instances must not rewrite a file that other
+            # instances and workers read
+            params = getattr(pooled.ydl, 'params', None)
+            if isinstance(params, dict):
+                params.pop('cookiefile', None)
+            pooled.ydl.close()
+        except Exception as e:
+            logger.warning(f"Error closing pooled YoutubeDL: {str(e)}")
+
+    def checkout(self, ydl_opts):
+        key = options_key(ydl_opts)
+        retired = []
+        try:
+            with self._cond:
+                while True:
+                    for ident, pooled in self._idle.items():
+                        if pooled.key == key:
+                            del self._idle[ident]
+                            if self._expired(pooled):
+                                self._live -= 1
+                                retired.append(pooled)
+                                break
+                            self.stats.incr('hits')
+                            pooled.uses += 1
+                            return pooled
+                    else:
+                        if self._live < self.max_size:
+                            break
+                        if self._idle:
+                            _, pooled = self._idle.popitem(last=False)
+                            self._live -= 1
+                            retired.append(pooled)
+                            self.stats.incr('evictions')
+                            break
+                        self._cond.wait()
+                self._live += 1
+        finally:
+            for pooled in retired:
+                self._close(pooled)
+
+        self.stats.incr('misses')
+        try:
+            pooled = _Pooled(self._construct(ydl_opts), key)
+        except BaseException:
+            with self._cond:
+                self._live -= 1
+                self._cond.notify()
+            raise
+        pooled.uses += 1
+        return pooled
+
+    def checkin(self, pooled, healthy=True):
+        if not healthy or self._expired(pooled):
+            if not healthy:
+                self.stats.incr('discarded')
+            with self._cond:
+                self._live -= 1
+                self._cond.notify()
+            self._close(pooled)
+            return
+        with self._cond:
+            self._idle[id(pooled)] = pooled
+            self._cond.notify()
+
+    @contextmanager
+    def session(self, ydl_opts):
+        """
+        Check out a YoutubeDL for `ydl_opts` for the duration of the block.
+        yt-dlp DownloadErrors leave the instance in the pool; any other
+        exception retires it.
+        """
+        from yt_dlp.utils import DownloadError
+
+        pooled = self.checkout(ydl_opts)
+        healthy = True
+        try:
+            yield pooled.ydl
+        except DownloadError:
+            raise
+        except BaseException:
+            healthy = False
+            raise
+        finally:
+            self.checkin(pooled, healthy)
+
+    def clear(self):
+        with self._cond:
+            idle = list(self._idle.values())
+            self._idle.clear()
+            self._live -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            self._close(pooled)
+
+    def info(self):
+        data = self.stats.snapshot()
+        with self._cond:
+            data.update({
+                'max_size': self.max_size,
+                'live': self._live,
+                'idle': len(self._idle)
+            })
+        return data
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_ydl_pool():
+    """
+    Build the process-wide YoutubeDL pool from the environment on first use
+    """
+    global _default_pool
+    if _default_pool is None:
+        with _default_pool_lock:
+            if _default_pool is None:
+                _default_pool = YoutubeDLPool(
+                    max_size=int(os.environ.get('YDL_POOL_SIZE', 16)),
+                    max_uses=int(os.environ.get('YDL_POOL_MAX_USES', 200)),
+                    max_age=int(os.environ.get('YDL_POOL_MAX_AGE', 1800))
+                )
+    return _default_pool